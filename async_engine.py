@@ -0,0 +1,331 @@
+'''
+6.176 MIT POKERBOTS ASYNCHRONOUS GAME ENGINE
+Drives many games at once from one process with asyncio streams, instead of one blocking engine per game.
+Games use the rules, logs and clocks of engine.py; pokerbots talk the text protocol.
+Pokerbots are kept running between games, so a run of many tables starts at most two per concurrent table.
+'''
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+from capture import READ_SIZE
+from engine import BotPool, Game, Player, TerminalState, CheckAction, FoldAction
+from engine import CONNECT_TIMEOUT, DECK_SEED, ENFORCE_GAME_CLOCK, NUM_ROUNDS, TRANSPORT, STATUS, PVALUE
+from engine import PLAYER_1_NAME, PLAYER_1_PATH, PLAYER_2_NAME, PLAYER_2_PATH
+
+
+class AsyncPlayer():
+    '''
+    Handles subprocess and stream interactions with one player's pokerbot, on an event loop.
+    The Player it wraps holds the pokerbot's name, commands, clock, bankroll and output,
+    and encodes and decodes the messages, as in engine.py.
+    '''
+
+    def __init__(self, player):
+        self.player = player
+        self.reader = None
+        self.writer = None
+        self.bot_subprocess = None
+        self.output_task = None
+
+    async def capture_output(self, stream):
+        '''
+        Collects the pokerbot's output as it arrives, up to PLAYER_LOG_SIZE_LIMIT bytes.
+        '''
+        while True:
+            data = await stream.read(READ_SIZE)
+            if not data:
+                break
+            self.player.output.write(data)
+
+    async def start(self, features=()):
+        '''
+        Runs the pokerbot and waits for it to connect, without blocking other games.
+        Any optional protocol features are offered to the pokerbot once it connects.
+        '''
+        player = self.player
+        if player.commands is None or len(player.commands['run']) == 0:
+            return
+        loop = asyncio.get_running_loop()
+        connected = loop.create_future()
+        def on_connect(reader, writer):
+            if connected.done():
+                writer.close()
+            else:
+                connected.set_result((reader, writer))
+        socket_directory = None
+        try:
+            if TRANSPORT == 'unix':
+                socket_directory = tempfile.mkdtemp(prefix='pokerbots-')
+                server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                server_socket.bind(os.path.join(socket_directory, 'engine.sock'))
+                server = await asyncio.start_unix_server(on_connect, sock=server_socket)
+                address = server_socket.getsockname()
+            else:
+                server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                server_socket.bind(('', 0))
+                server = await asyncio.start_server(on_connect, sock=server_socket)
+                address = server_socket.getsockname()[1]
+            async with server:
+                proc = await asyncio.create_subprocess_exec(*player.commands['run'], str(address),
+                                                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                                            cwd=player.path)
+                self.bot_subprocess = proc
+                self.output_task = loop.create_task(self.capture_output(proc.stdout))
+                self.reader, self.writer = await asyncio.wait_for(connected, CONNECT_TIMEOUT)
+                print(player.name, 'connected successfully')
+            if features:
+                await self.negotiate(features)
+        except (TypeError, ValueError):
+            print(player.name, 'run command misformatted')
+        except asyncio.TimeoutError:
+            print('Timed out waiting for', player.name, 'to connect')
+        except OSError:
+            print(player.name, 'run failed - check "run" in commands.json')
+        finally:
+            if socket_directory is not None:
+                shutil.rmtree(socket_directory, ignore_errors=True)
+
+    async def negotiate(self, features):
+        '''
+        Offers optional protocol features to the pokerbot and enables the ones it accepts.
+        '''
+        try:
+            clause = await asyncio.wait_for(self.request('W' + ','.join(features) + '\n'), CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            print('Timed out waiting for', self.player.name, 'to negotiate the protocol')
+            return
+        self.player.accept_features(clause)
+
+    async def new_game(self):
+        '''
+        Writes the finished game's log and starts a new game with the pokerbot on the same connection.
+        '''
+        self.writer.write(b'N\n')
+        await self.writer.drain()
+        self.player.write_log()
+        self.player.output.clear()
+
+    async def stop(self, log=True):
+        '''
+        Closes the stream and stops the pokerbot, then writes its log unless told otherwise.
+        '''
+        if self.writer is not None:
+            try:
+                self.writer.write(b'Q\n')
+                await self.writer.drain()
+                self.writer.close()
+            except OSError:
+                print('Could not close socket connection with', self.player.name)
+        if self.bot_subprocess is not None:
+            try:
+                await asyncio.wait_for(self.bot_subprocess.wait(), CONNECT_TIMEOUT)
+            except asyncio.TimeoutError:
+                print('Timed out waiting for', self.player.name, 'to quit')
+                self.bot_subprocess.kill()
+                await self.bot_subprocess.wait()
+            await self.output_task
+        if log:
+            self.player.write_log()
+
+    def connected(self):
+        '''
+        Returns whether the pokerbot can be queried.
+        '''
+        return self.writer is not None
+
+    async def request(self, message):
+        '''
+        Sends one message to the pokerbot and returns the clause it responds with.
+        '''
+        self.writer.write(message.encode())
+        await self.writer.drain()
+        line = await self.reader.readline()
+        return line.decode().strip()
+
+    async def ask(self, round_state, player_message, game_log):
+        '''
+        Requests one action from the pokerbot, waiting no longer than its game clock allows.
+        '''
+        player = self.player
+        legal_actions = player.legal_responses(round_state)
+        if self.connected() and player.game_clock > 0.:
+            try:
+                message = player.start_query(player_message)
+                timeout = min(CONNECT_TIMEOUT, player.game_clock) if ENFORCE_GAME_CLOCK else CONNECT_TIMEOUT
+                start_time = time.perf_counter()
+                clause = await asyncio.wait_for(self.request(message), timeout)
+                end_time = time.perf_counter()
+                action = player.interpret(round_state, legal_actions, clause, end_time - start_time, game_log)
+                if action is not None:
+                    return action
+            except (socket.timeout, asyncio.TimeoutError):
+                player.forfeit(game_log, ' ran out of time')
+            except OSError:
+                player.forfeit(game_log, ' disconnected')
+            except (IndexError, KeyError, ValueError):
+                game_log.append(player.name + ' response misformatted')
+        return CheckAction() if CheckAction in legal_actions else FoldAction()
+
+
+class AsyncBotPool():
+    '''
+    Keeps pokerbots running and connected between games on the event loop, like engine.BotPool,
+    whose rules it follows. Every directory is built once, even when many games start at the same time.
+    '''
+
+    def __init__(self, reuse=True):
+        self.reuse = reuse
+        self.builds = {}  # the build of each directory, as a task returning its commands
+        self.idle = {}
+
+    async def build(self, player):
+        '''
+        Builds the pokerbot's directory off the event loop, or waits for the build another game started.
+        The build's output goes to the log of the pokerbot that built it.
+        '''
+        if player.path not in self.builds:
+            async def run_build():
+                await asyncio.get_running_loop().run_in_executor(None, player.build)
+                return player.commands
+            self.builds[player.path] = asyncio.ensure_future(run_build())
+        player.commands = await self.builds[player.path]
+
+    async def acquire(self, name, path, log_filename, seed=None):
+        '''
+        Returns an idle pokerbot from this directory that has not played the deals of this seed,
+        or builds and starts a new one.
+        '''
+        bot = BotPool.take_idle(self.idle.get(path, []), seed)
+        if bot is not None:
+            bot.player.start_game(name, log_filename)
+        else:
+            bot = AsyncPlayer(Player(name, path, log_filename))
+            await self.build(bot.player)
+            await bot.start(['newgame'] if self.reuse else [])
+        if seed is not None:
+            bot.player.seeds.add(seed)
+        return bot
+
+    async def release(self, bot):
+        '''
+        Ends the game for a pokerbot, keeping it for the next game if it can be reused.
+        Pokerbots that ran out of time or disconnected are stopped, as they may be out of sync.
+        '''
+        player = bot.player
+        if self.reuse and player.reusable and bot.connected() and player.game_clock > 0.:
+            try:
+                await bot.new_game()
+                self.idle.setdefault(player.path, []).append(bot)
+                return
+            except OSError:
+                print('Could not start a new game with', player.name)
+        await bot.stop()
+
+    async def close(self):
+        '''
+        Stops every idle pokerbot. Their logs were written at the end of their last game.
+        '''
+        await asyncio.gather(*[bot.stop(log=False) for bots in self.idle.values() for bot in bots])
+        self.idle.clear()
+
+
+class AsyncGame():
+    '''
+    Runs one game as a coroutine, so that many games can share an event loop.
+    The Game it wraps deals, logs and keeps score, as in engine.py.
+    '''
+
+    def __init__(self, pool, player_1=(PLAYER_1_NAME, PLAYER_1_PATH), player_2=(PLAYER_2_NAME, PLAYER_2_PATH),
+                 seed=DECK_SEED, log_suffix=''):
+        self.pool = pool
+        self.game = Game(player_1, player_2, seed=seed, log_suffix=log_suffix)
+
+    async def play_round(self, bots):
+        '''
+        Runs one round of poker. Both end-of-round acks are collected concurrently.
+        '''
+        game = self.game
+        players = [bot.player for bot in bots]
+        round_state = game.deal_round()
+        actions = []
+        while not isinstance(round_state, TerminalState):
+            game.log_round_state(players, round_state)
+            active = round_state.button % 2
+            action = await bots[active].ask(round_state, game.player_messages[active], game.log)
+            bet_override = (round_state.pips == [0, 0])
+            game.log_action(players[active].name, action, bet_override)
+            actions.append(action)
+            round_state = round_state.proceed(action)
+        game.log_terminal_state(players, round_state)
+        game.record_round(players, round_state, actions)
+        await asyncio.gather(*[bot.ask(round_state, player_message, game.log)
+                               for bot, player_message in zip(bots, game.player_messages)])
+        for player, delta in zip(players, round_state.deltas):
+            player.bankroll += delta
+
+    async def play(self):
+        '''
+        Runs one game of poker and returns the final bankroll of each player by name.
+        '''
+        game = self.game
+        bots = await asyncio.gather(*[self.pool.acquire(name, path, name + game.log_suffix, game.seed)
+                                      for name, path in game.player_specs])
+        game.open_logs([bot.player for bot in bots])
+        first_player = bots[0].player
+        for round_num in range(1, NUM_ROUNDS + 1):
+            game.log.append('')
+            game.log.append('Round #' + str(round_num) + STATUS([bot.player for bot in bots]))
+            bankroll = first_player.bankroll
+            await self.play_round(bots)
+            bots = bots[::-1]
+            if game.settled(first_player.bankroll - bankroll):
+                break
+        await asyncio.gather(*[self.pool.release(bot) for bot in bots])
+        players = [bot.player for bot in bots]
+        game.close_logs(players)
+        return {player.name: player.bankroll for player in players}
+
+
+async def run_tables(num_tables, concurrency):
+    '''
+    Plays num_tables games, at most concurrency at a time, and returns their results in order.
+    Each table writes its logs with a _table#### suffix and, with DECK_SEED, deals from its own seed.
+    The pokerbots of finished tables play the next ones.
+    '''
+    semaphore = asyncio.Semaphore(concurrency)
+    pool = AsyncBotPool()
+    async def run_table(table):
+        async with semaphore:
+            seed = None if DECK_SEED is None else DECK_SEED + table
+            return await AsyncGame(pool, seed=seed, log_suffix='_table{:04d}'.format(table)).play()
+    try:
+        return await asyncio.gather(*[run_table(table) for table in range(num_tables)])
+    finally:
+        await pool.close()
+
+
+def parse_args():
+    '''
+    Parses the number of tables to play.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 async_engine.py')
+    parser.add_argument('--tables', type=int, default=1, help='Games to play, defaults to 1')
+    parser.add_argument('--concurrency', type=int, default=100, help='Games to play at once, defaults to 100')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = parse_args()
+    RESULTS = asyncio.run(run_tables(ARGS.tables, ARGS.concurrency))
+    TOTALS = {}
+    for BANKROLLS in RESULTS:
+        for NAME, BANKROLL in BANKROLLS.items():
+            TOTALS[NAME] = TOTALS.get(NAME, 0) + BANKROLL
+    print('Total over {} tables'.format(len(RESULTS)) + ''.join([PVALUE(NAME, BANKROLL)
+                                                                 for NAME, BANKROLL in TOTALS.items()]))
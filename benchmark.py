@@ -0,0 +1,286 @@
+'''
+6.176 MIT POKERBOTS ENGINE BENCHMARKS
+Times the engine's hot paths and compares them against a stored baseline.
+
+Every benchmark reports the best of several repeats. Results are written as JSON, and
+with --baseline, any benchmark that got worse by more than --threshold is flagged as a
+regression and the exit status is 1, so that engine changes can be judged by numbers.
+'''
+from collections import OrderedDict
+from contextlib import redirect_stdout
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import eval7
+
+from engine import Game, Player, RoundState, TerminalState, FoldAction, CallAction, CheckAction, RaiseAction
+from engine import NUM_ROUNDS, STARTING_STACK, BIG_BLIND, SMALL_BLIND
+from deals import LazyDeck
+from evaluator import evaluate_batch
+
+STUB_BOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_skeleton')
+
+
+class Result():
+    '''
+    One benchmark's measurement, and whether higher values are better.
+    '''
+
+    def __init__(self, value, unit, higher_is_better=True):
+        self.value = value
+        self.unit = unit
+        self.higher_is_better = higher_is_better
+
+    def to_dict(self):
+        '''
+        Returns the result as JSON-serializable data.
+        '''
+        return OrderedDict([('value', self.value), ('unit', self.unit), ('higher_is_better', self.higher_is_better)])
+
+
+def best_time(function, repeat):
+    '''
+    Returns the shortest of repeat timings of function().
+    '''
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+def first_state(rng):
+    '''
+    Deals a new round from a deck of its own, drawing from rng.
+    '''
+    deck = LazyDeck(rng)
+    hands = deck.next_round()
+    return RoundState(0, 0, [SMALL_BLIND, BIG_BLIND], [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND],
+                      hands, deck, None)
+
+
+def random_action(state, rng):
+    '''
+    Returns a random legal action, raising a random legal amount.
+    '''
+    action = rng.choice(sorted(state.legal_actions(), key=lambda action: action.__name__))
+    if action is RaiseAction:
+        return RaiseAction(rng.randint(*state.raise_bounds()))
+    return action()
+
+
+def bench_proceed(scale, repeat):
+    '''
+    RoundState.proceed over random rounds, stopping short of the showdown.
+    '''
+    rng = random.Random(0)
+    rounds = []
+    for _ in range(1000 * scale):
+        state = start = first_state(rng)
+        actions = []
+        while True:
+            action = random_action(state, rng)
+            next_state = state.proceed(action)
+            if isinstance(next_state, TerminalState) and not isinstance(action, FoldAction):
+                break
+            actions.append(action)
+            if isinstance(next_state, TerminalState):
+                break
+            state = next_state
+        rounds.append((start, actions))
+    def replay():
+        for state, actions in rounds:
+            for action in actions:
+                state = state.proceed(action)
+    count = sum(len(actions) for _, actions in rounds)
+    return Result(count / best_time(replay, repeat), 'actions/s')
+
+
+def bench_showdown(scale, repeat):
+    '''
+    RoundState.showdown on random river states.
+    '''
+    rng = random.Random(0)
+    states = []
+    for _ in range(2000 * scale):
+        dealt = first_state(rng)
+        states.append(RoundState(1, 5, [0, 0], [STARTING_STACK - 20] * 2, dealt.hands, dealt.deck, None))
+    def settle():
+        for state in states:
+            state.showdown()
+    return Result(len(states) / best_time(settle, repeat), 'showdowns/s')
+
+
+def bench_evaluate(scale, repeat):
+    '''
+    eval7.evaluate on random seven-card hands.
+    '''
+    rng = random.Random(0)
+    deck = eval7.Deck().cards
+    hands = [rng.sample(deck, 7) for _ in range(10000 * scale)]
+    evaluate = eval7.evaluate
+    def score():
+        for hand in hands:
+            evaluate(hand)
+    return Result(len(hands) / best_time(score, repeat), 'evaluations/s')
+
+
+def bench_evaluate_batch(scale, repeat):
+    '''
+    evaluator.evaluate_batch on one batch of random seven-card hands, as card codes.
+    '''
+    rng = random.Random(0)
+    deals = [rng.sample(range(52), 7) for _ in range(10000 * scale)]
+    boards = bytes(code for cards in deals for code in cards[:5])
+    hands = bytes(code for cards in deals for code in cards[5:])
+    return Result(len(deals) / best_time(lambda: evaluate_batch(boards, hands), repeat), 'evaluations/s')
+
+
+def bench_log_action(scale, repeat):
+    '''
+    Game.log_action on a mix of every kind of action.
+    '''
+    game = Game(('A', STUB_BOT_PATH), ('B', STUB_BOT_PATH))
+    actions = [(FoldAction(), False), (CallAction(), False), (CheckAction(), False),
+               (RaiseAction(6), False), (RaiseAction(40), True)] * (4000 * scale)
+    def log():
+        game.log = []
+        game.player_messages = [[], []]
+        for action, bet_override in actions:
+            game.log_action('A', action, bet_override)
+    return Result(len(actions) / best_time(log, repeat), 'calls/s')
+
+
+def bench_query(scale, repeat):
+    '''
+    Player.query round trips to the skeleton bot, as mean and 99th percentile latency.
+    '''
+    player = Player('benchmark', STUB_BOT_PATH)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        player.build()
+        player.run()
+    if not player.connected():
+        raise RuntimeError('the stub bot at ' + STUB_BOT_PATH + ' did not connect')
+    state = RoundState(0, 0, [SMALL_BLIND, BIG_BLIND], [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND],
+                       [['Ah', 'Kd'], ['2c', '7s']], None, None)
+    latencies = []
+    try:
+        for _ in range(repeat):
+            for _ in range(1000 * scale):
+                player.game_clock = float(NUM_ROUNDS)
+                start_time = time.perf_counter()
+                player.query(state, ['T0.', 'P0', 'HAh,Kd'], [])
+                latencies.append(time.perf_counter() - start_time)
+    finally:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            player.stop(log=False)
+    latencies.sort()
+    return [('player.query', Result(1e6 * sum(latencies) / len(latencies), 'us', False)),
+            ('player.query.p99', Result(1e6 * latencies[int(.99 * len(latencies))], 'us', False))]
+
+
+def bench_game(scale, repeat):
+    '''
+    Whole games of Game.run between two skeleton bots, building and starting them included.
+    '''
+    directory = tempfile.mkdtemp(prefix='pokerbots-benchmark-')
+    working_directory = os.getcwd()
+    def play():
+        for _ in range(scale):
+            Game(('A', STUB_BOT_PATH), ('B', STUB_BOT_PATH), os.path.join(directory, 'gamelog')).run()
+    try:
+        os.chdir(directory)  # the bots' logs go here
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            seconds = best_time(play, repeat)
+    finally:
+        os.chdir(working_directory)
+        shutil.rmtree(directory, ignore_errors=True)
+    return Result(scale * NUM_ROUNDS / seconds, 'rounds/s')
+
+
+BENCHMARKS = OrderedDict([
+    ('round_state.proceed', bench_proceed),
+    ('round_state.showdown', bench_showdown),
+    ('eval7.evaluate', bench_evaluate),
+    ('evaluator.evaluate_batch', bench_evaluate_batch),
+    ('game.log_action', bench_log_action),
+    ('player.query', bench_query),
+    ('game.run', bench_game),
+])
+
+
+def run_benchmarks(names, scale=1, repeat=3):
+    '''
+    Runs the named benchmarks and returns their results by name.
+    '''
+    results = OrderedDict()
+    for name in names:
+        print('Running', name, file=sys.stderr)
+        measured = BENCHMARKS[name](scale, repeat)
+        results.update(measured if isinstance(measured, list) else [(name, measured)])
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''
+    Compares results with a baseline's and returns (name, ratio, regressed) for every benchmark in both.
+    Ratios above 1 are improvements, whichever direction the benchmark is better in.
+    '''
+    comparisons = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        previous = baseline[name]['value']
+        ratio = result.value / previous if result.higher_is_better else previous / result.value
+        comparisons.append((name, ratio, ratio < 1. - threshold))
+    return comparisons
+
+
+def parse_args():
+    '''
+    Parses the benchmarks to run and the baseline to compare against.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 benchmark.py')
+    parser.add_argument('names', nargs='*', help='Benchmarks to run, defaults to all of ' + ', '.join(BENCHMARKS))
+    parser.add_argument('--output', type=str, default='benchmark.json', help='Results file, defaults to benchmark.json')
+    parser.add_argument('--baseline', type=str, default=None, help='Results file to compare against')
+    parser.add_argument('--threshold', type=float, default=.1,
+                        help='Slowdown that counts as a regression, defaults to 0.1 (10%%)')
+    parser.add_argument('--scale', type=int, default=1, help='Multiplies the work per benchmark, defaults to 1')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeats per benchmark, best kept, defaults to 3')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = parse_args()
+    UNKNOWN = [name for name in ARGS.names if name not in BENCHMARKS]
+    if UNKNOWN:
+        sys.exit('Unknown benchmarks: ' + ', '.join(UNKNOWN))
+    RESULTS = run_benchmarks(ARGS.names or list(BENCHMARKS), ARGS.scale, ARGS.repeat)
+    with open(ARGS.output, 'w') as json_file:
+        json.dump(OrderedDict([('python', platform.python_version()), ('machine', platform.machine()),
+                               ('scale', ARGS.scale), ('repeat', ARGS.repeat),
+                               ('results', OrderedDict((name, result.to_dict()) for name, result in RESULTS.items()))]),
+                  json_file, indent=1)
+    COMPARISONS = {}
+    if ARGS.baseline is not None:
+        with open(ARGS.baseline) as json_file:
+            COMPARISONS = {name: (ratio, regressed) for name, ratio, regressed in
+                           compare(RESULTS, json.load(json_file)['results'], ARGS.threshold)}
+    for NAME, RESULT in RESULTS.items():
+        LINE = '{:<24}{:>16.1f} {:<14}'.format(NAME, RESULT.value, RESULT.unit)
+        if NAME in COMPARISONS:
+            RATIO, REGRESSED = COMPARISONS[NAME]
+            LINE += '{:>8.2f}x baseline'.format(RATIO) + ('  REGRESSION' if REGRESSED else '')
+        print(LINE)
+    print('Wrote', ARGS.output)
+    if any(regressed for _, regressed in COMPARISONS.values()):
+        sys.exit(1)
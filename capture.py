@@ -0,0 +1,140 @@
+'''
+Bounded capture of the pokerbots' output.
+
+Every pokerbot's stdout is read by one daemon thread that waits on all of their pipes at once
+with selectors, instead of by one thread per pokerbot. What they print goes into an OutputLog,
+which keeps at most its size limit as the output arrives and counts the rest as dropped,
+so a chatty pokerbot cannot grow the engine's memory however long the match.
+'''
+import os
+import selectors
+import threading
+
+READ_SIZE = 65536
+
+
+class OutputLog():
+    '''
+    The first limit bytes a pokerbot printed, and how many more it printed after them.
+    '''
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.chunks = []
+        self.size = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        '''
+        Adds output, keeping only what fits under the limit. None is ignored.
+        '''
+        if not data:
+            return
+        with self.lock:
+            room = max(self.limit - self.size, 0)
+            if room:
+                kept = bytes(data[:room])
+                self.chunks.append(kept)
+                self.size += len(kept)
+            self.dropped += max(len(data) - room, 0)
+
+    def clear(self):
+        '''
+        Forgets the output so far, for a new game.
+        '''
+        with self.lock:
+            self.chunks = []
+            self.size = 0
+            self.dropped = 0
+
+    def dump(self, filename):
+        '''
+        Writes the output kept, followed by a note of how many bytes were dropped, if any.
+        '''
+        with self.lock, open(filename, 'wb') as log_file:
+            for chunk in self.chunks:
+                log_file.write(chunk)
+            if self.dropped:
+                log_file.write('\n[{} more bytes of output were dropped]\n'.format(self.dropped).encode())
+
+
+class OutputCapture():
+    '''
+    Reads any number of pipes on one daemon thread, adding what each delivers to its OutputLog.
+    Only the thread touches the selector; other threads hand it pipes through a queue and a wakeup pipe.
+    '''
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.selector = selectors.DefaultSelector()
+        self.wake_read, self.wake_write = os.pipe()
+        self.selector.register(self.wake_read, selectors.EVENT_READ)
+        self.lock = threading.Lock()
+        self.pending = []
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def watch(self, pipe, output_log):
+        '''
+        Starts capturing a pipe, which is closed at its end of file.
+        Returns a threading.Event that is set once everything the pipe delivered was captured.
+        '''
+        closed = threading.Event()
+        with self.lock:
+            self.pending.append((pipe, output_log, closed))
+        os.write(self.wake_write, b'\0')
+        return closed
+
+    def run(self):
+        '''
+        Captures the watched pipes until the process exits.
+        '''
+        selector = self.selector
+        while True:
+            for key, _ in selector.select():
+                if key.data is None:  # new pipes to watch
+                    os.read(self.wake_read, READ_SIZE)
+                    with self.lock:
+                        pending, self.pending = self.pending, []
+                    for pipe, output_log, closed in pending:
+                        selector.register(pipe, selectors.EVENT_READ, (output_log, closed))
+                    continue
+                output_log, closed = key.data
+                try:
+                    data = os.read(key.fd, READ_SIZE)
+                except OSError:
+                    data = b''
+                if data:
+                    output_log.write(data)
+                else:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    closed.set()
+
+
+def drain(pipe, output_log, closed):
+    '''
+    Captures one pipe on the calling thread, where pipes cannot be selected.
+    '''
+    with pipe:
+        for data in iter(lambda: pipe.read1(READ_SIZE), b''):
+            output_log.write(data)
+    closed.set()
+
+
+CAPTURE = None
+
+
+def capture_output(pipe, output_log):
+    '''
+    Captures a pokerbot's stdout pipe into an output log, on this process's capture thread.
+    Returns a threading.Event that is set once the pipe is closed and fully captured.
+    '''
+    global CAPTURE  # pylint: disable=global-statement
+    if os.name == 'nt':  # select() cannot wait on pipes on Windows, so they get a thread each
+        closed = threading.Event()
+        threading.Thread(target=drain, args=(pipe, output_log, closed), daemon=True).start()
+        return closed
+    if CAPTURE is None or CAPTURE.pid != os.getpid():  # forked processes do not inherit the thread
+        CAPTURE = OutputCapture()
+    return CAPTURE.watch(pipe, output_log)
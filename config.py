@@ -7,6 +7,15 @@ PLAYER_2_NAME = 'B'
 PLAYER_2_PATH = './python_skeleton'
 # GAME PROGRESS IS RECORDED HERE
 GAME_LOG_FILENAME = 'gamelog'
+# GAME_LOG_COMPRESSION IS None, 'gzip' OR 'zstd' (NEEDS THE zstandard PACKAGE)
+GAME_LOG_COMPRESSION = None
+# THE GAME LOG IS WRITTEN EVERY GAME_LOG_FLUSH_INTERVAL LINES
+GAME_LOG_FLUSH_INTERVAL = 10000
+# SET HAND_HISTORY_FILENAME TO ALSO WRITE COLUMNAR HAND HISTORIES (NEEDS numpy), IN BATCHES OF ROUNDS
+HAND_HISTORY_FILENAME = None
+HAND_HISTORY_BATCH_SIZE = 100000
+# SET LATENCY_PROFILE_FILENAME TO WRITE PER-ACTION RESPONSE TIME HISTOGRAMS AS JSON
+LATENCY_PROFILE_FILENAME = None
 # PLAYER_LOG_SIZE_LIMIT IS IN BYTES
 PLAYER_LOG_SIZE_LIMIT = 524288
 # STARTING_GAME_CLOCK AND TIMEOUTS ARE IN SECONDS
@@ -14,6 +23,33 @@ ENFORCE_GAME_CLOCK = True
 STARTING_GAME_CLOCK = 30.
 BUILD_TIMEOUT = 10.
 CONNECT_TIMEOUT = 10.
+# SET BUILD_CACHE_FILENAME TO SKIP REBUILDING BOTS WHOSE DIRECTORIES ARE UNCHANGED SINCE THEIR LAST BUILD
+BUILD_CACHE_FILENAME = None
+# WIRE_PROTOCOL IS 'text' OR 'binary' - BOTS THAT DO NOT SUPPORT 'binary' FALL BACK TO 'text'
+WIRE_PROTOCOL = 'text'
+# COALESCE_ROUND_RESULTS SENDS EACH ROUND'S RESULT WITH THE PLAYER'S NEXT MESSAGE INSTEAD OF WAITING FOR AN ACK
+# BOTS THAT DO NOT SUPPORT 'coalesce' KEEP ACKING EVERY ROUND
+COALESCE_ROUND_RESULTS = False
+# TRANSPORT IS 'tcp' OR 'unix' - 'unix' USES UNIX DOMAIN SOCKETS, FOR BOTS ON THE SAME MACHINE
+TRANSPORT = 'tcp'
+# HEADLESS RUNS PYTHON POKERBOTS INSIDE THE ENGINE PROCESS, WITHOUT SOCKETS
+# USE ONLY FOR SCRIMMAGES - THE BOTS ARE NOT SANDBOXED
+HEADLESS = False
+# SET DECK_SEED TO AN INTEGER TO DEAL THE SAME CARDS EVERY GAME
+DECK_SEED = None
+# DUPLICATE_MATCH REPLAYS THE SAME DEALS WITH THE SEATS SWAPPED
+DUPLICATE_MATCH = False
+# EARLY_STOP ENDS A GAME ONCE SEQUENTIAL PROBABILITY RATIO TESTS FIND ONE PLAYER SIGNIFICANTLY AHEAD
+# USE ONLY FOR SCRIMMAGES - THE TESTS TELL AN EVEN MATCH FROM ONE PLAYER WINNING EARLY_STOP_MARGIN CHIPS PER ROUND
+# EVEN MATCHES STOP WITH A WINNER WITH PROBABILITY AT MOST EARLY_STOP_ALPHA, AND ARE OTHERWISE PLAYED IN FULL
+# A PLAYER AHEAD BY EARLY_STOP_MARGIN IS MISSED WITH PROBABILITY AT MOST EARLY_STOP_BETA
+# NO GAME STOPS BEFORE EARLY_STOP_MIN_ROUNDS
+# DUPLICATE MATCHES ALWAYS PLAY EVERY ROUND, SO THAT BOTH HALVES PLAY THE SAME DEALS
+EARLY_STOP = False
+EARLY_STOP_MARGIN = 1.
+EARLY_STOP_ALPHA = .05
+EARLY_STOP_BETA = .05
+EARLY_STOP_MIN_ROUNDS = 100
 # THE GAME VARIANT FIXES THE PARAMETERS BELOW
 # CHANGE ONLY FOR TRAINING OR EXPERIMENTATION
 NUM_ROUNDS = 1000
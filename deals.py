@@ -0,0 +1,133 @@
+'''
+Dealing for the engine, seeded and reproducible or lazy and random.
+
+A DeckStream pre-generates the cards of every round of a match in one call and keeps
+them as card codes (4 * rank + suit), CARDS_PER_ROUND bytes per round: the small blind's
+hand, the big blind's hand, then the board. Replaying a stream with the seats swapped
+gives duplicate matches.
+
+Unseeded games deal from a LazyDeck instead of shuffling a whole eval7.Deck every round:
+it draws cards with a partial Fisher-Yates shuffle of one reused array of card codes,
+and only draws the board once a street needs it, so most rounds draw just the four hole cards.
+Both decks keep the round's cards as codes and build each street's board of eval7 Cards
+once, for logging, messaging and showdowns; hand histories read the codes directly.
+'''
+from itertools import chain
+import random
+
+from evaluator import CARDS
+
+CARDS_PER_ROUND = 9
+
+
+class DeckStream():
+    '''
+    The pre-generated cards of num_rounds rounds, dealt from a seeded generator.
+    '''
+
+    def __init__(self, seed, num_rounds):
+        rng = random.Random(seed)
+        deck = range(52)
+        self.cards = bytes(chain.from_iterable(rng.sample(deck, CARDS_PER_ROUND) for _ in range(num_rounds)))
+
+    def __len__(self):
+        return len(self.cards) // CARDS_PER_ROUND
+
+    def deal(self, round_index):
+        '''
+        Returns the card codes of one round, without copying them.
+        '''
+        return memoryview(self.cards)[CARDS_PER_ROUND * round_index:CARDS_PER_ROUND * (round_index + 1)]
+
+
+class RoundDeck():
+    '''
+    The cards of the current round, as codes: the small blind's hand, the big blind's hand, then the board.
+    Subclasses deal the rounds; one deck is reused for every round of a match.
+    '''
+
+    def __init__(self):
+        self.codes = bytearray(range(52))
+        self.boards = {}  # the board of eval7 Cards dealt by each street, built once per round
+
+    def draw_board(self, num_cards):
+        '''
+        Makes sure the first num_cards cards of the board are dealt.
+        '''
+
+    def peek(self, num_cards):
+        '''
+        Returns the first num_cards cards of the board, as a list of eval7 Cards shared by every caller.
+        '''
+        board = self.boards.get(num_cards)
+        if board is None:
+            self.draw_board(num_cards)
+            board = self.boards[num_cards] = [CARDS[code] for code in self.codes[4:4 + num_cards]]
+        return board
+
+    def board_codes(self, num_cards):
+        '''
+        Returns the codes of the first num_cards cards of the board.
+        '''
+        self.draw_board(num_cards)
+        return self.codes[4:4 + num_cards]
+
+
+class StreamDeck(RoundDeck):
+    '''
+    Deals the rounds of a DeckStream in order, standing in for a shuffled eval7.Deck.
+    '''
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        self.round_index = -1
+
+    def next_round(self):
+        '''
+        Moves to the next round and returns both players' hands.
+        '''
+        self.round_index += 1
+        codes = self.stream.deal(self.round_index)
+        self.codes[:CARDS_PER_ROUND] = codes
+        self.boards.clear()
+        return [[CARDS[codes[0]], CARDS[codes[1]]], [CARDS[codes[2]], CARDS[codes[3]]]]
+
+
+class LazyDeck(RoundDeck):
+    '''
+    Deals every round from a fresh random order, drawing only the cards the round uses.
+    '''
+
+    def __init__(self, rng=random):
+        super().__init__()
+        self.rng = rng
+        self.dealt = 0  # codes[:dealt] are this round's cards
+
+    def draw(self, count):
+        '''
+        Draws count more cards, uniformly from the rest of the deck, into codes[dealt:dealt + count].
+        '''
+        codes = self.codes
+        randrange = self.rng.randrange
+        for i in range(self.dealt, self.dealt + count):
+            j = randrange(i, 52)
+            codes[i], codes[j] = codes[j], codes[i]
+        self.dealt += count
+
+    def draw_board(self, num_cards):
+        '''
+        Draws the board up to num_cards cards.
+        '''
+        if self.dealt < 4 + num_cards:
+            self.draw(4 + num_cards - self.dealt)
+
+    def next_round(self):
+        '''
+        Starts the next round and returns both players' hands.
+        '''
+        self.dealt = 0
+        self.boards.clear()
+        self.draw(4)
+        codes = self.codes
+        return [[CARDS[codes[0]], CARDS[codes[1]]], [CARDS[codes[2]], CARDS[codes[3]]]]
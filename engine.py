@@ -3,18 +3,32 @@
 DO NOT REMOVE, RENAME, OR EDIT THIS FILE
 '''
 from collections import namedtuple
-from threading import Thread
-from queue import Queue
+from array import array
+from functools import lru_cache, partial
 import time
 import json
+import hashlib
+import random
+import gzip
 import subprocess
+import importlib.util
+import traceback
 import socket
+import shutil
+import tempfile
+import struct
 import eval7
 import sys
 import os
 
 sys.path.append(os.getcwd())
 from config import *
+from evaluator import CARD_CODES, encode
+from handhistory import HandHistory
+from deals import DeckStream, StreamDeck, LazyDeck
+from latency import LatencyProfile
+from capture import OutputLog, capture_output
+from sequential import SequentialTest
 
 FoldAction = namedtuple('FoldAction', [])
 CallAction = namedtuple('CallAction', [])
@@ -22,6 +36,10 @@ CheckAction = namedtuple('CheckAction', [])
 # we coalesce BetAction and RaiseAction for convenience
 RaiseAction = namedtuple('RaiseAction', ['amount'])
 TerminalState = namedtuple('TerminalState', ['deltas', 'previous_state'])
+# action codes, as in handhistory.py; legal action masks set bit 1 << code
+FOLD, CALL, CHECK, RAISE = range(4)
+MASK_ACTIONS = tuple(frozenset(action for code, action in enumerate([FoldAction, CallAction, CheckAction, RaiseAction])
+                               if mask >> code & 1) for mask in range(16))
 
 STREET_NAMES = ['Flop', 'Turn', 'River']
 DECODE = {'F': FoldAction, 'C': CallAction, 'K': CheckAction, 'R': RaiseAction}
@@ -29,6 +47,75 @@ CCARDS = lambda cards: ','.join(map(str, cards))
 PCARDS = lambda cards: '[{}]'.format(' '.join(map(str, cards)))
 PVALUE = lambda name, value: ', {} ({})'.format(name, value)
 STATUS = lambda players: ''.join([PVALUE(p.name, p.bankroll) for p in players])
+BINARY_CLOCK = struct.Struct('!cI')
+# resolved once, so that games played in other working directories share the cache
+BUILD_CACHE_PATH = None if BUILD_CACHE_FILENAME is None else os.path.abspath(BUILD_CACHE_FILENAME)
+
+
+@lru_cache(maxsize=4096)
+def binary_clause(clause):
+    '''
+    Encodes one clause of the text protocol for the binary protocol.
+    '''
+    code = clause[0]
+    if code == 'P':
+        return struct.pack('!cB', b'P', int(clause[1:]))
+    if code in 'HBO':
+        cards = [CARD_CODES[card] for card in clause[1:].split(',')]
+        return struct.pack('!cB', code.encode(), len(cards)) + bytes(cards)
+    if code == 'R':
+        return struct.pack('!cH', b'R', int(clause[1:]))
+    if code == 'D':
+        return struct.pack('!ci', b'D', int(clause[1:]))
+    return code.encode()
+
+def directory_hash(path):
+    '''
+    Hashes the names and contents of the files under a directory, skipping Python bytecode caches.
+    '''
+    digest = hashlib.sha256()
+    for root, directories, filenames in os.walk(path):
+        directories[:] = sorted(directory for directory in directories if directory != '__pycache__')
+        for filename in sorted(filenames):
+            file_path = os.path.join(root, filename)
+            digest.update(os.path.relpath(file_path, path).encode() + b'\0')
+            try:
+                with open(file_path, 'rb') as file:
+                    for chunk in iter(partial(file.read, 1 << 20), b''):
+                        digest.update(chunk)
+            except OSError:
+                pass
+    return digest.hexdigest()
+
+
+def load_build_cache():
+    '''
+    Returns the directory hash recorded after each bot's last successful build.
+    '''
+    try:
+        with open(BUILD_CACHE_PATH, 'r') as json_file:
+            return json.load(json_file)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return {}
+
+
+def build_is_cached(path):
+    '''
+    Returns whether a bot directory is unchanged since its last successful build.
+    '''
+    return load_build_cache().get(os.path.abspath(path)) == directory_hash(path)
+
+
+def cache_build(path):
+    '''
+    Records the hash of a freshly built bot directory, build artifacts included.
+    '''
+    cache = load_build_cache()
+    cache[os.path.abspath(path)] = directory_hash(path)
+    temporary_path = '{}.{}'.format(BUILD_CACHE_PATH, os.getpid())
+    with open(temporary_path, 'w') as json_file:
+        json.dump(cache, json_file, indent=1)
+    os.replace(temporary_path, BUILD_CACHE_PATH)
 
 # Socket encoding scheme:
 #
@@ -43,12 +130,61 @@ STATUS = lambda players: ''.join([PVALUE(p.name, p.bankroll) for p in players])
 # O**,** the opponent's hand in common format
 # D### the player's bankroll delta from the round
 # Q game over
+# N game over, and a new game follows on the same connection (with the newgame feature)
 #
 # Clauses are separated by spaces
 # Messages end with '\n'
 # The engine expects a response of K at the end of the round as an ack,
 # otherwise a response which encodes the player's action
+# With the coalesce feature, the round's O and D clauses are instead sent at the start of
+# the player's next message, and the game's last ones before its Q or N, with no ack
 # Action history is sent once, including the player's actions
+#
+# Binary encoding scheme, used once a bot accepts it:
+#
+# W<feature>,... offers optional protocol features, sent in text right after connecting
+# The bot answers W<feature>,... with the features it accepts, and older bots answer K
+# With the binary feature, every message is a 2-byte length followed by that many bytes
+# Each clause is its one-byte ASCII code followed by a fixed-width argument:
+# T a 4-byte unsigned game clock in milliseconds
+# P a 1-byte player index
+# H, B and O a 1-byte card count, then one byte per card encoded as 4 * rank + suit
+# R a 2-byte unsigned amount
+# D a 4-byte signed delta
+# F, C, K, Q and N take no argument
+# Integers are big-endian
+
+
+@lru_cache(maxsize=65536)
+def legal_mask(active, pip0, pip1, stack0, stack1):
+    '''
+    Returns the active player's legal moves as a bitmask, with bit 1 << FOLD, CALL, CHECK or RAISE,
+    memoized on the betting state. MASK_ACTIONS[mask] is the same moves as a frozenset of action classes.
+    RoundState and FlatRoundState both follow these rules.
+    '''
+    pips = (pip0, pip1)
+    continue_cost = pips[1-active] - pips[active]
+    if continue_cost == 0:
+        # we can only raise the stakes if both players can afford it
+        bets_forbidden = (stack0 == 0 or stack1 == 0)
+        return 1 << CHECK if bets_forbidden else 1 << CHECK | 1 << RAISE
+    # similarly, re-raising is only allowed if both players can afford it
+    stacks = (stack0, stack1)
+    raises_forbidden = (continue_cost == stacks[active] or stacks[1-active] == 0)
+    return 1 << FOLD | 1 << CALL if raises_forbidden else 1 << FOLD | 1 << CALL | 1 << RAISE
+
+
+@lru_cache(maxsize=65536)
+def raise_range(active, pip0, pip1, stack0, stack1):
+    '''
+    Returns a tuple of the minimum and maximum legal raises, memoized on the betting state.
+    '''
+    pips = (pip0, pip1)
+    stacks = (stack0, stack1)
+    continue_cost = pips[1-active] - pips[active]
+    max_contribution = min(stacks[active], stacks[1-active] + continue_cost)
+    min_contribution = min(max_contribution, continue_cost + max(continue_cost, BIG_BLIND))
+    return (pips[active] + min_contribution, pips[active] + max_contribution)
 
 
 class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks', 'hands', 'deck', 'previous_state'])):
@@ -60,8 +196,9 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks'
         '''
         Compares the players' hands and computes payoffs.
         '''
-        score0 = eval7.evaluate(self.deck.peek(5) + self.hands[0])
-        score1 = eval7.evaluate(self.deck.peek(5) + self.hands[1])
+        board = self.deck.peek(5)
+        score0 = eval7.evaluate(board + self.hands[0])
+        score1 = eval7.evaluate(board + self.hands[1])
         if score0 > score1:
             delta = STARTING_STACK - self.stacks[1]
         elif score0 < score1:
@@ -74,26 +211,14 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks'
         '''
         Returns a set which corresponds to the active player's legal moves.
         '''
-        active = self.button % 2
-        continue_cost = self.pips[1-active] - self.pips[active]
-        if continue_cost == 0:
-            # we can only raise the stakes if both players can afford it
-            bets_forbidden = (self.stacks[0] == 0 or self.stacks[1] == 0)
-            return {CheckAction} if bets_forbidden else {CheckAction, RaiseAction}
-        # continue_cost > 0
-        # similarly, re-raising is only allowed if both players can afford it
-        raises_forbidden = (continue_cost == self.stacks[active] or self.stacks[1-active] == 0)
-        return {FoldAction, CallAction} if raises_forbidden else {FoldAction, CallAction, RaiseAction}
+        mask = legal_mask(self.button % 2, self.pips[0], self.pips[1], self.stacks[0], self.stacks[1])
+        return set(MASK_ACTIONS[mask])
 
     def raise_bounds(self):
         '''
         Returns a tuple of the minimum and maximum legal raises.
         '''
-        active = self.button % 2
-        continue_cost = self.pips[1-active] - self.pips[active]
-        max_contribution = min(self.stacks[active], self.stacks[1-active] + continue_cost)
-        min_contribution = min(max_contribution, continue_cost + max(continue_cost, BIG_BLIND))
-        return (self.pips[active] + min_contribution, self.pips[active] + max_contribution)
+        return raise_range(self.button % 2, self.pips[0], self.pips[1], self.stacks[0], self.stacks[1])
 
     def proceed_street(self):
         '''
@@ -137,20 +262,173 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks'
         return RoundState(self.button + 1, self.street, new_pips, new_stacks, self.hands, self.deck, self)
 
 
+class FlatRoundState():
+    '''
+    A mutable alternative to RoundState for simulation and search.
+    Actions are applied and undone in place, so walking the game tree allocates no new states.
+    '''
+    __slots__ = ['button', 'street', 'pips', 'stacks', 'hands', 'deck', 'terminal', 'deltas', 'actions', 'history']
+
+    def __init__(self, button=0, street=0, pips=(SMALL_BLIND, BIG_BLIND),
+                 stacks=(STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND), hands=([], []), deck=None):
+        self.button = button
+        self.street = street
+        self.pips = list(pips)
+        self.stacks = list(stacks)
+        self.hands = list(hands)
+        self.deck = deck
+        self.terminal = False
+        self.deltas = [0, 0]
+        self.actions = []  # the action log, oldest first
+        self.history = array('i')  # button, street, pips and stacks before each logged action
+
+    @classmethod
+    def from_round_state(cls, round_state):
+        '''
+        Builds a FlatRoundState from a RoundState, without its history.
+        '''
+        return cls(round_state.button, round_state.street, round_state.pips, round_state.stacks,
+                   round_state.hands, round_state.deck)
+
+    def copy(self):
+        '''
+        Returns an independent copy of the state, including its action log.
+        '''
+        state = FlatRoundState(self.button, self.street, self.pips, self.stacks, self.hands, self.deck)
+        state.terminal = self.terminal
+        state.deltas = list(self.deltas)
+        state.actions = list(self.actions)
+        state.history = array('i', self.history)
+        return state
+
+    def settle(self, score0, score1):
+        '''
+        Ends the round at showdown, given the players' hand scores.
+        '''
+        if score0 > score1:
+            delta = STARTING_STACK - self.stacks[1]
+        elif score0 < score1:
+            delta = self.stacks[0] - STARTING_STACK
+        else:  # split the pot
+            delta = (self.stacks[0] - self.stacks[1]) // 2
+        self.terminal = True
+        self.deltas[0] = delta
+        self.deltas[1] = -delta
+
+    def showdown(self):
+        '''
+        Compares the players' hands and computes payoffs, in place.
+        '''
+        board = self.deck.peek(5)
+        self.settle(eval7.evaluate(board + self.hands[0]), eval7.evaluate(board + self.hands[1]))
+
+    def legal_actions(self):
+        '''
+        Returns a set which corresponds to the active player's legal moves.
+        '''
+        mask = legal_mask(self.button % 2, self.pips[0], self.pips[1], self.stacks[0], self.stacks[1])
+        return set(MASK_ACTIONS[mask])
+
+    def raise_bounds(self):
+        '''
+        Returns a tuple of the minimum and maximum legal raises.
+        '''
+        return raise_range(self.button % 2, self.pips[0], self.pips[1], self.stacks[0], self.stacks[1])
+
+    def proceed_street(self):
+        '''
+        Resets the players' pips and advances the game tree to the next round of betting, in place.
+        '''
+        if self.street == 5:
+            self.showdown()
+            return
+        self.button = 1
+        self.street = 3 if self.street == 0 else self.street + 1
+        self.pips[0] = 0
+        self.pips[1] = 0
+
+    def apply(self, action):
+        '''
+        Advances the game tree by one action performed by the active player, in place.
+        '''
+        pips = self.pips
+        stacks = self.stacks
+        self.history.extend((self.button, self.street, pips[0], pips[1], stacks[0], stacks[1]))
+        self.actions.append(action)
+        active = self.button % 2
+        if isinstance(action, FoldAction):
+            delta = stacks[0] - STARTING_STACK if active == 0 else STARTING_STACK - stacks[1]
+            self.terminal = True
+            self.deltas[0] = delta
+            self.deltas[1] = -delta
+        elif isinstance(action, CallAction):
+            if self.button == 0:  # sb calls bb
+                self.button = 1
+                pips[0] = pips[1] = BIG_BLIND
+                stacks[0] = stacks[1] = STARTING_STACK - BIG_BLIND
+                return
+            # both players acted
+            contribution = pips[1-active] - pips[active]
+            stacks[active] -= contribution
+            pips[active] += contribution
+            self.button += 1
+            self.proceed_street()
+        elif isinstance(action, CheckAction):
+            if (self.street == 0 and self.button > 0) or self.button > 1:  # both players acted
+                self.proceed_street()
+            else:  # let opponent act
+                self.button += 1
+        else:  # isinstance(action, RaiseAction)
+            contribution = action.amount - pips[active]
+            stacks[active] -= contribution
+            pips[active] += contribution
+            self.button += 1
+
+    def undo(self):
+        '''
+        Reverts the most recent action in the action log, in place.
+        '''
+        self.actions.pop()
+        history = self.history
+        self.stacks[1] = history.pop()
+        self.stacks[0] = history.pop()
+        self.pips[1] = history.pop()
+        self.pips[0] = history.pop()
+        self.street = history.pop()
+        self.button = history.pop()
+        self.terminal = False
+
+    def proceed(self, action):
+        '''
+        Returns a copy of the state advanced by one action, leaving this state untouched.
+        '''
+        state = self.copy()
+        state.apply(action)
+        return state
+
+
 class Player():
     '''
     Handles subprocess and socket interactions with one player's pokerbot.
     '''
 
-    def __init__(self, name, path):
+    def __init__(self, name, path, log_filename=None):
         self.name = name
         self.path = path
+        self.log_filename = name if log_filename is None else log_filename
         self.game_clock = STARTING_GAME_CLOCK
         self.bankroll = 0
         self.commands = None
         self.bot_subprocess = None
         self.socketfile = None
-        self.bytes_queue = Queue()
+        self.binary = False
+        self.reusable = False
+        self.coalesce = False
+        self.unsent_clauses = []  # with coalesce, the last round's result, sent with the next message
+        self.seeds = set()  # the deck seeds of the games played, which a BotPool never deals again
+        self.latency = None
+        self.output = OutputLog(PLAYER_LOG_SIZE_LIMIT)  # what the pokerbot printed, built and run
+        self.output_closed = None  # set once the pokerbot's stdout is closed and captured
 
     def build(self):
         '''
@@ -170,46 +448,54 @@ class Player():
         except json.decoder.JSONDecodeError:
             print(self.name, 'commands.json misformatted')
         if self.commands is not None and len(self.commands['build']) > 0:
+            if BUILD_CACHE_PATH is not None and build_is_cached(self.path):
+                print(self.name, 'is unchanged since its last build')
+                return
             try:
                 proc = subprocess.run(self.commands['build'],
                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
                                       cwd=self.path, timeout=BUILD_TIMEOUT, check=False)
-                self.bytes_queue.put(proc.stdout)
+                self.output.write(proc.stdout)
+                if BUILD_CACHE_PATH is not None and proc.returncode == 0:
+                    cache_build(self.path)
             except subprocess.TimeoutExpired as timeout_expired:
                 error_message = 'Timed out waiting for ' + self.name + ' to build'
                 print(error_message)
-                self.bytes_queue.put(timeout_expired.stdout)
-                self.bytes_queue.put(error_message.encode())
+                self.output.write(timeout_expired.stdout)
+                self.output.write(error_message.encode())
             except (TypeError, ValueError):
                 print(self.name, 'build command misformatted')
             except OSError:
                 print(self.name, 'build failed - check "build" in commands.json')
 
-    def run(self):
+    def run(self, features=()):
         '''
         Runs the pokerbot and establishes the socket connection.
+        The pokerbot receives the address to connect to as its last argument:
+        a TCP port, or the path of a Unix domain socket.
+        Any optional protocol features are offered to the pokerbot once it connects.
         '''
         if self.commands is not None and len(self.commands['run']) > 0:
+            socket_directory = None
             try:
-                server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                if TRANSPORT == 'unix':
+                    socket_directory = tempfile.mkdtemp(prefix='pokerbots-')
+                    server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    bind_address = os.path.join(socket_directory, 'engine.sock')
+                else:
+                    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    bind_address = ('', 0)
                 with server_socket:
-                    server_socket.bind(('', 0))
+                    server_socket.bind(bind_address)
                     server_socket.settimeout(CONNECT_TIMEOUT)
                     server_socket.listen()
-                    port = server_socket.getsockname()[1]
-                    proc = subprocess.Popen(self.commands['run'] + [str(port)],
+                    address = bind_address if TRANSPORT == 'unix' else server_socket.getsockname()[1]
+                    proc = subprocess.Popen(self.commands['run'] + [str(address)],
                                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
                                             cwd=self.path)
                     self.bot_subprocess = proc
-                    # function for bot listening
-                    def enqueue_output(out, queue):
-                        try:
-                            for line in out:
-                                queue.put(line)
-                        except ValueError:
-                            pass
-                    # start a separate bot listening thread which dies with the program
-                    Thread(target=enqueue_output, args=(proc.stdout, self.bytes_queue), daemon=True).start()
+                    # one shared thread captures every bot's output as it arrives
+                    self.output_closed = capture_output(proc.stdout, self.output)
                     # block until we timeout or the player connects
                     client_socket, _ = server_socket.accept()
                     with client_socket:
@@ -217,20 +503,28 @@ class Player():
                         sock = client_socket.makefile('rw')
                         self.socketfile = sock
                         print(self.name, 'connected successfully')
+                        features = (['binary'] if WIRE_PROTOCOL == 'binary' else []) + list(features)
+                        if COALESCE_ROUND_RESULTS:
+                            features.append('coalesce')
+                        if features:
+                            self.negotiate(features)
             except (TypeError, ValueError):
                 print(self.name, 'run command misformatted')
             except OSError:
                 print(self.name, 'run failed - check "run" in commands.json')
             except socket.timeout:
                 print('Timed out waiting for', self.name, 'to connect')
+            finally:
+                if socket_directory is not None:  # the connection outlives the socket's name
+                    shutil.rmtree(socket_directory, ignore_errors=True)
 
-    def stop(self):
+    def stop(self, log=True):
         '''
-        Closes the socket connection and stops the pokerbot.
+        Closes the socket connection and stops the pokerbot, then writes its log unless told otherwise.
         '''
         if self.socketfile is not None:
             try:
-                self.socketfile.write('Q\n')
+                self.send_final_message('Q')
                 self.socketfile.close()
             except socket.timeout:
                 print('Timed out waiting for', self.name, 'to disconnect')
@@ -238,76 +532,439 @@ class Player():
                 print('Could not close socket connection with', self.name)
         if self.bot_subprocess is not None:
             try:
-                outs, _ = self.bot_subprocess.communicate(timeout=CONNECT_TIMEOUT)
-                self.bytes_queue.put(outs)
+                self.bot_subprocess.wait(timeout=CONNECT_TIMEOUT)
             except subprocess.TimeoutExpired:
                 print('Timed out waiting for', self.name, 'to quit')
                 self.bot_subprocess.kill()
-                outs, _ = self.bot_subprocess.communicate()
-                self.bytes_queue.put(outs)
-        with open(self.name + '.txt', 'wb') as log_file:
-            bytes_written = 0
-            for output in self.bytes_queue.queue:
-                try:
-                    bytes_written += log_file.write(output)
-                    if bytes_written >= PLAYER_LOG_SIZE_LIMIT:
-                        break
-                except TypeError:
-                    pass
+                self.bot_subprocess.wait()
+            if not self.output_closed.wait(CONNECT_TIMEOUT):
+                print('Timed out waiting for the rest of', self.name + '\'s output')
+        if log:
+            self.write_log()
+
+    def start_game(self, name, log_filename):
+        '''
+        Readies a pokerbot kept running from an earlier game to play the next one.
+        '''
+        self.name = name
+        self.log_filename = log_filename
+        self.game_clock = STARTING_GAME_CLOCK
+        self.bankroll = 0
+        self.latency = None
+
+    def reset(self):
+        '''
+        Writes the finished game's log and starts a new game with the pokerbot on the same connection.
+        '''
+        self.send_new_game()
+        self.write_log()
+        self.output.clear()
+
+    def send_new_game(self):
+        '''
+        Tells the pokerbot that the game is over and another one follows.
+        '''
+        self.send_final_message('N')
+
+    def send_final_message(self, code):
+        '''
+        Sends the message that ends a game, Q or N, after any clauses the pokerbot is still owed.
+        No response is expected.
+        '''
+        clauses = self.unsent_clauses + [code]
+        self.unsent_clauses = []
+        if len(clauses) > 1:
+            clauses.insert(0, 'T{:.3f}'.format(self.game_clock))
+        if self.binary:
+            if len(clauses) > 1:
+                self.socketfile.buffer.write(self.format_message(clauses))
+            else:
+                self.socketfile.buffer.write(struct.pack('!H', 1) + code.encode())
+            self.socketfile.buffer.flush()
+        else:
+            self.socketfile.write(' '.join(clauses) + '\n')
+            self.socketfile.flush()
+
+    def write_log(self):
+        '''
+        Writes the pokerbot's output, up to PLAYER_LOG_SIZE_LIMIT bytes.
+        '''
+        if self.output.dropped:
+            print(self.name, 'printed', self.output.dropped, 'bytes over PLAYER_LOG_SIZE_LIMIT, which were dropped')
+        self.output.dump(self.log_filename + '.txt')
+
+    def connected(self):
+        '''
+        Returns whether the pokerbot can be queried.
+        '''
+        return self.socketfile is not None
+
+    def negotiate(self, features):
+        '''
+        Offers optional protocol features to the pokerbot and enables the ones it accepts.
+        '''
+        try:
+            self.socketfile.write('W' + ','.join(features) + '\n')
+            self.socketfile.flush()
+            clause = self.socketfile.readline().strip()
+        except socket.timeout:
+            print('Timed out waiting for', self.name, 'to negotiate the protocol')
+            return
+        except OSError:
+            print('Could not negotiate the protocol with', self.name)
+            return
+        self.accept_features(clause)
+
+    def accept_features(self, clause):
+        '''
+        Enables the optional protocol features the pokerbot accepted, given its response to the offer.
+        '''
+        accepted = clause[1:].split(',') if clause[:1] == 'W' else []
+        self.binary = 'binary' in accepted
+        self.reusable = 'newgame' in accepted
+        self.coalesce = 'coalesce' in accepted
+        print(self.name, 'uses the', 'binary' if self.binary else 'text', 'protocol')
+
+    def format_message(self, player_message):
+        '''
+        Encodes a list of clauses as one message for the socket connection.
+        '''
+        if self.binary:
+            clock = player_message[0]
+            payload = BINARY_CLOCK.pack(b'T', round(float(clock[1:]) * 1000)) + b''.join(
+                [binary_clause(clause) for clause in player_message[1:]])
+            return struct.pack('!H', len(payload)) + payload
+        return ' '.join(player_message) + '\n'
+
+    def exchange(self, message):
+        '''
+        Sends one message to the pokerbot and returns the clause it responds with.
+        '''
+        if self.binary:
+            stream = self.socketfile.buffer
+            stream.write(message)
+            stream.flush()
+            header = stream.read(2)
+            if len(header) < 2:
+                return ''
+            payload = stream.read(struct.unpack('!H', header)[0])
+            if payload[:1] == b'R' and len(payload) == 3:
+                return 'R' + str(struct.unpack_from('!H', payload, 1)[0])
+            return payload.decode()
+        self.socketfile.write(message)
+        self.socketfile.flush()
+        return self.socketfile.readline().strip()
+
+    @staticmethod
+    def legal_responses(round_state):
+        '''
+        Returns the actions the pokerbot may respond to a query with.
+        At the end of the round, we request a CheckAction from the pokerbot.
+        '''
+        return {CheckAction} if isinstance(round_state, TerminalState) else round_state.legal_actions()
+
+    def start_query(self, player_message):
+        '''
+        Stamps the game clock on the clauses for the pokerbot and encodes them as one message.
+        The clauses after the clock are cleared, so that they are not sent again.
+        '''
+        player_message[0] = 'T{:.3f}'.format(self.game_clock)
+        message = self.format_message(player_message)
+        del player_message[1:]  # do not send redundant action history
+        return message
 
     def query(self, round_state, player_message, game_log):
         '''
         Requests one action from the pokerbot over the socket connection.
-        At the end of the round, we request a CheckAction from the pokerbot.
         '''
-        legal_actions = round_state.legal_actions() if isinstance(round_state, RoundState) else {CheckAction}
-        if self.socketfile is not None and self.game_clock > 0.:
+        legal_actions = self.legal_responses(round_state)
+        if self.connected() and self.game_clock > 0.:
             try:
-                player_message[0] = 'T{:.3f}'.format(self.game_clock)
-                message = ' '.join(player_message) + '\n'
-                del player_message[1:]  # do not send redundant action history
+                message = self.start_query(player_message)
                 start_time = time.perf_counter()
-                self.socketfile.write(message)
-                self.socketfile.flush()
-                clause = self.socketfile.readline().strip()
+                clause = self.exchange(message)
                 end_time = time.perf_counter()
-                if ENFORCE_GAME_CLOCK:
-                    self.game_clock -= end_time - start_time
-                if self.game_clock <= 0.:
-                    raise socket.timeout
-                action = DECODE[clause[0]]
-                if action in legal_actions:
-                    if clause[0] == 'R':
-                        amount = int(clause[1:])
-                        min_raise, max_raise = round_state.raise_bounds()
-                        if min_raise <= amount <= max_raise:
-                            return action(amount)
-                    else:
-                        return action()
-                game_log.append(self.name + ' attempted illegal ' + action.__name__)
+                action = self.interpret(round_state, legal_actions, clause, end_time - start_time, game_log)
+                if action is not None:
+                    return action
             except socket.timeout:
-                error_message = self.name + ' ran out of time'
-                game_log.append(error_message)
-                print(error_message)
-                self.game_clock = 0.
+                self.forfeit(game_log, ' ran out of time')
             except OSError:
-                error_message = self.name + ' disconnected'
-                game_log.append(error_message)
-                print(error_message)
-                self.game_clock = 0.
+                self.forfeit(game_log, ' disconnected')
             except (IndexError, KeyError, ValueError):
                 game_log.append(self.name + ' response misformatted')
         return CheckAction() if CheckAction in legal_actions else FoldAction()
 
+    def interpret(self, round_state, legal_actions, clause, elapsed, game_log):
+        '''
+        Charges the response time to the game clock and decodes the action in the response.
+        Returns None if the action is illegal, and raises socket.timeout if the clock ran out.
+        '''
+        if ENFORCE_GAME_CLOCK:
+            self.game_clock -= elapsed
+        if self.latency is not None:
+            ack = isinstance(round_state, TerminalState)
+            street = round_state.previous_state.street if ack else round_state.street
+            self.latency.record(elapsed, street, clause, ack)
+        if self.game_clock <= 0.:
+            raise socket.timeout
+        action = DECODE[clause[0]]
+        if action in legal_actions:
+            if clause[0] == 'R':
+                amount = int(clause[1:])
+                min_raise, max_raise = round_state.raise_bounds()
+                if min_raise <= amount <= max_raise:
+                    return action(amount)
+            else:
+                return action()
+        game_log.append(self.name + ' attempted illegal ' + action.__name__)
+        return None
+
+    def forfeit(self, game_log, reason):
+        '''
+        Stops querying the pokerbot for the rest of the game.
+        '''
+        error_message = self.name + reason
+        game_log.append(error_message)
+        print(error_message)
+        self.game_clock = 0.
+
+
+class LocalPlayer(Player):
+    '''
+    Runs one player's Python pokerbot inside the engine process, without a subprocess or socket.
+    Meant for fast scrimmages; bots share the engine's working directory and are not sandboxed.
+    '''
+
+    def __init__(self, name, path, log_filename=None):
+        super().__init__(name, path, log_filename)
+        self.runner = None
+
+    def run(self, features=()):
+        '''
+        Imports the pokerbot from the Python script named in its "run" command.
+        Protocol features do not apply, as no messages are encoded.
+        '''
+        if self.commands is None:
+            return
+        scripts = [arg for arg in self.commands['run'] if isinstance(arg, str) and arg.endswith('.py')]
+        if not scripts:
+            print(self.name, 'run command is not a Python script - cannot run headless')
+            return
+        bot_path = os.path.abspath(self.path)
+        # every bot ships its own skeleton package, so each import needs a fresh copy
+        stale = lambda: [module for module in sys.modules if module.split('.')[0] in ('skeleton', 'player')]
+        sys.path.insert(0, bot_path)
+        try:
+            for module in stale():
+                del sys.modules[module]
+            spec = importlib.util.spec_from_file_location('player', os.path.join(bot_path, scripts[-1]))
+            bot_module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(bot_module)
+            runner_module = sys.modules['skeleton.runner']
+            bot_class = runner_module.Bot
+            candidates = [value for value in vars(bot_module).values()
+                          if isinstance(value, type) and issubclass(value, bot_class) and value is not bot_class]
+            if not candidates:
+                print(self.name, 'defines no Bot subclass')
+                return
+            self.runner = runner_module.Runner(candidates[-1](), None)
+            self.reusable = hasattr(self.runner, 'new_game')
+            print(self.name, 'loaded successfully')
+        except Exception:  # pylint: disable=broad-except
+            traceback.print_exc()
+            print(self.name, 'failed to load - check "run" in commands.json')
+        finally:
+            sys.path.remove(bot_path)
+            for module in stale():
+                del sys.modules[module]
+
+    def stop(self, log=True):
+        '''
+        Ends the game for the pokerbot and writes its build log unless told otherwise.
+        '''
+        if self.runner is not None:
+            try:
+                self.runner.handle_packet([('Q', None)])
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+            self.runner = None
+        super().stop(log)
+
+    def connected(self):
+        '''
+        Returns whether the pokerbot can be queried.
+        '''
+        return self.runner is not None
+
+    def send_new_game(self):
+        '''
+        Tells the pokerbot's runner that another game follows.
+        '''
+        self.runner.new_game()
+
+    def format_message(self, player_message):
+        '''
+        Hands the clauses to the pokerbot's runner as they are.
+        '''
+        return list(player_message)
+
+    def exchange(self, message):
+        '''
+        Calls the pokerbot directly and returns its action as a clause.
+        A pokerbot that raises an exception is treated as disconnected.
+        '''
+        try:
+            packet = [self.runner.parse(clause) for clause in message]
+            return self.runner.encode(self.runner.handle_packet(packet))
+        except Exception as exception:  # pylint: disable=broad-except
+            traceback.print_exc()
+            raise OSError from exception
+
+
+class BotPool():
+    '''
+    Keeps pokerbots running and connected between games, so that each is built and started once.
+    Pokerbots that accept the newgame feature are sent N instead of Q at the end of a game
+    and wait for the next one; the others are stopped as usual.
+    Without reuse, every game starts its own pokerbots, and only the builds are shared.
+    A pokerbot is never reused for a seeded game whose deals it has already played, such as the
+    mirrored half of a duplicate match, as it could remember the cards; a new one is started instead.
+    '''
+
+    def __init__(self, commands=None, reuse=True):
+        self.commands = {} if commands is None else dict(commands)  # the commands of each directory built
+        self.reuse = reuse
+        self.idle = {}
+
+    def acquire(self, name, path, log_filename, seed=None):
+        '''
+        Returns an idle pokerbot from this directory that has not played the deals of this seed,
+        or builds and starts a new one.
+        '''
+        player = self.take_idle(self.idle.get(path, []), seed)
+        if player is not None:
+            player.start_game(name, log_filename)
+        else:
+            player = (LocalPlayer if HEADLESS else Player)(name, path, log_filename)
+            if path in self.commands:
+                player.commands = self.commands[path]
+            else:
+                player.build()
+                self.commands[path] = player.commands
+            player.run(['newgame'] if self.reuse else [])
+        if seed is not None:
+            player.seeds.add(seed)
+        return player
+
+    @staticmethod
+    def take_idle(idle, seed):
+        '''
+        Removes and returns the last pokerbot of a list of idle ones that has not played the deals of this seed,
+        or returns None if there is none.
+        '''
+        for player in reversed(idle):
+            if seed is None or seed not in player.seeds:
+                idle.remove(player)
+                return player
+        return None
+
+    def release(self, player):
+        '''
+        Ends the game for a pokerbot, keeping it for the next game if it can be reused.
+        Pokerbots that ran out of time or disconnected are stopped, as they may be out of sync.
+        '''
+        if self.reuse and player.reusable and player.connected() and player.game_clock > 0.:
+            try:
+                player.reset()
+                self.idle.setdefault(player.path, []).append(player)
+                return
+            except OSError:
+                print('Could not start a new game with', player.name)
+        player.stop()
+
+    def close(self):
+        '''
+        Stops every idle pokerbot. Their logs were written at the end of their last game.
+        '''
+        for players in self.idle.values():
+            for player in players:
+                player.stop(log=False)
+        self.idle.clear()
+
+
+class GameLog():
+    '''
+    Streams the game log to a file in buffered batches, instead of keeping every line in memory.
+    The file contents are identical to writing all lines joined by newlines at the end of the game.
+    '''
+
+    def __init__(self, filename, lines=(), compression=None, flush_interval=1000):
+        if compression == 'gzip':
+            filename += '.gz'
+            self.log_file = gzip.open(filename, 'wt')
+        elif compression == 'zstd':
+            try:
+                import zstandard
+                filename += '.zst'
+                self.log_file = zstandard.open(filename, 'wt')
+            except ImportError:
+                print('zstandard is not installed - writing an uncompressed game log')
+                self.log_file = open(filename, 'w')
+        else:
+            self.log_file = open(filename, 'w')
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.lines = list(lines)
+        self.separator = ''
+
+    def append(self, line):
+        '''
+        Adds one line to the game log.
+        '''
+        self.lines.append(line)
+        if len(self.lines) >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes the buffered lines to the file.
+        '''
+        if self.lines:
+            self.log_file.write(self.separator + '\n'.join(self.lines))
+            self.log_file.flush()
+            self.separator = '\n'
+            self.lines.clear()
+
+    def close(self):
+        '''
+        Writes the remaining lines and closes the file.
+        '''
+        self.flush()
+        self.log_file.close()
+
 
 class Game():
     '''
     Manages logging and the high-level game procedure.
     '''
 
-    def __init__(self):
-        self.log = ['6.176 MIT Pokerbots - ' + PLAYER_1_NAME + ' vs ' + PLAYER_2_NAME]
+    def __init__(self, player_1=(PLAYER_1_NAME, PLAYER_1_PATH), player_2=(PLAYER_2_NAME, PLAYER_2_PATH),
+                 log_filename=GAME_LOG_FILENAME, seed=DECK_SEED, log_suffix='', pool=None, early_stop=EARLY_STOP):
+        self.player_specs = [player_1, player_2]
+        self.pool = pool  # a BotPool to take the pokerbots from and return them to, if any
+        self.log_filename = log_filename
+        self.log_suffix = log_suffix  # added to the name of every file the game writes
+        self.seed = seed
+        self.deck = StreamDeck(DeckStream(seed, NUM_ROUNDS)) if seed is not None else LazyDeck()
+        self.log = ['6.176 MIT Pokerbots - ' + player_1[0] + ' vs ' + player_2[0]]
+        self.hand_history = None
+        self.latency = None
         self.player_messages = [[], []]
+        self.early_stop = None
+        if early_stop:
+            self.early_stop = SequentialTest(EARLY_STOP_MARGIN, EARLY_STOP_ALPHA, EARLY_STOP_BETA,
+                                             EARLY_STOP_MIN_ROUNDS)
 
     def log_round_state(self, players, round_state):
         '''
@@ -318,8 +975,11 @@ class Game():
             self.log.append('{} posts the blind of {}'.format(players[1].name, BIG_BLIND))
             self.log.append('{} dealt {}'.format(players[0].name, PCARDS(round_state.hands[0])))
             self.log.append('{} dealt {}'.format(players[1].name, PCARDS(round_state.hands[1])))
-            self.player_messages[0] = ['T0.', 'P0', 'H' + CCARDS(round_state.hands[0])]
-            self.player_messages[1] = ['T0.', 'P1', 'H' + CCARDS(round_state.hands[1])]
+            for i, player in enumerate(players):
+                # with coalesce, the last round's result has not been sent yet
+                self.player_messages[i] = (['T0.'] + player.unsent_clauses +
+                                           ['P' + str(i), 'H' + CCARDS(round_state.hands[i])])
+                player.unsent_clauses = []
         elif round_state.street > 0 and round_state.button == 1:
             board = round_state.deck.peek(round_state.street)
             self.log.append(STREET_NAMES[round_state.street - 3] + ' ' + PCARDS(board) +
@@ -364,16 +1024,34 @@ class Game():
         self.player_messages[0].append('D' + str(round_state.deltas[0]))
         self.player_messages[1].append('D' + str(round_state.deltas[1]))
 
-    def run_round(self, players):
+    def deal_round(self):
         '''
-        Runs one round of poker.
+        Deals the cards of a new round and returns its first RoundState.
         '''
-        deck = eval7.Deck()
-        deck.shuffle()
-        hands = [deck.deal(2), deck.deal(2)]
+        hands = self.deck.next_round()
         pips = [SMALL_BLIND, BIG_BLIND]
         stacks = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
-        round_state = RoundState(0, 0, pips, stacks, hands, deck, None)
+        return RoundState(0, 0, pips, stacks, hands, self.deck, None)
+
+    def record_round(self, players, round_state, actions):
+        '''
+        Adds a finished round to the hand history, if one is being written.
+        '''
+        if self.hand_history is not None:
+            previous_state = round_state.previous_state
+            self.hand_history.record([player.name for player in players], round_state, actions,
+                                     encode(previous_state.hands[0] + previous_state.hands[1]),
+                                     previous_state.deck.board_codes(previous_state.street))
+
+    def run_round(self, players):
+        '''
+        Runs one round of poker.
+        '''
+        if self.latency is not None:
+            start_time = time.perf_counter()
+            bot_time = self.latency.bot_time()
+        round_state = self.deal_round()
+        actions = []
         while not isinstance(round_state, TerminalState):
             self.log_round_state(players, round_state)
             active = round_state.button % 2
@@ -381,15 +1059,39 @@ class Game():
             action = player.query(round_state, self.player_messages[active], self.log)
             bet_override = (round_state.pips == [0, 0])
             self.log_action(player.name, action, bet_override)
+            actions.append(action)
             round_state = round_state.proceed(action)
         self.log_terminal_state(players, round_state)
+        self.record_round(players, round_state, actions)
         for player, player_message, delta in zip(players, self.player_messages, round_state.deltas):
-            player.query(round_state, player_message, self.log)
+            if not player.coalesce:
+                player.query(round_state, player_message, self.log)
+            elif player.game_clock > 0.:
+                player.unsent_clauses = player_message[1:]
             player.bankroll += delta
+        if self.latency is not None:
+            round_time = time.perf_counter() - start_time
+            self.latency.engine_overhead.record(round_time - (self.latency.bot_time() - bot_time))
+
+    def settled(self, delta):
+        '''
+        Feeds the first player's delta from the last round to the early stop test, if any.
+        Returns whether a player is significantly ahead, after logging which.
+        '''
+        if self.early_stop is None:
+            return False
+        decision = self.early_stop.update(delta)
+        if decision == 0:
+            return False
+        reason = 'Stopped early: ' + self.early_stop.describe(decision, [name for name, _ in self.player_specs])
+        print(reason)
+        self.log.append('')
+        self.log.append(reason)
+        return True
 
     def run(self):
         '''
-        Runs one game of poker.
+        Runs one game of poker and returns the final bankroll of each player by name.
         '''
         print('   __  _____________  ___       __           __        __    ')
         print('  /  |/  /  _/_  __/ / _ \\___  / /_____ ____/ /  ___  / /____')
@@ -397,27 +1099,91 @@ class Game():
         print('/_/  /_/___/ /_/   /_/   \\___/_/\\_\\\\__/_/ /_.__/\\___/\\__/___/')
         print()
         print('Starting the Pokerbots engine...')
-        players = [
-            Player(PLAYER_1_NAME, PLAYER_1_PATH),
-            Player(PLAYER_2_NAME, PLAYER_2_PATH)
-        ]
-        for player in players:
-            player.build()
-            player.run()
+        if self.pool is None:
+            player_class = LocalPlayer if HEADLESS else Player
+            players = [player_class(name, path, name + self.log_suffix) for name, path in self.player_specs]
+            for player in players:
+                player.build()
+                player.run()
+        else:
+            players = [self.pool.acquire(name, path, name + self.log_suffix, self.seed)
+                       for name, path in self.player_specs]
+        self.open_logs(players)
+        first_player = players[0]
         for round_num in range(1, NUM_ROUNDS + 1):
             self.log.append('')
             self.log.append('Round #' + str(round_num) + STATUS(players))
+            bankroll = first_player.bankroll
             self.run_round(players)
             players = players[::-1]
+            if self.settled(first_player.bankroll - bankroll):
+                break
+        for player in players:
+            if self.pool is None:
+                player.stop()
+            else:
+                self.pool.release(player)
+        self.close_logs(players)
+        return {player.name: player.bankroll for player in players}
+
+    def open_logs(self, players):
+        '''
+        Starts streaming the game log, and any optional records of the game.
+        '''
+        self.log = GameLog(self.log_filename + self.log_suffix + '.txt', self.log,
+                           GAME_LOG_COMPRESSION, GAME_LOG_FLUSH_INTERVAL)
+        if HAND_HISTORY_FILENAME is not None:
+            try:
+                self.hand_history = HandHistory(HAND_HISTORY_FILENAME + self.log_suffix,
+                                                [name for name, _ in self.player_specs], HAND_HISTORY_BATCH_SIZE)
+            except ImportError:
+                print('numpy is not installed - not writing a hand history')
+        if LATENCY_PROFILE_FILENAME is not None:
+            self.latency = LatencyProfile([player.name for player in players])
+            for player in players:
+                player.latency = self.latency.players[player.name]
+
+    def close_logs(self, players):
+        '''
+        Finishes the game log, and writes the optional records of the game.
+        '''
         self.log.append('')
         self.log.append('Final' + STATUS(players))
-        for player in players:
-            player.stop()
-        name = GAME_LOG_FILENAME + '.txt'
-        print('Writing', name)
-        with open(name, 'w') as log_file:
-            log_file.write('\n'.join(self.log))
+        print('Writing', self.log.filename)
+        self.log.close()
+        if self.hand_history is not None:
+            print('Writing', self.hand_history.prefix + '.*.npz')
+            self.hand_history.close()
+        if self.latency is not None:
+            name = LATENCY_PROFILE_FILENAME + self.log_suffix + '.json'
+            print('Writing', name)
+            self.latency.write(name)
+            self.latency.print_summary()
+
+
+def run_duplicate_match():
+    '''
+    Plays the match twice on the same deals, with the seats swapped, and prints the combined result.
+    Each half starts its own pokerbots, so that none knows the deals in advance; only the builds are shared.
+    Both halves play every round, as the combined result only cancels out the luck of the deals they share.
+    '''
+    seed = random.randrange(1 << 32) if DECK_SEED is None else DECK_SEED
+    print('Playing a duplicate match with deck seed', seed)
+    if EARLY_STOP:
+        print('EARLY_STOP does not apply to duplicate matches - playing every round')
+    player_1 = (PLAYER_1_NAME, PLAYER_1_PATH)
+    player_2 = (PLAYER_2_NAME, PLAYER_2_PATH)
+    pool = BotPool(reuse=False)
+    try:
+        bankrolls = Game(player_1, player_2, seed=seed, pool=pool, early_stop=False).run()
+        swapped = Game(player_2, player_1, seed=seed, log_suffix='_duplicate', pool=pool, early_stop=False).run()
+    finally:
+        pool.close()
+    print('Duplicate total' + ''.join([PVALUE(name, bankrolls[name] + swapped[name]) for name in bankrolls]))
 
 
 if __name__ == '__main__':
-    Game().run()
+    if DUPLICATE_MATCH:
+        run_duplicate_match()
+    else:
+        Game().run()
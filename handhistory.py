@@ -0,0 +1,157 @@
+'''
+Structured, columnar hand histories for analytics.
+
+The engine records one row per round in compact fixed-width columns and writes them
+in batches of NumPy .npz files, <prefix>.<batch>.npz. Actions are ragged, so they are
+stored flat with per-round offsets, in the style of Arrow list columns.
+Use load_hand_history(prefix) to read every batch back as one dict of arrays.
+
+Columns:
+round_num     uint32 [n]     the round number
+button_player uint8  [n]     which player (0 for player 1, 1 for player 2) was the small blind
+hands         uint8  [n, 4]  both hole cards of seat 0, then of seat 1, as 4 * rank + suit
+board         uint8  [n, 5]  the board cards dealt by the end of the round, NO_CARD if not dealt
+street        uint8  [n]     0, 3, 4 or 5, the street the round ended on
+showdown      bool   [n]     whether the hands were shown
+pots          uint16 [n, 4]  the pot at the start of preflop, flop, turn and river, 0 if not reached
+deltas        int16  [n, 2]  the bankroll change of seat 0 and seat 1
+action_offsets uint32 [n+1]  round i made actions action_offsets[i] to action_offsets[i+1]
+action_codes  uint8  [m]     FOLD, CALL, CHECK or RAISE
+action_amounts uint16 [m]    the raise-to amount, 0 for other actions
+player_names  str    [2]     the names of player 1 and player 2
+'''
+from array import array
+import glob
+
+from config import STARTING_STACK
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+FOLD, CALL, CHECK, RAISE = range(4)
+ACTION_CODES = {'FoldAction': FOLD, 'CallAction': CALL, 'CheckAction': CHECK, 'RaiseAction': RAISE}
+NO_CARD = 255
+STREET_INDICES = {0: 0, 3: 1, 4: 2, 5: 3}
+
+
+class HandHistory():
+    '''
+    Buffers hand history rows in compact arrays and writes them in batches.
+    '''
+
+    def __init__(self, prefix, player_names, batch_size=100000):
+        if numpy is None:
+            raise ImportError('writing hand histories needs numpy')
+        self.prefix = prefix
+        self.player_names = list(player_names)
+        self.batch_size = batch_size
+        self.batch = 0
+        self.round_num = 0
+        self.reset()
+
+    def reset(self):
+        '''
+        Starts a new, empty batch.
+        '''
+        self.columns = {
+            'round_num': array('I'),
+            'button_player': array('B'),
+            'hands': array('B'),
+            'board': array('B'),
+            'street': array('B'),
+            'showdown': array('B'),
+            'pots': array('H'),
+            'deltas': array('h'),
+            'action_codes': array('B'),
+            'action_amounts': array('H'),
+        }
+        self.action_offsets = array('I', [0])
+
+    def record(self, seat_names, terminal_state, actions, hands, board):
+        '''
+        Adds one finished round.
+
+        seat_names: the names of the players in seat 0 and seat 1.
+        terminal_state: the TerminalState the round ended with.
+        actions: the actions taken, in order.
+        hands: the card codes of seat 0's hand followed by seat 1's.
+        board: the card codes of the board, at least as far as the round got.
+        '''
+        self.round_num += 1
+        columns = self.columns
+        states = []
+        state = terminal_state.previous_state
+        while state is not None:
+            states.append(state)
+            state = state.previous_state
+        pots = [0, 0, 0, 0]
+        for state in reversed(states):
+            index = STREET_INDICES[state.street]
+            if not pots[index]:
+                pots[index] = 2 * STARTING_STACK - state.stacks[0] - state.stacks[1]
+        final_state = states[0]
+        street = final_state.street
+        columns['round_num'].append(self.round_num)
+        columns['button_player'].append(self.player_names.index(seat_names[0]))
+        columns['hands'].extend(hands)
+        columns['board'].extend(board[:street])
+        columns['board'].extend([NO_CARD] * (5 - street))
+        columns['street'].append(street)
+        columns['showdown'].append(type(actions[-1]).__name__ != 'FoldAction')
+        columns['pots'].extend(pots)
+        columns['deltas'].extend(terminal_state.deltas)
+        for action in actions:
+            code = ACTION_CODES[type(action).__name__]
+            columns['action_codes'].append(code)
+            columns['action_amounts'].append(action.amount if code == RAISE else 0)
+        self.action_offsets.append(len(columns['action_codes']))
+        if len(columns['round_num']) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes the buffered rows as the next batch file.
+        '''
+        if not self.columns['round_num']:
+            return
+        count = len(self.columns['round_num'])
+        data = {name: numpy.frombuffer(column, dtype=column.typecode) for name, column in self.columns.items()}
+        data['hands'] = data['hands'].reshape(count, 4)
+        data['board'] = data['board'].reshape(count, 5)
+        data['pots'] = data['pots'].reshape(count, 4)
+        data['deltas'] = data['deltas'].reshape(count, 2)
+        data['showdown'] = data['showdown'].astype(bool)
+        data['action_offsets'] = numpy.frombuffer(self.action_offsets, dtype='I')
+        data['player_names'] = numpy.array(self.player_names)
+        numpy.savez('{}.{:05d}.npz'.format(self.prefix, self.batch), **data)
+        self.batch += 1
+        self.reset()
+
+    def close(self):
+        '''
+        Writes the last, partial batch.
+        '''
+        self.flush()
+
+
+def load_hand_history(prefix):
+    '''
+    Loads every batch written with this prefix as one dict of arrays.
+    '''
+    batches = [numpy.load(name) for name in sorted(glob.glob(glob.escape(prefix) + '.[0-9]*.npz'))]
+    if not batches:
+        raise FileNotFoundError('no hand history batches found for ' + prefix)
+    data = {}
+    for name in batches[0].files:
+        if name == 'player_names':
+            data[name] = batches[0][name]
+        elif name == 'action_offsets':
+            offsets = [batches[0][name]]
+            for batch in batches[1:]:
+                offsets.append(batch[name][1:] + offsets[-1][-1])
+            data[name] = numpy.concatenate(offsets)
+        else:
+            data[name] = numpy.concatenate([batch[name] for batch in batches])
+    return data
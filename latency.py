@@ -0,0 +1,161 @@
+'''
+Per-action latency profiling for the engine.
+
+Durations are counted in logarithmic histograms, so a profile stays the same size
+however many rounds are played. Percentiles are read off the histograms and are
+accurate to one bucket, about 12% with BUCKETS_PER_DECADE = 20.
+'''
+from array import array
+from collections import OrderedDict
+import json
+import math
+
+MIN_LATENCY = 1e-6  # seconds; faster responses share the first bucket
+BUCKETS_PER_DECADE = 20
+NUM_BUCKETS = 8 * BUCKETS_PER_DECADE + 2  # up to 100 seconds, then one overflow bucket
+STREET_NAMES = {0: 'Preflop', 3: 'Flop', 4: 'Turn', 5: 'River'}
+ACTION_NAMES = {'F': 'Fold', 'C': 'Call', 'K': 'Check', 'R': 'Raise'}
+PERCENTILES = [('p50', .5), ('p90', .9), ('p99', .99), ('p99.9', .999)]
+
+
+def bucket_bound(index):
+    '''
+    Returns the upper bound of a histogram bucket, in seconds.
+    '''
+    return MIN_LATENCY * 10 ** (index / BUCKETS_PER_DECADE)
+
+
+class LatencyHistogram():
+    '''
+    Counts durations in logarithmic buckets.
+    '''
+
+    def __init__(self):
+        self.counts = array('Q', [0]) * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.
+        self.maximum = 0.
+
+    def record(self, seconds):
+        '''
+        Adds one duration.
+        '''
+        if seconds <= MIN_LATENCY:
+            index = 0
+        else:
+            index = min(NUM_BUCKETS - 1, math.ceil(math.log10(seconds / MIN_LATENCY) * BUCKETS_PER_DECADE))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def percentile(self, fraction):
+        '''
+        Returns the upper bound of the bucket holding the given fraction of durations.
+        '''
+        if not self.count:
+            return 0.
+        target = fraction * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bucket_bound(index), self.maximum)
+        return self.maximum
+
+    def summary(self):
+        '''
+        Returns the count, mean, maximum and percentiles, in seconds.
+        '''
+        summary = OrderedDict([('count', self.count), ('mean', self.total / self.count if self.count else 0.),
+                               ('max', self.maximum)])
+        for name, fraction in PERCENTILES:
+            summary[name] = self.percentile(fraction)
+        return summary
+
+    def to_dict(self):
+        '''
+        Returns the summary and the nonempty buckets, keyed by their upper bounds.
+        '''
+        data = self.summary()
+        data['total'] = self.total
+        data['buckets'] = [[bucket_bound(index), count] for index, count in enumerate(self.counts) if count]
+        return data
+
+
+class PlayerLatency():
+    '''
+    One player's response times, overall and broken down by phase, street and action.
+    '''
+
+    def __init__(self):
+        self.overall = LatencyHistogram()
+        self.breakdowns = OrderedDict([('phase', OrderedDict()), ('street', OrderedDict()), ('action', OrderedDict())])
+
+    def record(self, seconds, street, clause, ack):
+        '''
+        Adds one response: an action, or the ack at the end of a round.
+        '''
+        self.overall.record(seconds)
+        keys = [('phase', 'Ack' if ack else 'Action'), ('street', STREET_NAMES.get(street, str(street))),
+                ('action', 'Ack' if ack else ACTION_NAMES.get(clause[:1], 'Misformatted'))]
+        for breakdown, key in keys:
+            histograms = self.breakdowns[breakdown]
+            if key not in histograms:
+                histograms[key] = LatencyHistogram()
+            histograms[key].record(seconds)
+
+
+class LatencyProfile():
+    '''
+    The latency profile of one game: every player's response times,
+    and the time the engine itself spends on each round.
+    '''
+
+    def __init__(self, names):
+        self.players = OrderedDict((name, PlayerLatency()) for name in names)
+        self.engine_overhead = LatencyHistogram()
+
+    def bot_time(self):
+        '''
+        Returns the total time spent waiting for the players so far.
+        '''
+        return sum(player.overall.total for player in self.players.values())
+
+    def to_dict(self):
+        '''
+        Returns the whole profile as JSON-serializable data.
+        '''
+        players = OrderedDict()
+        for name, player in self.players.items():
+            players[name] = OrderedDict([('overall', player.overall.to_dict())])
+            for breakdown, histograms in player.breakdowns.items():
+                players[name][breakdown] = OrderedDict((key, histogram.to_dict())
+                                                       for key, histogram in histograms.items())
+        return OrderedDict([('unit', 'seconds'), ('players', players),
+                            ('engine_overhead_per_round', self.engine_overhead.to_dict())])
+
+    def write(self, filename):
+        '''
+        Writes the profile as JSON.
+        '''
+        with open(filename, 'w') as json_file:
+            json.dump(self.to_dict(), json_file, indent=1)
+
+    def print_summary(self):
+        '''
+        Prints the percentiles of every breakdown, in milliseconds.
+        '''
+        header = '{:<24}' + '{:>10}' * (3 + len(PERCENTILES))
+        print(header.format('Latency (ms)', 'count', 'mean', *[name for name, _ in PERCENTILES], 'max'))
+        row = '{:<24}{:>10}' + '{:>10.3f}' * (2 + len(PERCENTILES))
+        def print_row(label, histogram):
+            summary = histogram.summary()
+            print(row.format(label, summary['count'], 1000 * summary['mean'],
+                             *[1000 * summary[name] for name, _ in PERCENTILES], 1000 * summary['max']))
+        for name, player in self.players.items():
+            print_row(name, player.overall)
+            for histograms in player.breakdowns.values():
+                for key, histogram in histograms.items():
+                    print_row('  ' + key, histogram)
+        print_row('Engine per round', self.engine_overhead)
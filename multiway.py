@@ -0,0 +1,274 @@
+'''
+6.176 MIT POKERBOTS MULTIWAY TABLES
+The engine's betting rules for tables of 2 to 10 seats, with side pots, and many tables stepped at once.
+
+Seat 0 posts the small blind and seat 1 the big blind, so with three or more seats the button
+is the last seat. Preflop, the seat after the big blind acts first; after the flop, the first
+seat still in the hand after the button does. Heads-up, this is the engine's order.
+Minimum raises follow the engine: a raise must be at least the size of the last bet or raise,
+and at least the big blind. No one may bet more than the largest stack still able to call it.
+multiway_engine.py plays games of pokerbots with these rules.
+'''
+from array import array
+
+from engine import FoldAction, CallAction, CheckAction, RaiseAction
+from engine import STARTING_STACK, BIG_BLIND, SMALL_BLIND
+from evaluator import evaluate_batch
+from simulator import BatchSimulator, play_randomly
+
+MIN_SEATS = 2
+MAX_SEATS = 10
+
+
+def side_pots(contributions, folded):
+    '''
+    Splits the chips every seat put in into the main pot and the side pots, in O(n log n).
+
+    Returns (amount, seats) pairs from the main pot up, where seats are the seats still
+    in the hand whose chips run out at that pot. A pot is contested by its own seats and
+    by the seats of every pot above it. Folded seats' chips go to the pots they reached.
+    '''
+    order = sorted(range(len(contributions)), key=contributions.__getitem__)
+    pots = []
+    amount = 0
+    previous = 0
+    for index, seat in enumerate(order):
+        contribution = contributions[seat]
+        amount += (contribution - previous) * (len(order) - index)
+        previous = contribution
+        if not folded[seat]:
+            if pots and not amount:  # tied with the seats of the pot below
+                pots[-1][1].append(seat)
+            else:
+                pots.append((amount, [seat]))
+                amount = 0
+    if amount:  # chips a folded seat put in above every seat still in the hand
+        pots[-1] = (pots[-1][0] + amount, pots[-1][1])
+    return pots
+
+
+class MultiwayRoundState():
+    '''
+    One round at a table of 2 to 10 seats, updated in place.
+    Cards are codes, 4 * rank + suit: two per seat in hands, and five in board.
+    Work per action is constant, apart from finding the next seat to act.
+    '''
+    __slots__ = ['num_seats', 'hands', 'board', 'scores', 'street', 'active', 'pips', 'stacks', 'folded',
+                 'bet', 'last_raise', 'to_act', 'num_live', 'num_able', 'terminal', 'deltas']
+
+    def __init__(self, num_seats, hands=(), board=(), scores=None):
+        if not MIN_SEATS <= num_seats <= MAX_SEATS:
+            raise ValueError('a table seats {} to {} players'.format(MIN_SEATS, MAX_SEATS))
+        self.num_seats = num_seats
+        self.pips = [0] * num_seats
+        self.stacks = [STARTING_STACK] * num_seats
+        self.folded = bytearray(num_seats)
+        self.deltas = [0] * num_seats
+        self.deal(hands, board, scores)
+
+    def deal(self, hands, board, scores=None):
+        '''
+        Starts a new round in place. With scores, the hand score of every seat,
+        the showdown uses them instead of evaluating the hands.
+        '''
+        num_seats = self.num_seats
+        self.hands = hands
+        self.board = board
+        self.scores = scores
+        for seat in range(num_seats):
+            self.pips[seat] = 0
+            self.stacks[seat] = STARTING_STACK
+            self.folded[seat] = 0
+            self.deltas[seat] = 0
+        self.pips[0] = SMALL_BLIND
+        self.pips[1] = BIG_BLIND
+        self.stacks[0] -= SMALL_BLIND
+        self.stacks[1] -= BIG_BLIND
+        self.street = 0
+        self.bet = BIG_BLIND
+        self.last_raise = BIG_BLIND
+        self.to_act = num_seats
+        self.num_live = num_seats  # seats that have not folded
+        self.num_able = num_seats  # seats that have not folded and can still bet
+        self.active = 2 % num_seats
+        self.terminal = False
+
+    def first_seat(self):
+        '''
+        Returns the seat after the button, which is first to act after the flop.
+        '''
+        return 1 if self.num_seats == 2 else 0
+
+    def next_seat(self, seat):
+        '''
+        Returns the next seat after this one that can still act.
+        '''
+        num_seats = self.num_seats
+        for offset in range(1, num_seats + 1):
+            candidate = (seat + offset) % num_seats
+            if not self.folded[candidate] and self.stacks[candidate] > 0:
+                return candidate
+        return seat
+
+    def legal_actions(self):
+        '''
+        Returns a set which corresponds to the active seat's legal moves.
+        '''
+        active = self.active
+        continue_cost = self.bet - self.pips[active]
+        # we can only raise the stakes if someone else can afford to call
+        others_able = self.num_able > 1
+        if continue_cost == 0:
+            return {CheckAction, RaiseAction} if others_able else {CheckAction}
+        raises_forbidden = (continue_cost >= self.stacks[active] or not others_able)
+        return {FoldAction, CallAction} if raises_forbidden else {FoldAction, CallAction, RaiseAction}
+
+    def raise_bounds(self):
+        '''
+        Returns a tuple of the minimum and maximum legal raises.
+        '''
+        active = self.active
+        pips = self.pips
+        stacks = self.stacks
+        continue_cost = self.bet - pips[active]
+        largest_call = max([stacks[seat] + pips[seat] for seat in range(self.num_seats)
+                            if seat != active and not self.folded[seat]])
+        max_contribution = min(stacks[active], largest_call - pips[active])
+        min_contribution = min(max_contribution, continue_cost + max(self.last_raise, BIG_BLIND))
+        return (pips[active] + min_contribution, pips[active] + max_contribution)
+
+    def apply(self, action):
+        '''
+        Advances the round by one action performed by the active seat, in place.
+        '''
+        active = self.active
+        pips = self.pips
+        stacks = self.stacks
+        if isinstance(action, FoldAction):
+            self.folded[active] = 1
+            self.num_live -= 1
+            self.num_able -= 1
+            self.to_act -= 1
+        elif isinstance(action, CallAction):
+            contribution = self.bet - pips[active]
+            stacks[active] -= contribution
+            pips[active] += contribution
+            self.to_act -= 1
+            if stacks[active] == 0:
+                self.num_able -= 1
+        elif isinstance(action, CheckAction):
+            self.to_act -= 1
+        else:  # isinstance(action, RaiseAction)
+            stacks[active] -= action.amount - pips[active]
+            pips[active] = action.amount
+            self.last_raise = action.amount - self.bet
+            self.bet = action.amount
+            if stacks[active] == 0:
+                self.num_able -= 1
+            # everyone else who can still bet acts again
+            self.to_act = self.num_able - (1 if stacks[active] > 0 else 0)
+        if self.num_live == 1:
+            self.settle([0] * self.num_seats)
+        elif self.to_act <= 0:
+            self.proceed_street()
+        else:
+            self.active = self.next_seat(active)
+
+    def proceed_street(self):
+        '''
+        Resets the pips and advances to the next round of betting, in place.
+        When fewer than two seats can still bet, the rest of the board is dealt out.
+        '''
+        if self.street == 5 or self.num_able < 2:
+            self.showdown()
+            return
+        self.street = 3 if self.street == 0 else self.street + 1
+        for seat in range(self.num_seats):
+            self.pips[seat] = 0
+        self.bet = 0
+        self.last_raise = 0
+        self.to_act = self.num_able
+        self.active = self.next_seat(self.first_seat() - 1)
+
+    def showdown(self):
+        '''
+        Ranks the hands of every seat still in the hand in one batched evaluation, and pays out.
+        '''
+        scores = self.scores
+        if scores is None:
+            live = [seat for seat in range(self.num_seats) if not self.folded[seat]]
+            hands = array('B')
+            for seat in live:
+                hands.extend(self.hands[2*seat:2*seat+2])
+            scores = [0] * self.num_seats
+            for seat, score in zip(live, evaluate_batch(self.board[:5], hands)):
+                scores[seat] = score
+        self.settle(scores)
+
+    def settle(self, scores):
+        '''
+        Ends the round, awarding every pot to the best hands contesting it.
+        Split pots give their odd chips to the winners closest after the button.
+        '''
+        num_seats = self.num_seats
+        first = self.first_seat()
+        contributions = [STARTING_STACK - stack for stack in self.stacks]
+        winnings = [0] * num_seats
+        best = None
+        winners = []
+        # walk down from the top pot, as the seats contesting a pot contest every pot below it
+        for amount, seats in reversed(side_pots(contributions, self.folded)):
+            for seat in seats:
+                if best is None or scores[seat] > best:
+                    best = scores[seat]
+                    winners = [seat]
+                elif scores[seat] == best:
+                    winners.append(seat)
+            share, odd_chips = divmod(amount, len(winners))
+            for rank, seat in enumerate(sorted(winners, key=lambda seat: (seat - first) % num_seats)):
+                winnings[seat] += share + (1 if rank < odd_chips else 0)
+        for seat in range(num_seats):
+            self.deltas[seat] = winnings[seat] - contributions[seat]
+        self.terminal = True
+
+
+class MultiwaySimulator(BatchSimulator):
+    '''
+    Steps a batch of independent tables with the same number of seats, like simulator.Simulator.
+    Every seat's hand is scored when the round is dealt, in one batch call for all tables.
+    '''
+
+    def __init__(self, num_tables, num_seats, seed=None):
+        super().__init__([MultiwayRoundState(num_seats) for _ in range(num_tables)], num_seats, seed)
+
+    def reset(self, indices=None):
+        '''
+        Deals new rounds to the given tables, or to every table, and returns the observation.
+        '''
+        num_seats = self.num_seats
+        indices = range(len(self.tables)) if indices is None else indices
+        deck = range(52)
+        deals = [self.rng.sample(deck, 2 * num_seats + 5) for _ in indices]
+        boards = array('B')
+        hands = array('B')
+        for cards in deals:
+            boards.extend(cards[2*num_seats:] * num_seats)
+            hands.extend(cards[:2*num_seats])
+        scores = evaluate_batch(boards, hands)
+        for n, (i, cards) in enumerate(zip(indices, deals)):
+            self.tables[i].deal(cards[:2*num_seats], cards[2*num_seats:], scores[num_seats*n:num_seats*(n+1)])
+            self.dones[i] = 0
+            for seat in range(num_seats):
+                self.rewards[num_seats*i+seat] = 0
+        return self.observe()
+
+
+def random_self_play(num_tables=1000, num_seats=6, num_batches=20, seed=0):
+    '''
+    Plays random legal actions at every table, and returns the number of rounds played per second.
+    '''
+    return play_randomly(MultiwaySimulator(num_tables, num_seats, seed), num_batches, seed)
+
+
+if __name__ == '__main__':
+    print('{:.0f} six-seat rounds per second'.format(random_self_play()))
@@ -0,0 +1,172 @@
+'''
+6.176 MIT POKERBOTS MULTIWAY GAME ENGINE
+Plays one game of NUM_ROUNDS rounds at a table of 2 to 10 pokerbots, with the rules of multiway.py.
+The seats move every round: the small blind of one round is the button of the next.
+
+Multiway pokerbots use the skeleton's MultiwayRunner, over the text protocol. Each player's first
+message of a round is S, the number of seats, P, its seat, and H, its cards, after any actions of
+the seats before it. Every action and board is sent to every player, as in engine.py. At the end
+of the round, each other hand shown comes as O, the seat then the cards, followed by one D clause
+with every seat's delta, in seat order, which the player acks.
+HEADLESS, EARLY_STOP, DUPLICATE_MATCH and the optional records of engine.py are heads-up only.
+'''
+import argparse
+import random
+
+from engine import Player, GameLog, TerminalState, FoldAction, CallAction, CheckAction
+from engine import GAME_LOG_FILENAME, GAME_LOG_COMPRESSION, GAME_LOG_FLUSH_INTERVAL, DECK_SEED, NUM_ROUNDS
+from engine import STARTING_STACK, BIG_BLIND, SMALL_BLIND, STREET_NAMES, CCARDS, PCARDS, PVALUE, STATUS
+from evaluator import decode
+from multiway import MultiwayRoundState, MIN_SEATS, MAX_SEATS
+from tournament import make_roster
+
+
+class MultiwayGame():
+    '''
+    Manages logging and the high-level game procedure at one table.
+    '''
+
+    def __init__(self, player_specs, log_filename=GAME_LOG_FILENAME, seed=DECK_SEED):
+        if not MIN_SEATS <= len(player_specs) <= MAX_SEATS:
+            raise ValueError('a table seats {} to {} players'.format(MIN_SEATS, MAX_SEATS))
+        self.player_specs = player_specs
+        self.log_filename = log_filename
+        self.rng = random.Random(seed)
+        self.log = ['6.176 MIT Pokerbots - ' + ' vs '.join([name for name, _ in player_specs])]
+        self.player_messages = [[] for _ in player_specs]
+
+    def send(self, clause):
+        '''
+        Adds a clause to every player's next message.
+        '''
+        for player_message in self.player_messages:
+            player_message.append(clause)
+
+    def deal_round(self, players):
+        '''
+        Deals the cards of a new round and returns its state, after logging the blinds and the hands.
+        '''
+        num_seats = len(players)
+        cards = self.rng.sample(range(52), 2 * num_seats + 5)
+        round_state = MultiwayRoundState(num_seats, cards[:2*num_seats], cards[2*num_seats:])
+        self.log.append('{} posts the blind of {}'.format(players[0].name, SMALL_BLIND))
+        self.log.append('{} posts the blind of {}'.format(players[1].name, BIG_BLIND))
+        for seat, player in enumerate(players):
+            hand = decode(cards[2*seat:2*seat+2])
+            self.log.append('{} dealt {}'.format(player.name, PCARDS(hand)))
+            self.player_messages[seat] = ['T0.', 'S' + str(num_seats), 'P' + str(seat), 'H' + CCARDS(hand)]
+        return round_state
+
+    def log_street(self, players, round_state):
+        '''
+        Logs and sends the board when a new round of betting starts.
+        '''
+        board = decode(round_state.board[:round_state.street])
+        self.log.append(STREET_NAMES[round_state.street - 3] + ' ' + PCARDS(board) +
+                        ''.join([PVALUE(player.name, STARTING_STACK - stack)
+                                 for player, stack in zip(players, round_state.stacks)]))
+        self.send('B' + CCARDS(board))
+
+    def log_action(self, name, action, bet_override):
+        '''
+        Logs and sends one action.
+        '''
+        if isinstance(action, FoldAction):
+            phrasing = ' folds'
+            code = 'F'
+        elif isinstance(action, CallAction):
+            phrasing = ' calls'
+            code = 'C'
+        elif isinstance(action, CheckAction):
+            phrasing = ' checks'
+            code = 'K'
+        else:  # isinstance(action, RaiseAction)
+            phrasing = (' bets ' if bet_override else ' raises to ') + str(action.amount)
+            code = 'R' + str(action.amount)
+        self.log.append(name + phrasing)
+        self.send(code)
+
+    def log_terminal_state(self, players, round_state):
+        '''
+        Logs and sends the showdown, if any, and the payoffs.
+        '''
+        if round_state.num_live > 1:
+            board = decode(round_state.board)
+            if round_state.street < 5:  # the rest of the board was dealt out
+                self.log.append('Board ' + PCARDS(board))
+                self.send('B' + CCARDS(board))
+            for seat, player in enumerate(players):
+                if not round_state.folded[seat]:
+                    hand = decode(round_state.hands[2*seat:2*seat+2])
+                    self.log.append('{} shows {}'.format(player.name, PCARDS(hand)))
+                    for other, player_message in enumerate(self.player_messages):
+                        if other != seat:
+                            player_message.append('O' + str(seat) + ',' + CCARDS(hand))
+        for player, delta in zip(players, round_state.deltas):
+            self.log.append('{} awarded {}'.format(player.name, delta))
+        self.send('D' + CCARDS(round_state.deltas))
+
+    def run_round(self, players):
+        '''
+        Runs one round of poker.
+        '''
+        round_state = self.deal_round(players)
+        street = 0
+        while not round_state.terminal:
+            if round_state.street != street:
+                street = round_state.street
+                self.log_street(players, round_state)
+            active = round_state.active
+            player = players[active]
+            action = player.query(round_state, self.player_messages[active], self.log)
+            self.log_action(player.name, action, round_state.bet == 0)
+            round_state.apply(action)
+        self.log_terminal_state(players, round_state)
+        terminal_state = TerminalState(list(round_state.deltas), round_state)
+        for player, player_message, delta in zip(players, self.player_messages, terminal_state.deltas):
+            player.query(terminal_state, player_message, self.log)
+            player.bankroll += delta
+
+    def run(self):
+        '''
+        Runs one game of poker and returns the final bankroll of each player by name.
+        '''
+        print('Starting the Pokerbots multiway engine...')
+        players = [Player(name, path) for name, path in self.player_specs]
+        for player in players:
+            player.build()
+            player.run()
+        self.log = GameLog(self.log_filename + '.txt', self.log, GAME_LOG_COMPRESSION, GAME_LOG_FLUSH_INTERVAL)
+        for round_num in range(1, NUM_ROUNDS + 1):
+            self.log.append('')
+            self.log.append('Round #' + str(round_num) + STATUS(players))
+            self.run_round(players)
+            players = players[1:] + players[:1]
+        for player in players:
+            player.stop()
+        self.log.append('')
+        self.log.append('Final' + STATUS(players))
+        print('Writing', self.log.filename)
+        self.log.close()
+        return {player.name: player.bankroll for player in players}
+
+
+def parse_args():
+    '''
+    Parses the pokerbots to seat and the deck seed.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 multiway_engine.py')
+    parser.add_argument('bots', nargs='+', help='Directories of the {} to {} pokerbots to seat, in the first '
+                                                'round\'s seat order'.format(MIN_SEATS, MAX_SEATS))
+    parser.add_argument('--seed', type=int, default=DECK_SEED, help='Seed for the deals, defaults to DECK_SEED')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = parse_args()
+    ROSTER = make_roster(ARGS.bots)
+    if not MIN_SEATS <= len(ROSTER) <= MAX_SEATS:
+        print('A table seats {} to {} pokerbots'.format(MIN_SEATS, MAX_SEATS))
+    else:
+        BANKROLLS = MultiwayGame([(bot.name, bot.path) for bot in ROSTER], seed=ARGS.seed).run()
+        print('Final' + ''.join([PVALUE(name, bankroll) for name, bankroll in BANKROLLS.items()]))
@@ -0,0 +1,90 @@
+'''
+Simple example pokerbot for the multiway engine, written in Python.
+Point "run" in commands.json at this file to enter it in multiway_engine.py games.
+'''
+from skeleton.actions import FoldAction, CallAction, CheckAction, RaiseAction
+from skeleton.states import GameState, TerminalState, MultiwayRoundState
+from skeleton.states import NUM_ROUNDS, STARTING_STACK, BIG_BLIND, SMALL_BLIND
+from skeleton.bot import Bot
+from skeleton.runner import parse_args, run_bot, MultiwayRunner
+
+
+class Player(Bot):
+    '''
+    A multiway pokerbot.
+    '''
+
+    def __init__(self):
+        '''
+        Called when your bot starts. Called exactly once.
+
+        Arguments:
+        Nothing.
+
+        Returns:
+        Nothing.
+        '''
+        pass
+
+    def handle_new_round(self, game_state, round_state, active):
+        '''
+        Called when a new round starts. Called NUM_ROUNDS times.
+
+        Arguments:
+        game_state: the GameState object.
+        round_state: the MultiwayRoundState object.
+        active: your seat, from 0 to round_state.num_seats - 1. Seats move every round.
+
+        Returns:
+        Nothing.
+        '''
+        #num_seats = round_state.num_seats  # the number of players at the table, from 2 to 10
+        #my_cards = round_state.hands[active]  # your cards
+        #small_blind = active == 0  # seat 0 posts the small blind, seat 1 the big blind
+        #button = active == round_state.num_seats - 1  # with three or more seats, the last seat is the button
+        pass
+
+    def handle_round_over(self, game_state, terminal_state, active):
+        '''
+        Called when a round ends. Called NUM_ROUNDS times.
+
+        Arguments:
+        game_state: the GameState object.
+        terminal_state: the TerminalState object.
+        active: your seat.
+
+        Returns:
+        Nothing.
+        '''
+        #my_delta = terminal_state.deltas[active]  # your bankroll change from this round
+        #previous_state = terminal_state.previous_state  # MultiwayRoundState when betting ended
+        #shown = [cards for cards in previous_state.hands if cards]  # the hands shown at showdown, and yours
+        pass
+
+    def get_action(self, game_state, round_state, active):
+        '''
+        Where the magic happens - your code should implement this function.
+        Called any time the engine needs an action from your bot.
+
+        Arguments:
+        game_state: the GameState object.
+        round_state: the MultiwayRoundState object.
+        active: your seat.
+
+        Returns:
+        Your action.
+        '''
+        legal_actions = round_state.legal_actions()  # the actions you are allowed to take
+        #street = round_state.street  # 0, 3, 4, or 5 representing pre-flop, flop, turn, or river respectively
+        #board_cards = round_state.deck[:street]  # the board cards
+        #continue_cost = round_state.bet - round_state.pips[active]  # the number of chips needed to stay in the pot
+        #live_seats = [seat for seat in range(round_state.num_seats) if not round_state.folded[seat]]
+        #if RaiseAction in legal_actions:
+        #    min_raise, max_raise = round_state.raise_bounds()  # the smallest and largest numbers of chips for a legal bet/raise
+        if CheckAction in legal_actions:  # check-call
+            return CheckAction()
+        return CallAction()
+
+
+if __name__ == '__main__':
+    run_bot(Player(), parse_args(), MultiwayRunner)
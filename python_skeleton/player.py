@@ -15,7 +15,21 @@ class Player(Bot):
 
     def __init__(self):
         '''
-        Called when a new game starts. Called exactly once.
+        Called when your bot starts. Called exactly once, even if the engine keeps your bot
+        running to play several games.
+
+        Arguments:
+        Nothing.
+
+        Returns:
+        Nothing.
+        '''
+        pass
+
+    def handle_new_game(self):
+        '''
+        Called when the engine starts another game with your bot. Not called before the first game.
+        Reset anything specific to the last game and opponent here.
 
         Arguments:
         Nothing.
@@ -8,6 +8,20 @@ class Bot():
     The base class for a pokerbot.
     '''
 
+    def handle_new_game(self):
+        '''
+        Optional. Called when the engine starts another game on the same connection, which it does
+        when it keeps pokerbots running between games. The next game may be against a different
+        opponent, so forget anything learned in the last game here, such as opponent models, and
+        reseed any random number generators. A reused pokerbot is never dealt the same deck seed twice.
+
+        Arguments:
+        Nothing.
+
+        Returns:
+        Nothing.
+        '''
+
     def handle_new_round(self, game_state, round_state, active):
         '''
         Called when a new round starts. Called NUM_ROUNDS times.
@@ -50,3 +64,21 @@ class Bot():
         Your action.
         '''
         raise NotImplementedError('get_action')
+
+    def ponder(self, game_state, round_state, active, stop):
+        '''
+        Optional. Called on a worker thread after each of your actions is sent, while the engine
+        waits on your opponent, which is not charged to your game clock. Use it for speculative
+        work, such as searching the states your opponent may leave you in, and keep the results
+        on self for get_action. When the next message arrives, stop is set and the runner waits
+        for this function to return before handling it, so check stop often.
+
+        Arguments:
+        game_state: the GameState object.
+        round_state: the RoundState object after your action.
+        active: your player's index.
+        stop: a threading.Event, set when you should return.
+
+        Returns:
+        Nothing.
+        '''
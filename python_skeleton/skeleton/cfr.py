@@ -0,0 +1,331 @@
+'''
+Betting tree enumeration and a CFR solver for bucketed heads-up subgames.
+
+BettingTree walks the betting tree below a state with FlatRoundState, restricted to the raises
+of a BetAbstraction, and stores it in flat arrays. Nodes are found through a transposition table
+keyed on 64-bit hashes of the action history, so a bot can map the live round onto the tree.
+
+CFRSolver runs CFR+ over the tree with card buckets in place of cards: each player holds one
+of num_buckets buckets, dealt independently from a prior, and showdowns are settled by a matrix
+of win probabilities between buckets. Every node is visited once per iteration with a vector of
+reach probabilities over buckets, and regrets and strategies are kept in flat NumPy arrays with
+one row per tree edge. Trees cut off after max_streets streets settle their leaves with their own
+matrix, which makes the solver usable for depth-limited subgame solving within the game clock.
+The solver needs numpy; solve_subgames solves many independent subgames over a process pool.
+'''
+from array import array
+from multiprocessing import Pool
+import time
+
+from .actions import FoldAction, CallAction, CheckAction, RaiseAction
+from .states import FlatRoundState, BetAbstraction, STARTING_STACK, FOLD, CALL, CHECK, RAISE
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# node kinds
+DECISION, FOLDED, SHOWDOWN, LEAF = range(4)
+STREET_INDICES = {0: 0, 3: 1, 4: 2, 5: 3}
+# FNV-1a over action codes, where a raise is coded RAISE + amount
+ROOT_HASH = 0xcbf29ce484222325
+HASH_PRIME = 0x100000001b3
+HASH_MASK = (1 << 64) - 1
+
+
+def action_code(action):
+    '''
+    Returns the code of an action in history hashes.
+    '''
+    if isinstance(action, FoldAction):
+        return FOLD
+    if isinstance(action, CallAction):
+        return CALL
+    if isinstance(action, CheckAction):
+        return CHECK
+    return RAISE + action.amount
+
+
+def extend_hash(previous_hash, action):
+    '''
+    Returns the hash of an action history extended by one action.
+    '''
+    return ((previous_hash ^ action_code(action)) * HASH_PRIME) & HASH_MASK
+
+
+def history_hash(actions, start=ROOT_HASH):
+    '''
+    Returns the hash of a sequence of actions.
+    '''
+    for action in actions:
+        start = extend_hash(start, action)
+    return start
+
+
+def showdown_matrix(num_buckets):
+    '''
+    Returns the win probabilities of buckets ordered by hand strength:
+    the higher bucket always wins, and equal buckets split the pot.
+    '''
+    if numpy is None:
+        raise ImportError('the CFR solver needs numpy')
+    buckets = numpy.arange(num_buckets)
+    return (buckets[:, None] > buckets[None, :]) + .5 * (buckets[:, None] == buckets[None, :])
+
+
+class BettingTree():
+    '''
+    The abstract betting tree below a state, in flat arrays.
+
+    kinds[node] is DECISION, FOLDED, SHOWDOWN or LEAF, players[node] the player to act.
+    Decision nodes own the edges first_edges[node] to first_edges[node] + num_edges[node],
+    and edge e takes actions[e] to the node children[e]. stakes[node] is player 0's payoff at
+    FOLDED nodes, and what each player has put in the pot at SHOWDOWN and LEAF nodes.
+    '''
+
+    def __init__(self, root=None, abstraction=None, max_streets=None):
+        root = FlatRoundState() if root is None else root
+        if not isinstance(root, FlatRoundState):
+            root = FlatRoundState.from_round_state(root)
+        self.abstraction = BetAbstraction() if abstraction is None else abstraction
+        self.max_streets = max_streets
+        self.kinds = array('b')
+        self.players = array('b')
+        self.stakes = array('i')
+        self.first_edges = array('i')
+        self.num_edges = array('b')
+        self.actions = []
+        self.children = array('i')
+        self.table = {}  # history hash -> node
+        self.root_street = STREET_INDICES[root.street]
+        self.build(FlatRoundState.from_round_state(root), ROOT_HASH)
+
+    @property
+    def num_nodes(self):
+        '''
+        The number of nodes in the tree.
+        '''
+        return len(self.kinds)
+
+    def legal_moves(self, state):
+        '''
+        Returns the abstract actions in a state.
+        '''
+        mask = state.legal_action_mask()
+        moves = [action() for code, action in ((FOLD, FoldAction), (CALL, CallAction), (CHECK, CheckAction))
+                 if mask >> code & 1]
+        moves.extend(RaiseAction(amount) for amount in self.abstraction.raise_amounts(state))
+        return moves
+
+    def build(self, state, node_hash):
+        '''
+        Enumerates the subtree below a state, depth first, and returns its root node.
+        '''
+        node = len(self.kinds)
+        self.table[node_hash] = node
+        self.players.append(state.button % 2)
+        self.first_edges.append(len(self.children))
+        if state.terminal:
+            folded = isinstance(state.actions[-1], FoldAction)
+            self.kinds.append(FOLDED if folded else SHOWDOWN)
+            self.stakes.append(state.deltas[0] if folded else STARTING_STACK - state.stacks[0])
+            self.num_edges.append(0)
+            return node
+        if self.max_streets is not None and STREET_INDICES[state.street] - self.root_street >= self.max_streets:
+            self.kinds.append(LEAF)
+            self.stakes.append(STARTING_STACK - state.stacks[0])
+            self.num_edges.append(0)
+            return node
+        moves = self.legal_moves(state)
+        self.kinds.append(DECISION)
+        self.stakes.append(0)
+        self.num_edges.append(len(moves))
+        first_edge = len(self.children)
+        self.actions.extend(moves)
+        self.children.extend([0] * len(moves))
+        for i, action in enumerate(moves):
+            state.apply(action)
+            self.children[first_edge + i] = self.build(state, extend_hash(node_hash, action))
+            state.undo()
+        return node
+
+    def child(self, node, action):
+        '''
+        Returns the child of a node that an action leads to, translating a raise
+        the abstraction does not have to the nearest raise it has. None if the action is not in the tree.
+        '''
+        first_edge = self.first_edges[node]
+        edges = range(first_edge, first_edge + self.num_edges[node])
+        if isinstance(action, RaiseAction):
+            raises = [edge for edge in edges if isinstance(self.actions[edge], RaiseAction)]
+            if not raises:
+                return None
+            return self.children[min(raises, key=lambda edge: abs(self.actions[edge].amount - action.amount))]
+        for edge in edges:
+            if isinstance(self.actions[edge], type(action)):
+                return self.children[edge]
+        return None
+
+    def find(self, actions):
+        '''
+        Returns the node an action history from the root leads to, translating raises
+        the abstraction does not have, or None if it leaves the tree.
+        '''
+        node = self.table.get(history_hash(actions))
+        if node is not None:
+            return node
+        node = 0
+        for action in actions:
+            if self.kinds[node] != DECISION:
+                return None
+            node = self.child(node, action)
+            if node is None:
+                return None
+        return node
+
+
+
+class CFRSolver():
+    '''
+    Solves a BettingTree with CFR+, alternating updates and linearly weighted average strategies.
+
+    win_matrix[i, j] is the probability that player 0 in bucket i beats player 1 in bucket j,
+    ties counting half; leaf_matrix, by default win_matrix, settles the LEAF nodes.
+    priors[p] is the probability of each of player p's buckets, uniform by default.
+    '''
+
+    def __init__(self, tree, win_matrix, priors=None, leaf_matrix=None):
+        if numpy is None:
+            raise ImportError('the CFR solver needs numpy')
+        self.tree = tree
+        win_matrix = numpy.asarray(win_matrix, dtype=float)
+        leaf_matrix = win_matrix if leaf_matrix is None else numpy.asarray(leaf_matrix, dtype=float)
+        num_buckets = win_matrix.shape[0]
+        # the expected payoff per chip at stake, for player 0 by player 1's bucket and for player 1 by player 0's
+        self.payoffs = {SHOWDOWN: (2 * win_matrix - 1, 1 - 2 * win_matrix.T),
+                        LEAF: (2 * leaf_matrix - 1, 1 - 2 * leaf_matrix.T)}
+        if priors is None:
+            priors = numpy.full((2, num_buckets), 1. / num_buckets)
+        self.priors = numpy.asarray(priors, dtype=float)
+        self.regrets = numpy.zeros((len(tree.children), num_buckets))
+        self.strategy_sums = numpy.zeros((len(tree.children), num_buckets))
+        self.iterations = 0
+
+    def current_strategy(self, node):
+        '''
+        Returns the regret-matching strategy at a decision node, by edge and bucket.
+        '''
+        first_edge = self.tree.first_edges[node]
+        regrets = self.regrets[first_edge:first_edge + self.tree.num_edges[node]]
+        positive = numpy.maximum(regrets, 0.)
+        totals = positive.sum(axis=0)
+        return numpy.where(totals > 0., positive / numpy.where(totals > 0., totals, 1.), 1. / len(regrets))
+
+    def average_strategy(self, node):
+        '''
+        Returns the average strategy at a decision node, by edge and bucket.
+        '''
+        first_edge = self.tree.first_edges[node]
+        sums = self.strategy_sums[first_edge:first_edge + self.tree.num_edges[node]]
+        totals = sums.sum(axis=0)
+        return numpy.where(totals > 0., sums / numpy.where(totals > 0., totals, 1.), 1. / len(sums))
+
+    def strategy(self, node, bucket):
+        '''
+        Returns the average strategy of a bucket at a decision node, as (action, probability) pairs.
+        '''
+        first_edge = self.tree.first_edges[node]
+        probabilities = self.average_strategy(node)[:, bucket]
+        return list(zip(self.tree.actions[first_edge:first_edge + self.tree.num_edges[node]], probabilities.tolist()))
+
+    def terminal_values(self, node, player, opponent_reach):
+        '''
+        Returns the counterfactual values of a player's buckets at a FOLDED, SHOWDOWN or LEAF node.
+        '''
+        tree = self.tree
+        if tree.kinds[node] == FOLDED:
+            payoff = tree.stakes[node] if player == 0 else -tree.stakes[node]
+            return numpy.full(len(opponent_reach), payoff * opponent_reach.sum())
+        return tree.stakes[node] * self.payoffs[tree.kinds[node]][player].dot(opponent_reach)
+
+    def traverse(self, node, player, reach, opponent_reach, weight):
+        '''
+        Updates the player's regrets and average strategy below a node,
+        and returns the counterfactual values of the player's buckets there.
+        '''
+        tree = self.tree
+        if tree.kinds[node] != DECISION:
+            return self.terminal_values(node, player, opponent_reach)
+        first_edge = tree.first_edges[node]
+        last_edge = first_edge + tree.num_edges[node]
+        strategy = self.current_strategy(node)
+        if tree.players[node] != player:
+            values = 0.
+            for i, edge in enumerate(range(first_edge, last_edge)):
+                values = values + self.traverse(tree.children[edge], player, reach, opponent_reach * strategy[i], weight)
+            return values
+        action_values = numpy.array([self.traverse(tree.children[edge], player, reach * strategy[i], opponent_reach, weight)
+                                     for i, edge in enumerate(range(first_edge, last_edge))])
+        values = (strategy * action_values).sum(axis=0)
+        regrets = self.regrets[first_edge:last_edge]
+        regrets += action_values - values
+        numpy.maximum(regrets, 0., out=regrets)
+        self.strategy_sums[first_edge:last_edge] += weight * reach * strategy
+        return values
+
+    def solve(self, iterations=1000, deadline=None):
+        '''
+        Runs up to iterations more iterations, stopping early once time.perf_counter() passes deadline.
+        Returns the solver.
+        '''
+        for _ in range(iterations):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            self.iterations += 1
+            for player in (0, 1):
+                self.traverse(0, player, self.priors[player], self.priors[1-player], self.iterations)
+        return self
+
+    def best_response(self, node, player, opponent_reach):
+        '''
+        Returns the counterfactual values of a player's buckets when best responding
+        to the opponent's average strategy below a node.
+        '''
+        tree = self.tree
+        if tree.kinds[node] != DECISION:
+            return self.terminal_values(node, player, opponent_reach)
+        edges = range(tree.first_edges[node], tree.first_edges[node] + tree.num_edges[node])
+        if tree.players[node] == player:
+            return numpy.max([self.best_response(tree.children[edge], player, opponent_reach) for edge in edges], axis=0)
+        strategy = self.average_strategy(node)
+        return sum(self.best_response(tree.children[edge], player, opponent_reach * strategy[i])
+                   for i, edge in enumerate(edges))
+
+    def exploitability(self):
+        '''
+        Returns how many chips per round, on average over both seats,
+        a best response wins against the average strategy, beyond the value of the game.
+        '''
+        gains = [self.priors[player].dot(self.best_response(0, player, self.priors[1-player])) for player in (0, 1)]
+        return (gains[0] + gains[1]) / 2.
+
+
+def solve_subgame(subgame):
+    '''
+    Solves one (tree, win_matrix, priors, iterations) subgame and returns its strategy sums.
+    '''
+    tree, win_matrix, priors, iterations = subgame
+    return CFRSolver(tree, win_matrix, priors).solve(iterations).strategy_sums
+
+
+def solve_subgames(subgames, processes=None):
+    '''
+    Solves independent (tree, win_matrix, priors, iterations) subgames, such as one per flop class
+    of a blueprint, over a pool of processes, and returns the strategy sums of each.
+    Pass processes=1 to solve them in this process.
+    '''
+    if processes == 1:
+        return [solve_subgame(subgame) for subgame in subgames]
+    with Pool(processes) as pool:
+        return pool.map(solve_subgame, subgames)
@@ -0,0 +1,208 @@
+'''
+Precomputed preflop and flop equities, memory-mapped from equity.bin.
+
+Equities are the share of the pot a hand wins against a random hand, all five board
+cards dealt. Preflop, the 169 hand classes are stored to 1/65535; on the flop, every
+hand on each of the 1755 suit-isomorphic flops is stored to 1/255. Opening the file
+maps it without reading it, and every lookup is a few index computations.
+
+Rebuild the file with python3 -m skeleton.equity, which needs eval7.
+
+File layout, little-endian:
+8 bytes         the magic b'PBEQ', the version and the number of flop classes, as uint16
+uint16 [169]    preflop equities, by hand class
+uint16 [22100]  the class of every flop, by flop index
+uint8  [22100]  the suit permutation that maps every flop onto its class
+uint8  [n, 1326] flop equities, by flop class and then by hand index on the mapped suits
+'''
+from itertools import combinations, permutations
+import mmap
+import os
+import struct
+import sys
+
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+# cards are 4 * rank + suit, as in evaluator.py
+CARD_CODES = {rank + suit: 4 * r + s for r, rank in enumerate(RANKS) for s, suit in enumerate(SUITS)}
+SUIT_PERMUTATIONS = tuple(permutations(range(4)))
+# the cards every suit permutation maps each card to
+MAPPED_CARDS = tuple(tuple(code & ~3 | permutation[code & 3] for code in range(52))
+                     for permutation in SUIT_PERMUTATIONS)
+HEADER = struct.Struct('<4sHH')
+MAGIC = b'PBEQ'
+VERSION = 1
+NUM_HAND_CLASSES = 169
+NUM_FLOPS = 22100
+NUM_HANDS = 1326
+TABLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'equity.bin')
+
+
+def card_code(card):
+    '''
+    Returns the code of a card given as a string such as 'Ah', or as a code.
+    '''
+    return CARD_CODES[card] if isinstance(card, str) else card
+
+
+def hand_class(hand):
+    '''
+    Returns the preflop class of a hand, from 0 to 168: 13 * rank + rank for pairs,
+    13 * high + low for suited hands and 13 * low + high for offsuit hands.
+    '''
+    first, second = card_code(hand[0]), card_code(hand[1])
+    high, low = max(first >> 2, second >> 2), min(first >> 2, second >> 2)
+    if (first & 3) == (second & 3):
+        return 13 * high + low
+    return 13 * low + high
+
+
+def hand_index(first, second):
+    '''
+    Returns the index of a pair of distinct card codes, from 0 to 1325.
+    '''
+    if first > second:
+        first, second = second, first
+    return first + second * (second - 1) // 2
+
+
+def flop_index(first, second, third):
+    '''
+    Returns the index of three distinct card codes, from 0 to 22099.
+    '''
+    first, second, third = sorted((first, second, third))
+    return first + second * (second - 1) // 2 + third * (third - 1) * (third - 2) // 6
+
+
+class EquityTables():
+    '''
+    Looks up precomputed equities in a memory-mapped table file.
+    Hands and boards are lists of card strings, such as round_state.hands[active], or card codes.
+    '''
+
+    def __init__(self, path=TABLES_PATH):
+        with open(path, 'rb') as table_file:
+            self.buffer = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_classes = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + ' is not an equity table file of version {}'.format(VERSION))
+        view = memoryview(self.buffer)
+        offset = HEADER.size
+        self.preflop = self.uint16(view[offset:offset + 2 * NUM_HAND_CLASSES])
+        offset += 2 * NUM_HAND_CLASSES
+        self.flop_classes = self.uint16(view[offset:offset + 2 * NUM_FLOPS])
+        offset += 2 * NUM_FLOPS
+        self.flop_permutations = view[offset:offset + NUM_FLOPS]
+        offset += NUM_FLOPS
+        self.flop = view[offset:offset + NUM_HANDS * num_classes]
+
+    @staticmethod
+    def uint16(view):
+        '''
+        Reads a little-endian uint16 column, in place on little-endian machines.
+        '''
+        if sys.byteorder == 'little':
+            return view.cast('H')
+        column = view.tolist()
+        return [column[2*i] | column[2*i+1] << 8 for i in range(len(column) // 2)]
+
+    def preflop_equity(self, hand):
+        '''
+        Returns the equity of a hand before the flop.
+        '''
+        return self.preflop[hand_class(hand)] / 65535.
+
+    def flop_equity(self, hand, board):
+        '''
+        Returns the equity of a hand on the flop, given the first three board cards.
+        '''
+        index = flop_index(card_code(board[0]), card_code(board[1]), card_code(board[2]))
+        mapped_cards = MAPPED_CARDS[self.flop_permutations[index]]
+        offset = NUM_HANDS * self.flop_classes[index]
+        return self.flop[offset + hand_index(mapped_cards[card_code(hand[0])],
+                                             mapped_cards[card_code(hand[1])])] / 255.
+
+    def flop_bucket(self, hand, board, num_buckets=10):
+        '''
+        Returns which of num_buckets equal equity ranges a hand falls in on the flop.
+        '''
+        return min(num_buckets - 1, int(self.flop_equity(hand, board) * num_buckets))
+
+    def equity(self, hand, board=()):
+        '''
+        Returns the equity of a hand on the given board, which must be preflop or the flop.
+        '''
+        if len(board) == 0:
+            return self.preflop_equity(hand)
+        if len(board) == 3:
+            return self.flop_equity(hand, board)
+        raise ValueError('equities are precomputed only before the turn')
+
+    def close(self):
+        '''
+        Unmaps the table file.
+        '''
+        self.preflop = self.flop_classes = self.flop_permutations = self.flop = None
+        self.buffer.close()
+
+
+LOADED_TABLES = {}
+
+
+def load_tables(path=TABLES_PATH):
+    '''
+    Returns the EquityTables for a file, mapping it on first use.
+    '''
+    if path not in LOADED_TABLES:
+        LOADED_TABLES[path] = EquityTables(path)
+    return LOADED_TABLES[path]
+
+
+def build_tables(path=TABLES_PATH, preflop_iterations=1000000, flop_iterations=4000):
+    '''
+    Estimates every equity with eval7's Monte Carlo evaluator and writes the table file.
+    Takes about a quarter of an hour.
+    '''
+    import eval7
+    cards = [eval7.Card(RANKS[code >> 2] + SUITS[code & 3]) for code in range(52)]
+    random_hand = eval7.HandRange(','.join(RANKS[rank] + RANKS[rank] for rank in range(13)) + ',' +
+                                  ','.join(RANKS[high] + RANKS[low] for high in range(13) for low in range(high)))
+    preflop = [0] * NUM_HAND_CLASSES
+    for high in range(13):
+        for low in range(high + 1):
+            hands = [(4 * high, 4 * low + 1)]  # offsuit, or the pair
+            if high != low:
+                hands.append((4 * high, 4 * low))
+            for hand in hands:
+                equity = eval7.py_hand_vs_range_monte_carlo([cards[hand[0]], cards[hand[1]]], random_hand, [],
+                                                           preflop_iterations)
+                preflop[hand_class(hand)] = round(equity * 65535)
+    # the class of a flop is its smallest image under the 24 suit permutations
+    flop_classes = [0] * NUM_FLOPS
+    flop_permutations = [0] * NUM_FLOPS
+    canonical_flops = {}
+    for flop in combinations(range(52), 3):
+        images = [(tuple(sorted(mapped_cards[code] for code in flop)), permutation)
+                  for permutation, mapped_cards in enumerate(MAPPED_CARDS)]
+        canonical_flop, permutation = min(images)
+        index = flop_index(*flop)
+        flop_classes[index] = canonical_flops.setdefault(canonical_flop, len(canonical_flops))
+        flop_permutations[index] = permutation
+    flop = bytearray(NUM_HANDS * len(canonical_flops))
+    for canonical_flop, flop_class in canonical_flops.items():
+        board = [cards[code] for code in canonical_flop]
+        equities = eval7.py_all_hands_vs_range(random_hand, random_hand, board, flop_iterations)
+        for (first, second), equity in equities.items():
+            first, second = CARD_CODES[str(first)], CARD_CODES[str(second)]
+            if first not in canonical_flop and second not in canonical_flop:
+                flop[NUM_HANDS * flop_class + hand_index(first, second)] = round(equity * 255)
+    with open(path, 'wb') as table_file:
+        table_file.write(HEADER.pack(MAGIC, VERSION, len(canonical_flops)))
+        table_file.write(struct.pack('<{}H'.format(NUM_HAND_CLASSES), *preflop))
+        table_file.write(struct.pack('<{}H'.format(NUM_FLOPS), *flop_classes))
+        table_file.write(bytes(flop_permutations))
+        table_file.write(flop)
+
+
+if __name__ == '__main__':
+    build_tables()
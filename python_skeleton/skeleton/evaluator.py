@@ -0,0 +1,194 @@
+'''
+Batched hand evaluation over a compact integer card encoding.
+
+Cards are encoded as 4 * rank + suit, with ranks 23456789TJQKA and suits cdhs,
+which is also the order of a fresh eval7.Deck. Requires eval7. Batches are flat buffers of codes:
+anything array('B') accepts, such as bytes, a list of ints or a NumPy uint8 array.
+
+With NumPy, large batches of seven-card hands are scored by evaluate_vectorized, which
+scores the whole batch with array operations and lookup tables, several times faster than
+calling eval7 once per hand. It gives exactly eval7's scores, so both paths can be mixed.
+'''
+from array import array
+from functools import lru_cache
+import random
+import eval7
+try:
+    import numpy as np
+except ImportError:  # every batch is scored by eval7, one hand at a time
+    np = None
+
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+CARD_STRINGS = tuple(rank + suit for rank in RANKS for suit in SUITS)
+CARD_CODES = {card: code for code, card in enumerate(CARD_STRINGS)}
+CARDS = tuple(eval7.Card(card) for card in CARD_STRINGS)
+MASK_CODES = {card.mask: code for code, card in enumerate(CARDS)}
+VECTORIZED_BATCH_SIZE = 128  # smaller batches are faster to score with eval7, one hand at a time
+# eval7 scores are the hand type, shifted by 24, over up to five ranks in 4-bit fields from bit 16 down
+STRAIGHT_FLUSH, QUADS, FULL_HOUSE, FLUSH, STRAIGHT, TRIPS, TWO_PAIR, PAIR, HIGH_CARD = [
+    hand_type << 24 for hand_type in range(8, -1, -1)]
+
+
+def encode(cards):
+    '''
+    Encodes eval7 Cards or card strings as a buffer of card codes.
+    '''
+    return array('B', [CARD_CODES[card] if isinstance(card, str) else MASK_CODES[card.mask] for card in cards])
+
+
+def decode(codes):
+    '''
+    Decodes a buffer of card codes as a list of card strings.
+    '''
+    return [CARD_STRINGS[code] for code in codes]
+
+
+@lru_cache(maxsize=None)
+def lookup_tables():
+    '''
+    Builds the lookup tables of evaluate_vectorized, on first use.
+
+    Rank sets are 13-bit masks. kickers[k][mask] packs the k highest ranks of a mask as eval7 does,
+    tops[k][mask] keeps the k highest ranks of a mask, and straights[mask] is the top rank of the best
+    straight, in the top rank's field, or 0. count_masks[i] maps 15 bits of per-rank counts, 3 bits
+    for each of ranks 5 * i to 5 * i + 4, to their ranks held at least once, twice, three and four
+    times, 13 bits each. flush_suits maps per-suit counts, 4 bits per suit, to the suit with five
+    or more cards, or -1.
+    '''
+    masks = np.arange(1 << 13, dtype=np.int64)
+    kickers = [np.zeros(1 << 13, np.int64) for _ in range(6)]
+    tops = [np.zeros(1 << 13, np.int64) for _ in range(6)]
+    seen = np.zeros(1 << 13, np.int64)
+    for rank in range(12, -1, -1):
+        held = masks >> rank & 1
+        for k in range(1, 6):
+            kept = held * (seen < k)
+            kickers[k] += kept * (rank << 16) >> 4 * np.minimum(seen, 4)
+            tops[k] |= kept << rank
+        seen += held
+    straights = np.zeros(1 << 13, np.int64)
+    for high in range(4, 13):
+        straights = np.where(masks >> (high - 4) & 31 == 31, high << 16, straights)
+    wheel = (1 << 12) | 15
+    straights = np.where((masks & wheel == wheel) & (straights == 0), 3 << 16, straights)
+    chunks = np.arange(1 << 15, dtype=np.int64)
+    count_masks = []
+    for first in (0, 5, 10):
+        count_mask = np.zeros(1 << 15, np.int64)
+        for i in range(min(5, 13 - first)):
+            counts = chunks >> 3 * i & 7
+            for times in range(1, 5):
+                count_mask |= (counts >= times).astype(np.int64) << (13 * (times - 1) + first + i)
+        count_masks.append(count_mask)
+    suit_counts = np.arange(1 << 16, dtype=np.int64)
+    flush_suits = np.full(1 << 16, -1, np.int64)
+    for suit in range(4):
+        flush_suits = np.where(suit_counts >> 4 * suit & 15 >= 5, suit, flush_suits)
+    codes = np.arange(52)
+    return (kickers, tops, straights, count_masks, flush_suits,
+            3 * (codes >> 2), 4 * (codes & 3), 1 << (codes >> 2))
+
+
+def evaluate_vectorized(cards):
+    '''
+    Scores many seven-card hands with NumPy. Needs numpy.
+
+    cards: seven codes per hand, as anything numpy.asarray accepts.
+
+    Returns a NumPy int64 array of eval7 scores, one per hand.
+    '''
+    kickers, tops, straights, count_masks, flush_suits, rank_shifts, suit_shifts, rank_bits = lookup_tables()
+    cards = np.asarray(cards, np.uint8).reshape(-1, 7)
+    # count each rank in 3 bits and each suit in 4 bits, then read the rank sets off the tables
+    rank_counts = np.left_shift(1, rank_shifts[cards]).sum(1)
+    sets = (count_masks[0][rank_counts & 32767] | count_masks[1][rank_counts >> 15 & 32767] |
+            count_masks[2][rank_counts >> 30])
+    present = sets & 8191
+    pairs = sets >> 13 & 8191
+    trips = sets >> 26 & 8191
+    quads = sets >> 39
+    flush_suit = flush_suits[np.left_shift(1, suit_shifts[cards]).sum(1)]
+    flush = np.zeros(len(cards), np.int64)  # the ranks of the flush suit, for hands with a flush
+    flushed = np.flatnonzero(flush_suit >= 0)
+    if len(flushed):
+        suited = (cards[flushed] & 3) == flush_suit[flushed, None]
+        flush[flushed] = np.where(suited, rank_bits[cards[flushed]], 0).sum(1)
+    straight_flush = straights[flush]
+    straight = straights[present]
+    top_trips = tops[1][trips]
+    full_pair = tops[1][pairs & ~top_trips]  # the pair of a full house may be a second set of trips
+    top_pairs = tops[2][pairs]
+    top_pair = tops[1][pairs]
+    return np.select(
+        [straight_flush > 0, quads > 0, (trips > 0) & (full_pair > 0), flush > 0, straight > 0,
+         trips > 0, (pairs & (pairs - 1)) > 0, pairs > 0],
+        [STRAIGHT_FLUSH | straight_flush,
+         QUADS | kickers[1][quads] | kickers[1][present & ~quads] >> 4,
+         FULL_HOUSE | kickers[1][top_trips] | kickers[1][full_pair] >> 4,
+         FLUSH | kickers[5][flush],
+         STRAIGHT | straight,
+         TRIPS | kickers[1][top_trips] | kickers[2][present & ~top_trips] >> 4,
+         TWO_PAIR | kickers[2][top_pairs] | kickers[1][present & ~top_pairs] >> 8,
+         PAIR | kickers[1][top_pair] | kickers[3][present & ~top_pair] >> 4],
+        HIGH_CARD | kickers[5][present])
+
+
+def evaluate_batch(boards, hands, board_size=5):
+    '''
+    Scores many (board, hand) pairs in one call. Higher scores are better hands.
+
+    boards: board_size codes per pair, or board_size codes for a board shared by every pair.
+    hands: two codes per pair.
+
+    Returns an array of eval7 scores, one per pair.
+    '''
+    boards = array('B', boards)
+    hands = array('B', hands)
+    count = len(hands) // 2
+    shared = len(boards) == board_size
+    if not shared and len(boards) != board_size * count:
+        raise ValueError('expected {} board cards, got {}'.format(board_size * count, len(boards)))
+    if np is not None and board_size == 5 and count >= VECTORIZED_BATCH_SIZE:
+        cards = np.empty((count, 7), np.uint8)
+        cards[:, :5] = np.frombuffer(boards, np.uint8).reshape(-1, 5)
+        cards[:, 5:] = np.frombuffer(hands, np.uint8).reshape(-1, 2)
+        return array('i', evaluate_vectorized(cards).astype(np.int32).tobytes())
+    scores = array('i', [0]) * count
+    evaluate = eval7.evaluate
+    hand_cards = [CARDS[code] for code in hands]
+    if shared:  # decode the shared board once
+        board = [CARDS[code] for code in boards]
+        for i in range(count):
+            scores[i] = evaluate(board + hand_cards[2*i:2*i+2])
+        return scores
+    board_cards = [CARDS[code] for code in boards]
+    for i in range(count):
+        scores[i] = evaluate(board_cards[board_size*i:board_size*(i+1)] + hand_cards[2*i:2*i+2])
+    return scores
+
+
+def monte_carlo_equity(hand, board=(), iterations=1000, rng=random):
+    '''
+    Estimates the share of the pot a hand wins against a random hand by sampling runouts.
+
+    hand: our two cards, as strings or codes.
+    board: the board cards dealt so far, as strings or codes.
+
+    Returns a float between 0 and 1.
+    '''
+    hand = list(encode(hand)) if hand and isinstance(hand[0], str) else list(hand)
+    board = list(encode(board)) if board and isinstance(board[0], str) else list(board)
+    remaining = [code for code in range(52) if code not in hand and code not in board]
+    needed = 7 - len(board)
+    boards = array('B')
+    opponent_hands = array('B')
+    for _ in range(iterations):
+        draw = rng.sample(remaining, needed)
+        opponent_hands.extend(draw[:2])
+        boards.extend(board)
+        boards.extend(draw[2:])
+    ours = evaluate_batch(boards, hand * iterations)
+    theirs = evaluate_batch(boards, opponent_hands)
+    wins = sum(2 if our_score > their_score else our_score == their_score for our_score, their_score in zip(ours, theirs))
+    return wins / (2. * iterations)
@@ -3,107 +3,487 @@ The infrastructure for interacting with the engine.
 '''
 import argparse
 import socket
+import struct
+import sys
+import threading
+import traceback
 from .actions import FoldAction, CallAction, CheckAction, RaiseAction
-from .states import GameState, TerminalState, RoundState
+from .states import GameState, TerminalState, RoundState, MultiwayRoundState
 from .states import STARTING_STACK, BIG_BLIND, SMALL_BLIND
 from .bot import Bot
 
+# cards are sent as 4 * rank + suit in the binary protocol
+CARD_STRINGS = tuple(rank + suit for rank in '23456789TJQKA' for suit in 'cdhs')
+# every card of the text protocol is looked up as one shared string, instead of decoding a new one;
+# cards stay strings rather than codes, as bots read them as strings, e.g. to build eval7.Cards
+CARD_NAMES = {card.encode(): card for card in CARD_STRINGS}
+# the clauses that take no argument, or a small one, are looked up already decoded
+DECODED_CLAUSES = {b'F': ('F', None), b'C': ('C', None), b'K': ('K', None), b'Q': ('Q', None),
+                   b'P0': ('P', 0), b'P1': ('P', 1)}
+# the optional protocol features this runner can accept from the engine
+FEATURES = ['binary', 'newgame', 'coalesce']
+# while a bot ponders, the interpreter switches threads this often (in seconds), so that the
+# runner gets to stop pondering soon after a message arrives; Python's default is 0.005
+PONDER_SWITCH_INTERVAL = .0005
+
+
+class MessageReader():
+    '''
+    Receives messages from the engine into one reusable buffer.
+    Messages are returned as (start, end) offsets into the buffer, valid until the next read.
+    '''
+
+    def __init__(self, sock, size=4096):
+        self.sock = sock
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # the first unread byte
+        self.end = 0  # the end of the received bytes
+
+    def fill(self):
+        '''
+        Receives more bytes. Returns False once the engine closes the connection.
+        '''
+        if self.start == self.end:  # everything was read, so start over
+            self.start = self.end = 0
+        elif self.end == len(self.buffer):  # make room for the rest of a partial message
+            unread = self.view[self.start:self.end].tobytes()
+            if self.start == 0:  # the message is longer than the buffer
+                self.view.release()
+                self.buffer.extend(unread)
+                self.view = memoryview(self.buffer)
+            else:
+                self.buffer[:len(unread)] = unread
+            self.start = 0
+            self.end = len(unread)
+        count = self.sock.recv_into(self.view[self.end:])
+        self.end += count
+        return count > 0
+
+    def read_line(self):
+        '''
+        Returns the offsets of the next line of the text protocol, without its newline,
+        or None once the engine closes the connection.
+        '''
+        while True:
+            newline = self.buffer.find(b'\n', self.start, self.end)
+            if newline >= 0:
+                start = self.start
+                self.start = newline + 1
+                return start, newline
+            if not self.fill():
+                return None
+
+    def read_message(self):
+        '''
+        Returns the offsets of the payload of the next message of the binary protocol,
+        or None once the engine closes the connection.
+        '''
+        while self.end - self.start < 2:
+            if not self.fill():
+                return None
+        length = self.buffer[self.start] << 8 | self.buffer[self.start + 1]
+        while self.end - self.start < 2 + length:
+            if not self.fill():
+                return None
+        start = self.start + 2
+        self.start = start + length
+        return start, self.start
+
+
+class Ponderer():
+    '''
+    Runs the pokerbot's ponder hook on one worker thread while the engine waits on the opponent.
+    '''
+
+    def __init__(self, pokerbot):
+        self.pokerbot = pokerbot
+        self.stop_event = threading.Event()
+        self.condition = threading.Condition()
+        self.job = None
+        self.busy = False
+        sys.setswitchinterval(min(sys.getswitchinterval(), PONDER_SWITCH_INTERVAL))
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def start(self, game_state, round_state, active):
+        '''
+        Starts pondering the state our action left the round in.
+        '''
+        with self.condition:
+            self.stop_event.clear()
+            self.job = (game_state, round_state, active)
+            self.busy = True
+            self.condition.notify_all()
+
+    def stop(self):
+        '''
+        Asks the ponder hook to return, and waits until it has.
+        '''
+        self.stop_event.set()
+        with self.condition:
+            while self.busy:
+                self.condition.wait()
+
+    def run(self):
+        '''
+        Calls the ponder hook for every state it is started on.
+        '''
+        while True:
+            with self.condition:
+                while self.job is None:
+                    self.condition.wait()
+                job, self.job = self.job, None
+            try:
+                self.pokerbot.ponder(*job, self.stop_event)
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
 
 class Runner():
     '''
     Interacts with the engine.
     '''
 
-    def __init__(self, pokerbot, socketfile):
+    def __init__(self, pokerbot, socketfile, sock=None):
         self.pokerbot = pokerbot
         self.socketfile = socketfile
+        self.reader = None if sock is None else MessageReader(sock)
+        self.binary = False
+        self.game_state = GameState(0, 0., 1)
+        self.round_state = None
+        self.active = 0
+        self.round_flag = True
+        # pokerbots that override Bot.ponder think on a worker thread while the opponent acts
+        self.ponderer = Ponderer(pokerbot) if type(pokerbot).ponder is not Bot.ponder else None
+
+    @staticmethod
+    def parse(clause):
+        '''
+        Decodes one clause of the text protocol as a (code, argument) pair.
+        '''
+        code = clause[0]
+        if code == 'T':
+            return code, float(clause[1:])
+        if code in 'PRD':
+            return code, int(clause[1:])
+        if code in 'HBOW':
+            return code, clause[1:].split(',')
+        return code, None
+
+    @staticmethod
+    def parse_bytes(clause):
+        '''
+        Decodes one clause of the text protocol, received as bytes, as a (code, argument) pair.
+        '''
+        code = chr(clause[0])
+        if code == 'T':
+            return code, float(clause[1:])
+        if code in 'PRD':
+            return code, int(clause[1:])
+        if code in 'HBO':
+            return code, [CARD_NAMES[card] for card in clause[1:].split(b',')]
+        if code == 'W':
+            return code, clause[1:].decode().split(',')
+        return code, None
+
+    @staticmethod
+    def parse_binary(buffer, start, end):
+        '''
+        Decodes the payload of one message of the binary protocol, in place in the buffer,
+        as a list of (code, argument) pairs.
+        '''
+        packet = []
+        i = start
+        while i < end:
+            code = chr(buffer[i])
+            i += 1
+            if code == 'T':
+                packet.append((code, struct.unpack_from('!I', buffer, i)[0] / 1000.))
+                i += 4
+            elif code == 'P':
+                packet.append((code, buffer[i]))
+                i += 1
+            elif code in 'HBO':
+                count = buffer[i]
+                packet.append((code, [CARD_STRINGS[buffer[j]] for j in range(i + 1, i + 1 + count)]))
+                i += 1 + count
+            elif code == 'R':
+                packet.append((code, struct.unpack_from('!H', buffer, i)[0]))
+                i += 2
+            elif code == 'D':
+                packet.append((code, struct.unpack_from('!i', buffer, i)[0]))
+                i += 4
+            else:
+                packet.append((code, None))
+        return packet
 
     def receive(self):
         '''
         Generator for incoming messages from the engine.
         '''
+        reader = self.reader
         while True:
-            packet = self.socketfile.readline().strip().split(' ')
-            if not packet:
-                break
+            if self.binary:
+                offsets = reader.read_message()
+                if offsets is None:
+                    break
+                packet = self.parse_binary(reader.buffer, *offsets)
+            else:
+                offsets = reader.read_line()
+                if offsets is None:
+                    break
+                line = reader.view[offsets[0]:offsets[1]].tobytes()
+                if not line:
+                    break
+                packet = [DECODED_CLAUSES.get(clause) or self.parse_bytes(clause) for clause in line.split(b' ')]
             yield packet
 
+    @staticmethod
+    def encode(action):
+        '''
+        Encodes an action as a clause of the socket protocol.
+        '''
+        if isinstance(action, FoldAction):
+            return 'F'
+        if isinstance(action, CallAction):
+            return 'C'
+        if isinstance(action, CheckAction):
+            return 'K'
+        # isinstance(action, RaiseAction)
+        return 'R' + str(action.amount)
+
+    @staticmethod
+    def encode_binary(action):
+        '''
+        Encodes an action as a message of the binary protocol.
+        '''
+        if isinstance(action, FoldAction):
+            return b'\x00\x01F'
+        if isinstance(action, CallAction):
+            return b'\x00\x01C'
+        if isinstance(action, CheckAction):
+            return b'\x00\x01K'
+        # isinstance(action, RaiseAction)
+        return struct.pack('!HcH', 3, b'R', action.amount)
+
     def send(self, action):
         '''
         Encodes an action and sends it to the engine.
         '''
-        if isinstance(action, FoldAction):
-            code = 'F'
-        elif isinstance(action, CallAction):
-            code = 'C'
-        elif isinstance(action, CheckAction):
-            code = 'K'
-        else:  # isinstance(action, RaiseAction)
-            code = 'R' + str(action.amount)
-        self.socketfile.write(code + '\n')
+        if self.binary:
+            self.socketfile.buffer.write(self.encode_binary(action))
+            self.socketfile.buffer.flush()
+        else:
+            self.socketfile.write(self.encode(action) + '\n')
+            self.socketfile.flush()
+
+    def negotiate(self, offered):
+        '''
+        Accepts the optional protocol features the engine offers and we support.
+        '''
+        accepted = [feature for feature in offered if feature in FEATURES]
+        self.socketfile.write('W' + ','.join(accepted) + '\n')
         self.socketfile.flush()
+        self.binary = 'binary' in accepted
+
+    def new_game(self):
+        '''
+        Starts a new game on the same connection. The pokerbot object is kept, and told to reset.
+        '''
+        self.game_state = GameState(0, 0., 1)
+        self.round_state = None
+        self.round_flag = True
+        self.pokerbot.handle_new_game()
+
+    def handle_packet(self, packet):
+        '''
+        Reconstructs the game tree based on one message received from the engine.
+        The message is a list of (code, argument) pairs.
+        Returns the action to send back, or None once the engine ends the game.
+        '''
+        for code, argument in packet:
+            if code == 'T':
+                self.game_state = GameState(self.game_state.bankroll, argument, self.game_state.round_num)
+            elif code == 'P':
+                self.active = argument
+            elif code == 'H':
+                hands = [[], []]
+                hands[self.active] = argument
+                pips = [SMALL_BLIND, BIG_BLIND]
+                stacks = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
+                self.round_state = RoundState(0, 0, pips, stacks, hands, [], None)
+                if self.round_flag:
+                    self.pokerbot.handle_new_round(self.game_state, self.round_state, self.active)
+                    self.round_flag = False
+            elif code == 'F':
+                self.round_state = self.round_state.proceed(FoldAction())
+            elif code == 'C':
+                self.round_state = self.round_state.proceed(CallAction())
+            elif code == 'K':
+                self.round_state = self.round_state.proceed(CheckAction())
+            elif code == 'R':
+                self.round_state = self.round_state.proceed(RaiseAction(argument))
+            elif code == 'B':
+                round_state = self.round_state
+                self.round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
+                                              round_state.hands, argument, round_state.previous_state)
+            elif code == 'O':
+                # backtrack
+                round_state = self.round_state.previous_state
+                revised_hands = list(round_state.hands)
+                revised_hands[1-self.active] = argument
+                # rebuild history
+                round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
+                                         revised_hands, round_state.deck, round_state.previous_state)
+                self.round_state = TerminalState([0, 0], round_state)
+            elif code == 'D':
+                assert isinstance(self.round_state, TerminalState)
+                delta = argument
+                deltas = [-delta, -delta]
+                deltas[self.active] = delta
+                self.round_state = TerminalState(deltas, self.round_state.previous_state)
+                game_state = self.game_state
+                game_state = GameState(game_state.bankroll + delta, game_state.game_clock, game_state.round_num)
+                self.pokerbot.handle_round_over(game_state, self.round_state, self.active)
+                self.game_state = GameState(game_state.bankroll, game_state.game_clock, game_state.round_num + 1)
+                self.round_flag = True
+            elif code == 'Q':
+                return None
+        if self.round_flag:  # ack the engine
+            return CheckAction()
+        assert self.active == self.round_state.button % 2
+        return self.pokerbot.get_action(self.game_state, self.round_state, self.active)
+
+    def ponder(self, action):
+        '''
+        Starts the pokerbot pondering the state its action leads to, unless the round is over.
+        '''
+        round_state = self.round_state.proceed(action)
+        if isinstance(round_state, RoundState):
+            self.ponderer.start(self.game_state, round_state, self.active)
 
     def run(self):
         '''
-        Reconstructs the game tree based on the action history received from the engine.
+        Responds to every message from the engine until the game is over.
         '''
-        game_state = GameState(0, 0., 1)
-        round_state = None
-        active = 0
-        round_flag = True
         for packet in self.receive():
-            for clause in packet:
-                if clause[0] == 'T':
-                    game_state = GameState(game_state.bankroll, float(clause[1:]), game_state.round_num)
-                elif clause[0] == 'P':
-                    active = int(clause[1:])
-                elif clause[0] == 'H':
-                    hands = [[], []]
-                    hands[active] = clause[1:].split(',')
-                    pips = [SMALL_BLIND, BIG_BLIND]
-                    stacks = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
-                    round_state = RoundState(0, 0, pips, stacks, hands, [], None)
-                    if round_flag:
-                        self.pokerbot.handle_new_round(game_state, round_state, active)
-                        round_flag = False
-                elif clause[0] == 'F':
-                    round_state = round_state.proceed(FoldAction())
-                elif clause[0] == 'C':
-                    round_state = round_state.proceed(CallAction())
-                elif clause[0] == 'K':
-                    round_state = round_state.proceed(CheckAction())
-                elif clause[0] == 'R':
-                    round_state = round_state.proceed(RaiseAction(int(clause[1:])))
-                elif clause[0] == 'B':
-                    round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
-                                             round_state.hands, clause[1:].split(','), round_state.previous_state)
-                elif clause[0] == 'O':
-                    # backtrack
-                    round_state = round_state.previous_state
-                    revised_hands = list(round_state.hands)
-                    revised_hands[1-active] = clause[1:].split(',')
-                    # rebuild history
-                    round_state = RoundState(round_state.button, round_state.street, round_state.pips, round_state.stacks,
-                                             revised_hands, round_state.deck, round_state.previous_state)
-                    round_state = TerminalState([0, 0], round_state)
-                elif clause[0] == 'D':
-                    assert isinstance(round_state, TerminalState)
-                    delta = int(clause[1:])
-                    deltas = [-delta, -delta]
-                    deltas[active] = delta
-                    round_state = TerminalState(deltas, round_state.previous_state)
-                    game_state = GameState(game_state.bankroll + delta, game_state.game_clock, game_state.round_num)
-                    self.pokerbot.handle_round_over(game_state, round_state, active)
-                    game_state = GameState(game_state.bankroll, game_state.game_clock, game_state.round_num + 1)
-                    round_flag = True
-                elif clause[0] == 'Q':
-                    return
-            if round_flag:  # ack the engine
-                self.send(CheckAction())
-            else:
-                assert active == round_state.button % 2
-                action = self.pokerbot.get_action(game_state, round_state, active)
-                self.send(action)
+            if self.ponderer is not None:
+                self.ponderer.stop()
+            if packet and packet[0][0] == 'W':  # the engine offers optional protocol features
+                self.negotiate(packet[0][1])
+                continue
+            if packet and packet[-1][0] == 'N':  # the engine starts a new game on this connection
+                if len(packet) > 1:  # with coalesce, the last round's result comes first
+                    self.handle_packet(packet[:-1])
+                self.new_game()
+                continue
+            action = self.handle_packet(packet)
+            if action is None:
+                return
+            self.send(action)
+            if self.ponderer is not None and not self.round_flag:
+                self.ponder(action)
+        if self.ponderer is not None:
+            self.ponderer.stop()
+
+
+class MultiwayRunner(Runner):
+    '''
+    Interacts with the multiway engine, at a table of 2 to 10 seats, over the text protocol.
+    Each round starts with S, the number of seats, P, our seat, and H, our cards.
+    Rounds end with an O clause for every other hand shown, as the seat then the cards,
+    and one D clause with every seat's delta, in seat order. active is our seat.
+    '''
+
+    def __init__(self, pokerbot, socketfile, sock=None):
+        super().__init__(pokerbot, socketfile, sock)
+        self.num_seats = 2
+
+    @staticmethod
+    def parse_bytes(clause):
+        '''
+        Decodes one clause of the multiway text protocol, received as bytes, as a (code, argument) pair.
+        '''
+        code = chr(clause[0])
+        if code == 'S':
+            return code, int(clause[1:])
+        if code == 'O':
+            seat, *cards = clause[1:].split(b',')
+            return code, (int(seat), [CARD_NAMES[card] for card in cards])
+        if code == 'D':
+            return code, [int(delta) for delta in clause[1:].split(b',')]
+        return Runner.parse_bytes(clause)
+
+    def negotiate(self, offered):
+        '''
+        Declines every optional protocol feature, none of which the multiway protocol supports.
+        '''
+        self.socketfile.write('W\n')
+        self.socketfile.flush()
+
+    def handle_packet(self, packet):
+        '''
+        Reconstructs the round based on one message received from the engine.
+        The message is a list of (code, argument) pairs.
+        Returns the action to send back, or None once the engine ends the game.
+        '''
+        for code, argument in packet:
+            if code == 'T':
+                self.game_state = GameState(self.game_state.bankroll, argument, self.game_state.round_num)
+            elif code == 'S':
+                self.num_seats = argument
+            elif code == 'P':
+                self.active = argument
+            elif code == 'H':
+                hands = [[] for _ in range(self.num_seats)]
+                hands[self.active] = argument
+                self.round_state = MultiwayRoundState(self.num_seats, hands, [])
+                if self.round_flag:
+                    self.pokerbot.handle_new_round(self.game_state, self.round_state, self.active)
+                    self.round_flag = False
+            elif code == 'F':
+                self.round_state = self.round_state.proceed(FoldAction())
+            elif code == 'C':
+                self.round_state = self.round_state.proceed(CallAction())
+            elif code == 'K':
+                self.round_state = self.round_state.proceed(CheckAction())
+            elif code == 'R':
+                self.round_state = self.round_state.proceed(RaiseAction(argument))
+            elif code == 'B':
+                self.round_state = self.round_state.copy()
+                self.round_state.deck = argument
+            elif code == 'O':
+                seat, cards = argument
+                self.round_state = self.round_state.copy()
+                self.round_state.hands = list(self.round_state.hands)
+                self.round_state.hands[seat] = cards
+            elif code == 'D':
+                assert self.round_state.terminal
+                self.round_state = TerminalState(argument, self.round_state)
+                game_state = self.game_state
+                game_state = GameState(game_state.bankroll + argument[self.active], game_state.game_clock,
+                                       game_state.round_num)
+                self.pokerbot.handle_round_over(game_state, self.round_state, self.active)
+                self.game_state = GameState(game_state.bankroll, game_state.game_clock, game_state.round_num + 1)
+                self.round_flag = True
+            elif code == 'Q':
+                return None
+        if self.round_flag:  # ack the engine
+            return CheckAction()
+        assert self.active == self.round_state.active
+        return self.pokerbot.get_action(self.game_state, self.round_state, self.active)
+
+    def ponder(self, action):
+        '''
+        Starts the pokerbot pondering the state its action leads to, unless betting is over.
+        '''
+        round_state = self.round_state.proceed(action)
+        if not round_state.terminal:
+            self.ponderer.start(self.game_state, round_state, self.active)
 
 
 def parse_args():
@@ -112,21 +492,25 @@ def parse_args():
     '''
     parser = argparse.ArgumentParser(prog='python3 player.py')
     parser.add_argument('--host', type=str, default='localhost', help='Host to connect to, defaults to localhost')
-    parser.add_argument('port', type=int, help='Port on host to connect to')
+    parser.add_argument('port', type=str, help='Port on host to connect to, or the path of a Unix domain socket')
     return parser.parse_args()
 
-def run_bot(pokerbot, args):
+def run_bot(pokerbot, args, runner_class=Runner):
     '''
-    Runs the pokerbot.
+    Runs the pokerbot. Multiway pokerbots pass MultiwayRunner as the runner_class.
     '''
     assert isinstance(pokerbot, Bot)
     try:
-        sock = socket.create_connection((args.host, args.port))
+        if args.port.isdigit():
+            sock = socket.create_connection((args.host, int(args.port)))
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(args.port)
     except OSError:
         print('Could not connect to {}:{}'.format(args.host, args.port))
         return
-    socketfile = sock.makefile('rw')
-    runner = Runner(pokerbot, socketfile)
+    socketfile = sock.makefile('w')
+    runner = runner_class(pokerbot, socketfile, sock)
     runner.run()
     socketfile.close()
     sock.close()
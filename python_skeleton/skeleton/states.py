@@ -2,6 +2,8 @@
 Encapsulates game and round state information for the player.
 '''
 from collections import namedtuple
+from array import array
+from functools import lru_cache
 from .actions import FoldAction, CallAction, CheckAction, RaiseAction
 
 GameState = namedtuple('GameState', ['bankroll', 'game_clock', 'round_num'])
@@ -12,6 +14,86 @@ STARTING_STACK = 400
 BIG_BLIND = 2
 SMALL_BLIND = 1
 
+# action codes; legal action masks set bit 1 << code
+FOLD, CALL, CHECK, RAISE = range(4)
+MASK_ACTIONS = tuple(frozenset(action for code, action in enumerate([FoldAction, CallAction, CheckAction, RaiseAction])
+                               if mask >> code & 1) for mask in range(16))
+
+
+@lru_cache(maxsize=65536)
+def legal_mask(active, pip0, pip1, stack0, stack1):
+    '''
+    Returns the active player's legal moves as a bitmask, memoized on the betting state.
+    MASK_ACTIONS[mask] is the same moves as a frozenset of action classes.
+    '''
+    pips = (pip0, pip1)
+    continue_cost = pips[1-active] - pips[active]
+    if continue_cost == 0:
+        # we can only raise the stakes if both players can afford it
+        bets_forbidden = (stack0 == 0 or stack1 == 0)
+        return 1 << CHECK if bets_forbidden else 1 << CHECK | 1 << RAISE
+    # similarly, re-raising is only allowed if both players can afford it
+    stacks = (stack0, stack1)
+    raises_forbidden = (continue_cost == stacks[active] or stacks[1-active] == 0)
+    return 1 << FOLD | 1 << CALL if raises_forbidden else 1 << FOLD | 1 << CALL | 1 << RAISE
+
+
+@lru_cache(maxsize=65536)
+def raise_range(active, pip0, pip1, stack0, stack1):
+    '''
+    Returns a tuple of the minimum and maximum legal raises, memoized on the betting state.
+    '''
+    pips = (pip0, pip1)
+    stacks = (stack0, stack1)
+    continue_cost = pips[1-active] - pips[active]
+    max_contribution = min(stacks[active], stacks[1-active] + continue_cost)
+    min_contribution = min(max_contribution, continue_cost + max(continue_cost, BIG_BLIND))
+    return (pips[active] + min_contribution, pips[active] + max_contribution)
+
+
+class BetAbstraction():
+    '''
+    A fixed set of raise sizes, as fractions of the pot, for search code.
+    A raise of fraction f of the pot raises to the opponent's pip plus f times the pot after calling.
+    Sizes are clamped to the legal raises, so small stacks can map several fractions to one amount.
+    '''
+
+    def __init__(self, pot_fractions=(.5, 1., 2.), all_in=True, cache_size=65536):
+        self.pot_fractions = tuple(sorted(pot_fractions))
+        self.all_in = all_in
+        self.cache_size = cache_size
+        self.cache = {}
+
+    def raise_amounts(self, round_state):
+        '''
+        Returns the abstraction's raise amounts in the state, a sorted tuple that is empty
+        when raising is illegal. Results are memoized on the betting state.
+        '''
+        pips = round_state.pips
+        stacks = round_state.stacks
+        key = (round_state.button % 2, pips[0], pips[1], stacks[0], stacks[1])
+        amounts = self.cache.get(key)
+        if amounts is None:
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            amounts = self.cache[key] = self.compute(*key)
+        return amounts
+
+    def compute(self, active, pip0, pip1, stack0, stack1):
+        '''
+        Computes the raise amounts of one betting state.
+        '''
+        if not legal_mask(active, pip0, pip1, stack0, stack1) >> RAISE & 1:
+            return ()
+        min_raise, max_raise = raise_range(active, pip0, pip1, stack0, stack1)
+        opponent_pip = (pip0, pip1)[1-active]
+        pot = 2 * STARTING_STACK - stack0 - stack1 + opponent_pip - (pip0, pip1)[active]
+        amounts = {min(max_raise, max(min_raise, opponent_pip + int(round(fraction * pot))))
+                   for fraction in self.pot_fractions}
+        if self.all_in:
+            amounts.add(max_raise)
+        return tuple(sorted(amounts))
+
 
 class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks', 'hands', 'deck', 'previous_state'])):
     '''
@@ -28,26 +110,19 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks'
         '''
         Returns a set which corresponds to the active player's legal moves.
         '''
-        active = self.button % 2
-        continue_cost = self.pips[1-active] - self.pips[active]
-        if continue_cost == 0:
-            # we can only raise the stakes if both players can afford it
-            bets_forbidden = (self.stacks[0] == 0 or self.stacks[1] == 0)
-            return {CheckAction} if bets_forbidden else {CheckAction, RaiseAction}
-        # continue_cost > 0
-        # similarly, re-raising is only allowed if both players can afford it
-        raises_forbidden = (continue_cost == self.stacks[active] or self.stacks[1-active] == 0)
-        return {FoldAction, CallAction} if raises_forbidden else {FoldAction, CallAction, RaiseAction}
+        return set(MASK_ACTIONS[self.legal_action_mask()])
+
+    def legal_action_mask(self):
+        '''
+        Returns the active player's legal moves as a memoized bitmask, with bit 1 << FOLD, CALL, CHECK or RAISE.
+        '''
+        return legal_mask(self.button % 2, self.pips[0], self.pips[1], self.stacks[0], self.stacks[1])
 
     def raise_bounds(self):
         '''
         Returns a tuple of the minimum and maximum legal raises.
         '''
-        active = self.button % 2
-        continue_cost = self.pips[1-active] - self.pips[active]
-        max_contribution = min(self.stacks[active], self.stacks[1-active] + continue_cost)
-        min_contribution = min(max_contribution, continue_cost + max(continue_cost, BIG_BLIND))
-        return (self.pips[active] + min_contribution, self.pips[active] + max_contribution)
+        return raise_range(self.button % 2, self.pips[0], self.pips[1], self.stacks[0], self.stacks[1])
 
     def proceed_street(self):
         '''
@@ -89,3 +164,285 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'pips', 'stacks'
         new_stacks[active] -= contribution
         new_pips[active] += contribution
         return RoundState(self.button + 1, self.street, new_pips, new_stacks, self.hands, self.deck, self)
+
+
+class FlatRoundState():
+    '''
+    A mutable alternative to RoundState for search code.
+    Actions are applied and undone in place, so walking the game tree allocates no new states.
+    '''
+    __slots__ = ['button', 'street', 'pips', 'stacks', 'hands', 'deck', 'terminal', 'deltas', 'actions', 'history']
+
+    def __init__(self, button=0, street=0, pips=(SMALL_BLIND, BIG_BLIND),
+                 stacks=(STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND), hands=([], []), deck=()):
+        self.button = button
+        self.street = street
+        self.pips = list(pips)
+        self.stacks = list(stacks)
+        self.hands = list(hands)
+        self.deck = list(deck)
+        self.terminal = False
+        self.deltas = [0, 0]
+        self.actions = []  # the action log, oldest first
+        self.history = array('i')  # button, street, pips and stacks before each logged action
+
+    @classmethod
+    def from_round_state(cls, round_state):
+        '''
+        Builds a FlatRoundState from a RoundState, without its history.
+        '''
+        return cls(round_state.button, round_state.street, round_state.pips, round_state.stacks,
+                   round_state.hands, round_state.deck)
+
+    def copy(self):
+        '''
+        Returns an independent copy of the state, including its action log.
+        '''
+        state = FlatRoundState(self.button, self.street, self.pips, self.stacks, self.hands, self.deck)
+        state.terminal = self.terminal
+        state.deltas = list(self.deltas)
+        state.actions = list(self.actions)
+        state.history = array('i', self.history)
+        return state
+
+    def showdown(self):
+        '''
+        Ends the round at showdown. The opponent's cards are unknown, so payoffs are zero.
+        '''
+        self.terminal = True
+        self.deltas[0] = 0
+        self.deltas[1] = 0
+
+    def legal_actions(self):
+        '''
+        Returns a set which corresponds to the active player's legal moves.
+        '''
+        return set(MASK_ACTIONS[self.legal_action_mask()])
+
+    def legal_action_mask(self):
+        '''
+        Returns the active player's legal moves as a memoized bitmask, with bit 1 << FOLD, CALL, CHECK or RAISE.
+        '''
+        return legal_mask(self.button % 2, self.pips[0], self.pips[1], self.stacks[0], self.stacks[1])
+
+    def raise_bounds(self):
+        '''
+        Returns a tuple of the minimum and maximum legal raises.
+        '''
+        return raise_range(self.button % 2, self.pips[0], self.pips[1], self.stacks[0], self.stacks[1])
+
+    def proceed_street(self):
+        '''
+        Resets the players' pips and advances the game tree to the next round of betting, in place.
+        '''
+        if self.street == 5:
+            self.showdown()
+            return
+        self.button = 1
+        self.street = 3 if self.street == 0 else self.street + 1
+        self.pips[0] = 0
+        self.pips[1] = 0
+
+    def apply(self, action):
+        '''
+        Advances the game tree by one action performed by the active player, in place.
+        '''
+        pips = self.pips
+        stacks = self.stacks
+        self.history.extend((self.button, self.street, pips[0], pips[1], stacks[0], stacks[1]))
+        self.actions.append(action)
+        active = self.button % 2
+        if isinstance(action, FoldAction):
+            delta = stacks[0] - STARTING_STACK if active == 0 else STARTING_STACK - stacks[1]
+            self.terminal = True
+            self.deltas[0] = delta
+            self.deltas[1] = -delta
+        elif isinstance(action, CallAction):
+            if self.button == 0:  # sb calls bb
+                self.button = 1
+                pips[0] = pips[1] = BIG_BLIND
+                stacks[0] = stacks[1] = STARTING_STACK - BIG_BLIND
+                return
+            # both players acted
+            contribution = pips[1-active] - pips[active]
+            stacks[active] -= contribution
+            pips[active] += contribution
+            self.button += 1
+            self.proceed_street()
+        elif isinstance(action, CheckAction):
+            if (self.street == 0 and self.button > 0) or self.button > 1:  # both players acted
+                self.proceed_street()
+            else:  # let opponent act
+                self.button += 1
+        else:  # isinstance(action, RaiseAction)
+            contribution = action.amount - pips[active]
+            stacks[active] -= contribution
+            pips[active] += contribution
+            self.button += 1
+
+    def undo(self):
+        '''
+        Reverts the most recent action in the action log, in place.
+        '''
+        self.actions.pop()
+        history = self.history
+        self.stacks[1] = history.pop()
+        self.stacks[0] = history.pop()
+        self.pips[1] = history.pop()
+        self.pips[0] = history.pop()
+        self.street = history.pop()
+        self.button = history.pop()
+        self.terminal = False
+
+    def proceed(self, action):
+        '''
+        Returns a copy of the state advanced by one action, leaving this state untouched.
+        '''
+        state = self.copy()
+        state.apply(action)
+        return state
+
+
+class MultiwayRoundState():
+    '''
+    Encodes one round at a table of 2 to 10 seats, with the rules of the engine's multiway.py.
+    Seat 0 posts the small blind and seat 1 the big blind, so with three or more seats the button
+    is the last seat. hands holds each seat's cards, empty until shown, and deck the board cards
+    dealt so far. Neither list is changed in place, so states may share them.
+    The round's payoffs arrive in a TerminalState once betting ends, when terminal is set.
+    '''
+    __slots__ = ['num_seats', 'street', 'active', 'pips', 'stacks', 'folded', 'bet', 'last_raise', 'to_act',
+                 'num_live', 'num_able', 'hands', 'deck', 'terminal']
+
+    def __init__(self, num_seats, hands, deck):
+        self.num_seats = num_seats
+        self.street = 0
+        self.pips = [0] * num_seats
+        self.pips[0] = SMALL_BLIND
+        self.pips[1] = BIG_BLIND
+        self.stacks = [STARTING_STACK - pip for pip in self.pips]
+        self.folded = [False] * num_seats
+        self.bet = BIG_BLIND
+        self.last_raise = BIG_BLIND
+        self.to_act = num_seats
+        self.num_live = num_seats  # seats that have not folded
+        self.num_able = num_seats  # seats that have not folded and can still bet
+        self.active = 2 % num_seats
+        self.hands = hands
+        self.deck = deck
+        self.terminal = False
+
+    def copy(self):
+        '''
+        Returns an independent copy of the betting state, sharing the hands and deck lists, which never change.
+        '''
+        state = MultiwayRoundState.__new__(MultiwayRoundState)
+        for slot in MultiwayRoundState.__slots__:
+            setattr(state, slot, getattr(self, slot))
+        state.pips = list(self.pips)
+        state.stacks = list(self.stacks)
+        state.folded = list(self.folded)
+        return state
+
+    def first_seat(self):
+        '''
+        Returns the seat after the button, which is first to act after the flop.
+        '''
+        return 1 if self.num_seats == 2 else 0
+
+    def next_seat(self, seat):
+        '''
+        Returns the next seat after this one that can still act.
+        '''
+        for offset in range(1, self.num_seats + 1):
+            candidate = (seat + offset) % self.num_seats
+            if not self.folded[candidate] and self.stacks[candidate] > 0:
+                return candidate
+        return seat
+
+    def legal_actions(self):
+        '''
+        Returns a set which corresponds to the active seat's legal moves.
+        '''
+        continue_cost = self.bet - self.pips[self.active]
+        # we can only raise the stakes if someone else can afford to call
+        others_able = self.num_able > 1
+        if continue_cost == 0:
+            return {CheckAction, RaiseAction} if others_able else {CheckAction}
+        raises_forbidden = (continue_cost >= self.stacks[self.active] or not others_able)
+        return {FoldAction, CallAction} if raises_forbidden else {FoldAction, CallAction, RaiseAction}
+
+    def raise_bounds(self):
+        '''
+        Returns a tuple of the minimum and maximum legal raises.
+        '''
+        active = self.active
+        pips = self.pips
+        stacks = self.stacks
+        continue_cost = self.bet - pips[active]
+        largest_call = max([stacks[seat] + pips[seat] for seat in range(self.num_seats)
+                            if seat != active and not self.folded[seat]])
+        max_contribution = min(stacks[active], largest_call - pips[active])
+        min_contribution = min(max_contribution, continue_cost + max(self.last_raise, BIG_BLIND))
+        return (pips[active] + min_contribution, pips[active] + max_contribution)
+
+    def proceed_street(self):
+        '''
+        Resets the pips and advances to the next round of betting, in place.
+        The round ends at showdown after the river, or once fewer than two seats can still bet.
+        '''
+        if self.street == 5 or self.num_able < 2:
+            self.terminal = True
+            return
+        self.street = 3 if self.street == 0 else self.street + 1
+        for seat in range(self.num_seats):
+            self.pips[seat] = 0
+        self.bet = 0
+        self.last_raise = 0
+        self.to_act = self.num_able
+        self.active = self.next_seat(self.first_seat() - 1)
+
+    def apply(self, action):
+        '''
+        Advances the round by one action performed by the active seat, in place.
+        '''
+        active = self.active
+        pips = self.pips
+        stacks = self.stacks
+        if isinstance(action, FoldAction):
+            self.folded[active] = True
+            self.num_live -= 1
+            self.num_able -= 1
+            self.to_act -= 1
+        elif isinstance(action, CallAction):
+            contribution = self.bet - pips[active]
+            stacks[active] -= contribution
+            pips[active] += contribution
+            self.to_act -= 1
+            if stacks[active] == 0:
+                self.num_able -= 1
+        elif isinstance(action, CheckAction):
+            self.to_act -= 1
+        else:  # isinstance(action, RaiseAction)
+            stacks[active] -= action.amount - pips[active]
+            pips[active] = action.amount
+            self.last_raise = action.amount - self.bet
+            self.bet = action.amount
+            if stacks[active] == 0:
+                self.num_able -= 1
+            # everyone else who can still bet acts again
+            self.to_act = self.num_able - (1 if stacks[active] > 0 else 0)
+        if self.num_live == 1:
+            self.terminal = True
+        elif self.to_act <= 0:
+            self.proceed_street()
+        else:
+            self.active = self.next_seat(active)
+
+    def proceed(self, action):
+        '''
+        Returns a copy of the state advanced by one action, leaving this state untouched.
+        '''
+        state = self.copy()
+        state.apply(action)
+        return state
@@ -0,0 +1,107 @@
+'''
+Deadline-aware time management for pokerbots.
+
+A TimeManager splits the game clock over the decisions left in the game. At every decision
+it reads GameState.game_clock and round_num, and learns two things as the game goes: how many
+decisions a round takes, and how much of the clock goes per decision to time spent outside
+get_action, such as messaging, acks and the other handlers. What is left after a reserve is
+shared evenly between the remaining decisions, so a bot that spends its budgets uses its whole
+clock without running it out.
+
+Typical use, in get_action:
+
+    self.timer.start(game_state)
+    while not self.timer.expired():
+        ...one more iteration of search...
+    self.timer.stop()
+
+or, for loops with cheap iterations, for _ in self.timer.iterations(check_every=64).
+'''
+import time
+
+from .states import NUM_ROUNDS
+
+
+class TimeManager():
+    '''
+    Turns the game clock into a deadline for each decision.
+
+    reserve: seconds of the clock never budgeted, against overheads the estimates miss.
+    max_share: the largest share of the remaining clock a single decision may use.
+    decisions_per_round: the first estimate of our decisions per round, refined as the game goes.
+    smoothing: the weight of each new observation in the running estimates.
+    '''
+
+    def __init__(self, reserve=1., max_share=.1, decisions_per_round=2., smoothing=.05):
+        self.reserve = reserve
+        self.max_share = max_share
+        self.decisions_per_round = decisions_per_round
+        self.smoothing = smoothing
+        self.overhead = 0.  # seconds charged per decision outside get_action
+        self.round_num = 0
+        self.decisions = 0  # our decisions so far this round
+        self.last_clock = None
+        self.used = 0.  # seconds the last decision took, from start() to stop()
+        self.start_time = 0.
+        self.budget = 0.
+        self.deadline = 0.  # in time.perf_counter() seconds
+
+    def start(self, game_state, weight=1.):
+        '''
+        Starts timing a decision and returns its deadline, in time.perf_counter() seconds.
+        A weight above 1 lets an important decision, such as a big river bet, take a larger budget.
+        '''
+        now = time.perf_counter()
+        clock = game_state.game_clock
+        if self.last_clock is not None:
+            # the clock went down by our last decision's time and by the overhead since then
+            overhead = max(self.last_clock - clock - self.used, 0.)
+            self.overhead += self.smoothing * (overhead - self.overhead)
+        if game_state.round_num != self.round_num:
+            if self.round_num:
+                self.decisions_per_round += self.smoothing * (self.decisions - self.decisions_per_round)
+            self.round_num = game_state.round_num
+            self.decisions = 0
+        self.decisions += 1
+        rounds_left = NUM_ROUNDS - game_state.round_num + 1
+        decisions_left = max(rounds_left * self.decisions_per_round - self.decisions + 1, 1.)
+        spendable = max(clock - self.reserve - self.overhead * decisions_left, 0.)
+        self.budget = min(weight * spendable / decisions_left, self.max_share * spendable)
+        self.start_time = now
+        self.deadline = now + self.budget
+        self.last_clock = clock
+        self.used = 0.
+        return self.deadline
+
+    def stop(self):
+        '''
+        Ends the decision, and returns the seconds it took.
+        '''
+        self.used = time.perf_counter() - self.start_time
+        return self.used
+
+    def expired(self):
+        '''
+        Returns whether the decision's deadline has passed.
+        '''
+        return time.perf_counter() >= self.deadline
+
+    def remaining(self):
+        '''
+        Returns the seconds left until the decision's deadline.
+        '''
+        return max(self.deadline - time.perf_counter(), 0.)
+
+    def iterations(self, check_every=1):
+        '''
+        Yields 0, 1, 2, ... until the deadline passes, reading the clock only every check_every iterations.
+        Always yields at least once, so that a decision is made.
+        '''
+        iteration = 0
+        deadline = self.deadline
+        perf_counter = time.perf_counter
+        while True:
+            yield iteration
+            iteration += 1
+            if iteration % check_every == 0 and perf_counter() >= deadline:
+                return
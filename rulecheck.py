@@ -0,0 +1,306 @@
+'''
+6.176 MIT POKERBOTS RULE CHECKS
+Plays random rounds through RoundState and through the engine's other implementations of
+its rules, and stops at the first point where they disagree.
+
+RoundState is the reference, except at tables of three or more seats, where the pokerbots'
+MultiwayRoundState is checked against the engine's. Run this after any change to the betting
+or showdown rules; the exit status is 1 if a check fails.
+'''
+from array import array
+from collections import OrderedDict
+import argparse
+import random
+import sys
+
+from engine import RoundState, FlatRoundState, TerminalState, FoldAction, CallAction, CheckAction, RaiseAction
+from engine import STARTING_STACK, BIG_BLIND, SMALL_BLIND
+from deals import LazyDeck, RoundDeck
+from evaluator import CARDS
+from multiway import MultiwayRoundState, MAX_SEATS
+from simulator import Simulator, FOLD, CALL, CHECK, RAISE, ACTION_BITS
+from python_skeleton.skeleton import actions as bot_actions
+from python_skeleton.skeleton.states import MultiwayRoundState as BotMultiwayRoundState
+from python_skeleton.skeleton.states import RoundState as BotRoundState, FlatRoundState as BotFlatRoundState
+from python_skeleton.skeleton.states import TerminalState as BotTerminalState
+
+ACTION_ORDER = {FoldAction: 0, CallAction: 1, CheckAction: 2, RaiseAction: 3}
+ACTION_CODES = {FoldAction: FOLD, CallAction: CALL, CheckAction: CHECK, RaiseAction: RAISE}
+BOT_ACTIONS = {FoldAction: bot_actions.FoldAction, CallAction: bot_actions.CallAction,
+               CheckAction: bot_actions.CheckAction, RaiseAction: bot_actions.RaiseAction}
+
+
+class RuleMismatch(Exception):
+    '''
+    An implementation of the rules disagrees with RoundState.
+    '''
+
+
+def expect(round_index, what, expected, actual, reference='RoundState'):
+    '''
+    Raises a RuleMismatch unless an implementation's value matches the reference's, usually RoundState's.
+    '''
+    if expected != actual:
+        raise RuleMismatch('round {}: {} is {}, {} says {}'.format(round_index, what, actual, reference, expected))
+
+
+def random_action(state, rng):
+    '''
+    Returns a random legal action. Raises favor the smallest and largest amounts, where the edge cases are.
+    '''
+    action = rng.choice(sorted(state.legal_actions(), key=ACTION_ORDER.__getitem__))
+    if action is RaiseAction:
+        min_raise, max_raise = state.raise_bounds()
+        return RaiseAction(rng.choice([min_raise, max_raise, rng.randint(min_raise, max_raise)]))
+    return action()
+
+
+def first_state(deck):
+    '''
+    Deals a new round from the deck and returns its first RoundState.
+    '''
+    hands = deck.next_round()
+    return RoundState(0, 0, [SMALL_BLIND, BIG_BLIND], [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND],
+                      hands, deck, None)
+
+
+def action_names(actions):
+    '''
+    Returns the sorted names of a set of action classes, which compare equal between the engine and the pokerbots.
+    '''
+    return sorted([action.__name__ for action in actions])
+
+
+def expect_same_state(round_index, state, other):
+    '''
+    Compares the betting state and the legal moves of another implementation, the engine's or the pokerbots',
+    with a RoundState.
+    '''
+    expect(round_index, 'button', state.button, other.button)
+    expect(round_index, 'street', state.street, other.street)
+    expect(round_index, 'pips', list(state.pips), list(other.pips))
+    expect(round_index, 'stacks', list(state.stacks), list(other.stacks))
+    legal_actions = state.legal_actions()
+    expect(round_index, 'legal actions', action_names(legal_actions), action_names(other.legal_actions()))
+    if RaiseAction in legal_actions:
+        expect(round_index, 'raise bounds', state.raise_bounds(), other.raise_bounds())
+
+
+def check_flat_round_state(num_rounds, seed):
+    '''
+    FlatRoundState.apply, undo and proceed against RoundState.proceed and showdown.
+    '''
+    rng = random.Random(seed)
+    deck = LazyDeck(rng)
+    for round_index in range(num_rounds):
+        state = first_state(deck)
+        flat = FlatRoundState.from_round_state(state)
+        while True:
+            expect_same_state(round_index, state, flat)
+            action = random_action(state, rng)
+            before = (flat.button, flat.street, list(flat.pips), list(flat.stacks))
+            flat.apply(action)
+            flat.undo()
+            expect(round_index, 'state after undo', before, (flat.button, flat.street, flat.pips, flat.stacks))
+            proceeded = flat.proceed(action)
+            expect(round_index, 'state after proceed', before, (flat.button, flat.street, flat.pips, flat.stacks))
+            flat.apply(action)
+            expect(round_index, 'proceed and apply', (flat.button, flat.street, flat.pips, flat.stacks, flat.deltas),
+                   (proceeded.button, proceeded.street, proceeded.pips, proceeded.stacks, proceeded.deltas))
+            state = state.proceed(action)
+            expect(round_index, 'round over', isinstance(state, TerminalState), flat.terminal)
+            if flat.terminal:
+                expect(round_index, 'deltas', state.deltas, flat.deltas)
+                break
+
+
+def table_round_state(hands, board):
+    '''
+    Returns the first RoundState of a round dealt as card codes: four hole cards and five board cards.
+    '''
+    deck = RoundDeck()
+    deck.codes[:9] = bytes(hands) + bytes(board)
+    return RoundState(0, 0, [SMALL_BLIND, BIG_BLIND], [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND],
+                      [[CARDS[hands[0]], CARDS[hands[1]]], [CARDS[hands[2]], CARDS[hands[3]]]], deck, None)
+
+
+def engine_action(state, code, amount):
+    '''
+    Returns the action the engine takes for an action code and amount, replacing an illegal one
+    with a check if possible, and a fold otherwise.
+    '''
+    legal_actions = state.legal_actions()
+    if code == RAISE and RaiseAction in legal_actions:
+        min_raise, max_raise = state.raise_bounds()
+        if min_raise <= amount <= max_raise:
+            return RaiseAction(amount)
+    action = [FoldAction, CallAction, CheckAction, None][code]
+    if action in legal_actions:
+        return action()
+    return CheckAction() if CheckAction in legal_actions else FoldAction()
+
+
+def check_simulator(num_rounds, seed, num_tables=100):
+    '''
+    Simulator.reset and step, observations and rewards, against RoundState, including illegal actions.
+    '''
+    rng = random.Random(seed)
+    simulator = Simulator(num_tables, seed)
+    codes = array('B', [0]) * num_tables
+    amounts = array('H', [0]) * num_tables
+    for first_round in range(0, num_rounds, num_tables):
+        observation = simulator.reset()
+        states = [table_round_state(table.hands[0] + table.hands[1], table.deck) for table in simulator.tables]
+        while True:
+            for i, state in enumerate(states):
+                round_index = first_round + i
+                if isinstance(state, TerminalState):
+                    expect(round_index, 'legal action mask', 0, observation.legal_masks[i])
+                    continue
+                expect(round_index, 'active seat', state.button % 2, observation.active[i])
+                expect(round_index, 'street', state.street, observation.street[i])
+                legal_actions = state.legal_actions()
+                expect(round_index, 'legal action mask', sum([ACTION_BITS[action] for action in legal_actions]),
+                       observation.legal_masks[i])
+                if RaiseAction in legal_actions:
+                    expect(round_index, 'raise bounds', state.raise_bounds(),
+                           (observation.min_raises[i], observation.max_raises[i]))
+                if rng.random() < .1:  # anything, legal or not
+                    codes[i] = rng.randrange(4)
+                    amounts[i] = rng.randrange(STARTING_STACK + 1)
+                else:
+                    action = random_action(state, rng)
+                    codes[i] = ACTION_CODES[type(action)]
+                    amounts[i] = action.amount if isinstance(action, RaiseAction) else 0
+            if all(simulator.dones):
+                break
+            live = [not isinstance(state, TerminalState) for state in states]
+            observation, rewards, dones = simulator.step(codes, amounts)
+            for i, state in enumerate(states):
+                if not live[i]:
+                    continue
+                round_index = first_round + i
+                state = states[i] = state.proceed(engine_action(state, codes[i], amounts[i]))
+                terminal = isinstance(state, TerminalState)
+                expect(round_index, 'done', terminal, bool(dones[i]))
+                expect(round_index, 'rewards', state.deltas if terminal else [0, 0], [rewards[2*i], rewards[2*i+1]])
+
+
+def expect_same_seats(round_index, state, table, reference='RoundState'):
+    '''
+    Compares the betting state and the legal moves of a MultiwayRoundState with a reference state:
+    a heads-up RoundState, or another MultiwayRoundState.
+    '''
+    active = state.button % 2 if isinstance(state, RoundState) else state.active
+    expect(round_index, 'active seat', active, table.active, reference)
+    expect(round_index, 'street', state.street, table.street, reference)
+    expect(round_index, 'pips', list(state.pips), list(table.pips), reference)
+    expect(round_index, 'stacks', list(state.stacks), list(table.stacks), reference)
+    legal_actions = state.legal_actions()
+    expect(round_index, 'legal actions', action_names(legal_actions), action_names(table.legal_actions()),
+           reference)
+    if RaiseAction in legal_actions:
+        expect(round_index, 'raise bounds', state.raise_bounds(), table.raise_bounds(), reference)
+
+
+def bot_action(action):
+    '''
+    Returns the pokerbots' version of an engine action.
+    '''
+    if isinstance(action, RaiseAction):
+        return bot_actions.RaiseAction(action.amount)
+    return BOT_ACTIONS[type(action)]()
+
+
+def check_multiway(num_rounds, seed):
+    '''
+    MultiwayRoundState, the engine's and the pokerbots', against RoundState heads-up, where the multiway
+    states deal out the streets RoundState checks down once a player is all-in. At 3 to 10 seats,
+    the pokerbots' MultiwayRoundState against the engine's.
+    '''
+    rng = random.Random(seed)
+    for round_index in range(num_rounds):
+        num_seats = 2 if round_index % 2 == 0 else rng.randint(3, MAX_SEATS)
+        cards = rng.sample(range(52), 2 * num_seats + 5)
+        table = MultiwayRoundState(num_seats, cards[:2*num_seats], cards[2*num_seats:])
+        bot = BotMultiwayRoundState(num_seats, [[] for _ in range(num_seats)], [])
+        state = table_round_state(cards[:4], cards[4:]) if num_seats == 2 else None
+        while not table.terminal:
+            if state is not None:
+                expect_same_seats(round_index, state, table)
+            expect_same_seats(round_index, table, bot, 'multiway.py')
+            action = random_action(table, rng)
+            if state is not None:
+                state = state.proceed(action)
+            table.apply(action)
+            bot.apply(bot_action(action))
+            expect(round_index, 'betting over', table.terminal, bot.terminal, 'multiway.py')
+        if state is not None:
+            while not isinstance(state, TerminalState):
+                expect(round_index, 'legal actions once betting is over', {CheckAction}, state.legal_actions())
+                state = state.proceed(CheckAction())
+            expect(round_index, 'deltas', state.deltas, table.deltas)
+        expect(round_index, 'folded seats', [bool(folded) for folded in table.folded], bot.folded, 'multiway.py')
+
+
+def check_skeleton(num_rounds, seed):
+    '''
+    The pokerbots' RoundState and FlatRoundState against the engine's RoundState, up to the showdown,
+    whose payoffs the pokerbots learn from the engine.
+    '''
+    rng = random.Random(seed)
+    deck = LazyDeck(rng)
+    for round_index in range(num_rounds):
+        state = first_state(deck)
+        bot = BotRoundState(0, 0, [SMALL_BLIND, BIG_BLIND], [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND],
+                            [[], []], [], None)
+        flat = BotFlatRoundState()
+        while not isinstance(state, TerminalState):
+            expect_same_state(round_index, state, bot)
+            expect_same_state(round_index, state, flat)
+            action = random_action(state, rng)
+            state = state.proceed(action)
+            bot = bot.proceed(bot_action(action))
+            flat.apply(bot_action(action))
+            terminal = isinstance(state, TerminalState)
+            expect(round_index, 'round over', terminal, isinstance(bot, BotTerminalState))
+            expect(round_index, 'round over', terminal, flat.terminal)
+        if bot.deltas != [0, 0]:  # a fold
+            expect(round_index, 'deltas', state.deltas, bot.deltas)
+            expect(round_index, 'deltas', state.deltas, flat.deltas)
+
+
+CHECKS = OrderedDict([
+    ('flat_round_state', check_flat_round_state),
+    ('simulator', check_simulator),
+    ('multiway', check_multiway),
+    ('skeleton', check_skeleton),
+])
+
+
+def parse_args():
+    '''
+    Parses the checks to run and how many rounds to play.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 rulecheck.py')
+    parser.add_argument('names', nargs='*', help='Checks to run, defaults to all of ' + ', '.join(CHECKS))
+    parser.add_argument('--rounds', type=int, default=20000, help='Random rounds per check, defaults to 20000')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the deals and actions, defaults to 0')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = parse_args()
+    UNKNOWN = [name for name in ARGS.names if name not in CHECKS]
+    if UNKNOWN:
+        sys.exit('Unknown checks: ' + ', '.join(UNKNOWN))
+    FAILED = False
+    for NAME in ARGS.names or list(CHECKS):
+        try:
+            CHECKS[NAME](ARGS.rounds, ARGS.seed)
+            print('{:<24} {} rounds agree with RoundState'.format(NAME, ARGS.rounds))
+        except RuleMismatch as mismatch:
+            print('{:<24} FAILED: {}'.format(NAME, mismatch))
+            FAILED = True
+    if FAILED:
+        sys.exit(1)
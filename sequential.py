@@ -0,0 +1,105 @@
+'''
+Sequential testing of match results, for stopping scrimmages once one player is significantly ahead.
+
+A SequentialTest reads the first player's bankroll delta after every round and runs two one-sided
+Wald sequential probability ratio tests on its mean: that the players are even, mean 0, against
+the first player winning margin chips per round, and against it losing margin chips per round.
+Each test rejects the null of an even match with probability at most alpha / 2, so the match is
+stopped with a winner with probability at most alpha when the players are even, and a player
+better by margin is missed with probability at most beta. A test that accepts the null can no
+longer stop the match; when both do, the match is played out in full.
+The deltas are taken as normal with the variance observed so far, which is sound after a few
+dozen rounds, so the tests only decide after min_rounds.
+
+Run this file to check the error rate on even matches of simulated self-play.
+'''
+import math
+import sys
+
+
+class SequentialTest():
+    '''
+    Two one-sided SPRTs, mean 0 against +margin and against -margin, on the first player's per-round deltas.
+    '''
+
+    def __init__(self, margin, alpha, beta, min_rounds):
+        self.margin = margin
+        self.min_rounds = min_rounds
+        self.upper = math.log((1. - beta) / (alpha / 2.))  # a player is ahead by margin
+        self.lower = math.log(beta / (1. - alpha / 2.))  # the players are even, as far as this side goes
+        self.count = 0
+        self.mean = 0.
+        self.squares = 0.  # the sum of squared differences from the mean, as in Welford's algorithm
+        self.ratios = [0., 0.]  # the log-likelihood ratios of the last update, for the first and second player
+        self.even = [False, False]  # whether each side's test accepted that the players are even
+
+    def variance(self):
+        '''
+        Returns the sample variance of the deltas so far.
+        '''
+        return self.squares / (self.count - 1) if self.count > 1 else 0.
+
+    def update(self, delta):
+        '''
+        Adds one round's delta for the first player. Returns 1 once the first player is significantly
+        ahead, -1 once the second player is, and 0 otherwise.
+        '''
+        self.count += 1
+        difference = delta - self.mean
+        self.mean += difference / self.count
+        self.squares += difference * (delta - self.mean)
+        if self.count < self.min_rounds:
+            return 0
+        # for normal deltas, testing mean sign * margin against 0, the ratio is
+        # (sign * margin * sum - count * margin^2 / 2) / variance
+        variance = max(self.variance(), 1e-9)
+        for side, sign in enumerate((1., -1.)):
+            if self.even[side]:
+                continue
+            ratio = self.ratios[side] = self.count * self.margin * (sign * self.mean - self.margin / 2.) / variance
+            if ratio >= self.upper:
+                return int(sign)
+            if ratio <= self.lower:
+                self.even[side] = True
+        return 0
+
+    def describe(self, decision, names):
+        '''
+        Explains a decision of the test, given the names of the first and second players.
+        '''
+        winner, loser = names if decision > 0 else names[::-1]
+        ratio = self.ratios[0 if decision > 0 else 1]
+        return ('{} is significantly ahead of {} after {} rounds (mean {:+.2f}, SPRT log-likelihood ratio '
+                '{:.2f} against an even match, bound {:.2f})').format(winner, loser, self.count, self.mean,
+                                                                     ratio, self.upper)
+
+
+def false_winner_rate(num_matches, num_rounds, margin=1., alpha=.05, beta=.05, min_rounds=100, seed=0):
+    '''
+    Plays num_matches matches of simulated self-play between two identical check-call pokerbots,
+    which swap seats every round as in the engine, and returns the fraction the test stopped with a winner.
+    '''
+    from simulator import Simulator, CALL  # pylint: disable=import-outside-toplevel
+    simulator = Simulator(num_matches, seed)
+    tests = [SequentialTest(margin, alpha, beta, min_rounds) for _ in range(num_matches)]
+    stopped = [False] * num_matches
+    codes = bytes([CALL]) * num_matches  # the simulator checks when calling is illegal
+    amounts = [0] * num_matches
+    for round_num in range(num_rounds):
+        seat = round_num % 2  # the first player's seat
+        simulator.reset()
+        while not all(simulator.dones):
+            playing = [not done for done in simulator.dones]
+            _, rewards, dones = simulator.step(codes, amounts)
+            for i, test in enumerate(tests):
+                if playing[i] and dones[i] and not stopped[i]:
+                    stopped[i] = test.update(rewards[2*i+seat]) != 0
+    return sum(stopped) / num_matches
+
+
+if __name__ == '__main__':
+    ALPHA = .05
+    RATE = false_winner_rate(400, 1000, alpha=ALPHA)
+    print('{:.1%} of even matches stopped with a winner, alpha is {:.0%}'.format(RATE, ALPHA))
+    if RATE > ALPHA:
+        sys.exit(1)
@@ -0,0 +1,193 @@
+'''
+6.176 MIT POKERBOTS SELF-PLAY SIMULATOR
+Plays many independent heads-up tables at once for bot training, with no sockets, logging or eval7 decks.
+The betting rules are the engine's, through FlatRoundState, and showdowns are scored in one batch per deal.
+'''
+from array import array
+from collections import namedtuple
+import random
+import time
+
+from engine import FlatRoundState, FoldAction, CallAction, CheckAction, RaiseAction
+from engine import STARTING_STACK, BIG_BLIND, SMALL_BLIND, FOLD, CALL, CHECK, RAISE
+from evaluator import evaluate_batch
+
+# the legal action mask bit of each action class
+ACTION_BITS = {FoldAction: 1 << FOLD, CallAction: 1 << CALL, CheckAction: 1 << CHECK, RaiseAction: 1 << RAISE}
+ACTIONS = [FoldAction(), CallAction(), CheckAction()]
+
+Observation = namedtuple('Observation', ['active', 'street', 'legal_masks', 'min_raises', 'max_raises'])
+
+
+class TableState(FlatRoundState):
+    '''
+    A FlatRoundState dealt from integer card codes, whose showdown uses precomputed scores.
+    '''
+    __slots__ = ['scores']
+
+    def __init__(self):
+        super().__init__(hands=([], []), deck=[])
+        self.scores = (0, 0)
+
+    @property
+    def active(self):
+        '''
+        The seat to act, as in MultiwayRoundState.
+        '''
+        return self.button % 2
+
+    def deal(self, hands, board, scores):
+        '''
+        Starts a new round in place.
+        '''
+        self.button = 0
+        self.street = 0
+        self.pips[0] = SMALL_BLIND
+        self.pips[1] = BIG_BLIND
+        self.stacks[0] = STARTING_STACK - SMALL_BLIND
+        self.stacks[1] = STARTING_STACK - BIG_BLIND
+        self.hands[0] = hands[0:2]
+        self.hands[1] = hands[2:4]
+        self.deck = board
+        self.scores = scores
+        self.terminal = False
+        self.actions.clear()
+        del self.history[:]
+
+    def showdown(self):
+        '''
+        Computes payoffs from the scores computed when the round was dealt.
+        '''
+        self.settle(self.scores[0], self.scores[1])
+
+
+class BatchSimulator():
+    '''
+    Steps a batch of independent tables with the same number of seats. Each table plays one
+    round at a time; finished tables wait, with done set, until they are reset.
+    Subclasses deal the rounds, in reset. Tables need legal_actions, raise_bounds, apply,
+    and the active, street, terminal and deltas attributes.
+    '''
+
+    def __init__(self, tables, num_seats, seed=None):
+        self.rng = random.Random(seed)
+        self.tables = tables
+        self.num_seats = num_seats
+        self.rewards = array('i', [0]) * (num_seats * len(tables))
+        self.no_rewards = array('i', [0]) * num_seats
+        self.dones = array('B', [0]) * len(tables)
+
+    def observe(self):
+        '''
+        Returns the active seat, street, legal action mask and raise bounds of every table.
+        Finished tables have an empty mask.
+        '''
+        count = len(self.tables)
+        observation = Observation(array('b', [-1]) * count, array('B', [0]) * count, array('B', [0]) * count,
+                                  array('H', [0]) * count, array('H', [0]) * count)
+        for i, table in enumerate(self.tables):
+            observation.street[i] = table.street
+            if table.terminal:
+                continue
+            observation.active[i] = table.active
+            legal_actions = table.legal_actions()
+            observation.legal_masks[i] = sum([ACTION_BITS[action] for action in legal_actions])
+            if RaiseAction in legal_actions:
+                observation.min_raises[i], observation.max_raises[i] = table.raise_bounds()
+        return observation
+
+    def step(self, codes, amounts):
+        '''
+        Applies one action to every unfinished table: codes[i] is FOLD, CALL, CHECK or RAISE,
+        and amounts[i] is the raise-to amount. Like the engine, an illegal action becomes
+        a check if possible, and a fold otherwise.
+
+        Returns the observation, the rewards of every seat of each table, num_seats per table,
+        which are nonzero only on the step that finishes it, and the done flags.
+        '''
+        num_seats = self.num_seats
+        rewards = self.rewards
+        for i, table in enumerate(self.tables):
+            first = num_seats * i
+            if table.terminal:
+                rewards[first:first+num_seats] = self.no_rewards
+                continue
+            legal_actions = table.legal_actions()
+            code = codes[i]
+            action = None
+            if code == RAISE:
+                if RaiseAction in legal_actions:
+                    min_raise, max_raise = table.raise_bounds()
+                    if min_raise <= amounts[i] <= max_raise:
+                        action = RaiseAction(amounts[i])
+            elif type(ACTIONS[code]) in legal_actions:
+                action = ACTIONS[code]
+            if action is None:
+                action = ACTIONS[CHECK] if CheckAction in legal_actions else ACTIONS[FOLD]
+            table.apply(action)
+            if table.terminal:
+                rewards[first:first+num_seats] = array('i', table.deltas)
+                self.dones[i] = 1
+        return self.observe(), rewards, self.dones
+
+
+class Simulator(BatchSimulator):
+    '''
+    Steps a batch of independent heads-up tables.
+    '''
+
+    def __init__(self, num_tables, seed=None):
+        super().__init__([TableState() for _ in range(num_tables)], 2, seed)
+
+    def reset(self, indices=None):
+        '''
+        Deals new rounds to the given tables, or to every table, and returns the observation.
+        All showdowns of the deal are scored in one batch call, whether or not they are reached.
+        '''
+        indices = range(len(self.tables)) if indices is None else indices
+        deck = range(52)
+        deals = [self.rng.sample(deck, 9) for _ in indices]
+        boards = array('B')
+        hands = array('B')
+        for cards in deals:
+            boards.extend(cards[4:])
+            boards.extend(cards[4:])
+            hands.extend(cards[:4])
+        scores = evaluate_batch(boards, hands)
+        for n, (i, cards) in enumerate(zip(indices, deals)):
+            self.tables[i].deal(cards[:4], cards[4:], (scores[2*n], scores[2*n+1]))
+            self.dones[i] = 0
+            self.rewards[2*i] = self.rewards[2*i+1] = 0
+        return self.observe()
+
+
+def play_randomly(simulator, num_batches, seed=0):
+    '''
+    Plays random legal actions at every table of a simulator, dealing num_batches times,
+    and returns the number of rounds played per second.
+    '''
+    rng = random.Random(seed)
+    num_tables = len(simulator.tables)
+    codes = array('B', [0]) * num_tables
+    amounts = array('H', [0]) * num_tables
+    start_time = time.perf_counter()
+    for _ in range(num_batches):
+        observation = simulator.reset()
+        while not all(simulator.dones):
+            for i, mask in enumerate(observation.legal_masks):
+                if mask:
+                    codes[i] = rng.choice([code for code in (FOLD, CALL, CHECK, RAISE) if mask >> code & 1])
+                    amounts[i] = rng.randint(observation.min_raises[i], observation.max_raises[i])
+            observation, _, _ = simulator.step(codes, amounts)
+    return num_tables * num_batches / (time.perf_counter() - start_time)
+
+
+def random_self_play(num_tables=1000, num_batches=100, seed=0):
+    '''
+    Plays random legal actions at every table, and returns the number of rounds played per second.
+    '''
+    return play_randomly(Simulator(num_tables, seed), num_batches, seed)
+
+
+if __name__ == '__main__':
+    print('{:.0f} rounds per second'.format(random_self_play()))
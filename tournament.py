@@ -0,0 +1,281 @@
+'''
+6.176 MIT POKERBOTS TOURNAMENT RUNNER
+Plays many engine games in parallel and collects the results into one standings table.
+'''
+from collections import namedtuple, OrderedDict
+from contextlib import redirect_stdout
+from itertools import combinations
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+import argparse
+import math
+import os
+import random
+
+from engine import BotPool, Game, Player, DECK_SEED, EARLY_STOP
+
+Bot = namedtuple('Bot', ['name', 'path'])
+Match = namedtuple('Match', ['match_id', 'player_1', 'player_2', 'directory', 'seed', 'early_stop'])
+Result = namedtuple('Result', ['match_id', 'player_1', 'player_2', 'bankroll_1', 'bankroll_2'])
+
+
+def make_roster(paths):
+    '''
+    Names each bot after its directory, disambiguating repeated names.
+    '''
+    roster = []
+    seen = {}
+    for path in paths:
+        path = os.path.abspath(path.rstrip('/'))
+        name = os.path.basename(path)
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name += '_' + str(seen[name])
+        roster.append(Bot(name, path))
+    return roster
+
+
+def round_robin_pairings(roster, repeats):
+    '''
+    Pairs every bot with every other bot, swapping seats on each repeat.
+    '''
+    pairings = []
+    for repeat in range(repeats):
+        for bot_1, bot_2 in combinations(roster, 2):
+            pairings.append((bot_1, bot_2) if repeat % 2 == 0 else (bot_2, bot_1))
+    return pairings
+
+
+def swiss_pairings(roster, standings, played):
+    '''
+    Pairs bots with similar scores that have not met yet.
+    The lowest-ranked bot without a bye sits out when the roster is odd.
+    '''
+    ranked = sorted(roster, key=lambda bot: (-standings[bot.name].points, -standings[bot.name].bankroll))
+    if len(ranked) % 2 == 1:
+        bye = ([bot for bot in ranked if not standings[bot.name].byes] or ranked)[-1]
+        ranked.remove(bye)
+        standings[bye.name].byes += 1
+        standings[bye.name].points += 1.
+    pairings = []
+    while ranked:
+        bot_1 = ranked.pop(0)
+        opponents = [bot for bot in ranked if frozenset((bot_1.name, bot.name)) not in played]
+        bot_2 = opponents[0] if opponents else ranked[0]
+        ranked.remove(bot_2)
+        played.add(frozenset((bot_1.name, bot_2.name)))
+        pairings.append((bot_1, bot_2))
+    return pairings
+
+
+def build_roster(roster, output_directory):
+    '''
+    Builds every bot once, before any match starts, so that no two workers build a directory at the same time.
+    Each build's output is written to <name>_build.txt in the output directory.
+    Returns the commands of every bot directory, for the workers to run the bots without building them.
+    '''
+    commands = {}
+    for bot in roster:
+        if bot.path not in commands:
+            player = Player(bot.name, bot.path, os.path.join(output_directory, bot.name + '_build'))
+            player.build()
+            player.write_log()
+            commands[bot.path] = player.commands
+    return commands
+
+
+# each worker process's BotPool, which runs the prebuilt bots and, with reuse, keeps them between matches
+WORKER_BOT_POOL = None
+
+
+def start_worker(commands, reuse):
+    '''
+    Sets up a worker process with its own BotPool. The pool's bots are stopped when the worker exits.
+    '''
+    global WORKER_BOT_POOL  # pylint: disable=global-statement
+    WORKER_BOT_POOL = BotPool(commands, reuse)
+    Finalize(WORKER_BOT_POOL, WORKER_BOT_POOL.close, exitpriority=10)
+
+
+def play_match(match):
+    '''
+    Plays one game in its own working directory, so that logs never collide.
+    Each player binds its own ephemeral port, so concurrent games never share one either.
+    '''
+    os.makedirs(match.directory, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(match.directory)
+    try:
+        with open('engine.txt', 'w') as engine_output, redirect_stdout(engine_output):
+            bankrolls = Game(match.player_1, match.player_2, seed=match.seed, pool=WORKER_BOT_POOL,
+                             early_stop=match.early_stop).run()
+    finally:
+        os.chdir(cwd)
+    return Result(match.match_id, match.player_1.name, match.player_2.name,
+                  bankrolls[match.player_1.name], bankrolls[match.player_2.name])
+
+
+class Standing():
+    '''
+    Accumulates one bot's results over the tournament.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.matches = 0
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.byes = 0
+        self.points = 0.
+        self.bankroll = 0
+
+    def record(self, bankroll, opponent_bankroll):
+        '''
+        Adds the outcome of one match.
+        '''
+        self.matches += 1
+        self.bankroll += bankroll
+        if bankroll > opponent_bankroll:
+            self.wins += 1
+            self.points += 1.
+        elif bankroll < opponent_bankroll:
+            self.losses += 1
+        else:
+            self.draws += 1
+            self.points += .5
+
+
+class Tournament():
+    '''
+    Schedules matches across a process pool and keeps the standings.
+    With a seed, every match deals from its own seed drawn from it. Duplicate
+    tournaments play every pairing twice on the same deals, with the seats swapped.
+    With reuse, each worker keeps its bots running from one match to the next.
+    Every bot is built once, in this process, before the workers start.
+    EARLY_STOP applies to every match except those of duplicate tournaments.
+    '''
+
+    def __init__(self, roster, output_directory, workers=None, seed=None, duplicate=False, reuse=False):
+        self.roster = roster
+        self.reuse = reuse
+        self.rng = random.Random(seed)
+        self.seeded = seed is not None or duplicate
+        self.duplicate = duplicate
+        self.output_directory = os.path.abspath(output_directory)
+        self.workers = workers or os.cpu_count()
+        self.standings = OrderedDict((bot.name, Standing(bot.name)) for bot in roster)
+        self.results = []
+
+    def play(self, pairings, pool):
+        '''
+        Plays a batch of matches in parallel and records their results.
+        '''
+        matches = []
+        for bot_1, bot_2 in pairings:
+            seed = self.rng.randrange(1 << 32) if self.seeded else None
+            for player_1, player_2 in [(bot_1, bot_2), (bot_2, bot_1)] if self.duplicate else [(bot_1, bot_2)]:
+                match_id = len(self.results) + len(matches) + 1
+                directory = os.path.join(self.output_directory, 'match_{:05d}'.format(match_id))
+                # the two halves of a duplicate pairing must play the same deals, so neither stops early
+                matches.append(Match(match_id, player_1, player_2, directory, seed, EARLY_STOP and not self.duplicate))
+        for result in pool.imap_unordered(play_match, matches):
+            print('Match #{}: {} ({}) vs {} ({})'.format(result.match_id, result.player_1, result.bankroll_1,
+                                                        result.player_2, result.bankroll_2))
+            self.standings[result.player_1].record(result.bankroll_1, result.bankroll_2)
+            self.standings[result.player_2].record(result.bankroll_2, result.bankroll_1)
+            self.results.append(result)
+
+    def start_pool(self):
+        '''
+        Builds the roster, then starts the worker processes.
+        '''
+        commands = build_roster(self.roster, self.output_directory)
+        return Pool(self.workers, initializer=start_worker, initargs=(commands, self.reuse))
+
+    def run_round_robin(self, repeats=1):
+        '''
+        Plays every pairing of the roster, repeats times.
+        '''
+        with self.start_pool() as pool:
+            self.play(round_robin_pairings(self.roster, repeats), pool)
+            pool.close()
+            pool.join()  # lets the workers exit cleanly and stop their bots
+
+    def run_swiss(self, rounds=None):
+        '''
+        Plays Swiss rounds; the pairings of each round depend on the standings so far.
+        '''
+        rounds = rounds or max(1, math.ceil(math.log2(len(self.roster))))
+        played = set()
+        with self.start_pool() as pool:
+            for _ in range(rounds):
+                self.play(swiss_pairings(self.roster, self.standings, played), pool)
+            pool.close()
+            pool.join()
+
+    def ranking(self):
+        '''
+        Returns the standings ordered by points, then by total bankroll.
+        '''
+        return sorted(self.standings.values(), key=lambda standing: (-standing.points, -standing.bankroll))
+
+    def write(self):
+        '''
+        Writes the per-match results and the standings table as CSV files.
+        '''
+        with open(os.path.join(self.output_directory, 'results.csv'), 'w') as results_file:
+            results_file.write('match,player_1,player_2,bankroll_1,bankroll_2\n')
+            for result in sorted(self.results):
+                results_file.write(','.join(map(str, result)) + '\n')
+        with open(os.path.join(self.output_directory, 'standings.csv'), 'w') as standings_file:
+            standings_file.write('rank,name,points,matches,wins,draws,losses,bankroll\n')
+            for rank, standing in enumerate(self.ranking(), 1):
+                standings_file.write('{},{},{},{},{},{},{},{}\n'.format(
+                    rank, standing.name, standing.points, standing.matches, standing.wins,
+                    standing.draws, standing.losses, standing.bankroll))
+
+    def print_standings(self):
+        '''
+        Prints the standings table.
+        '''
+        print('{:>4}  {:<20} {:>6} {:>4} {:>4} {:>4} {:>4} {:>10}'.format(
+            'Rank', 'Name', 'Points', 'MP', 'W', 'D', 'L', 'Bankroll'))
+        for rank, standing in enumerate(self.ranking(), 1):
+            print('{:>4}  {:<20} {:>6} {:>4} {:>4} {:>4} {:>4} {:>10}'.format(
+                rank, standing.name, standing.points, standing.matches, standing.wins,
+                standing.draws, standing.losses, standing.bankroll))
+
+
+def parse_args():
+    '''
+    Parses the roster and scheduling options.
+    '''
+    parser = argparse.ArgumentParser(prog='python3 tournament.py')
+    parser.add_argument('bots', nargs='+', help='Directories of the pokerbots to enter')
+    parser.add_argument('--format', choices=['round-robin', 'swiss'], default='round-robin',
+                        help='Pairing scheme, defaults to round-robin')
+    parser.add_argument('--repeats', type=int, default=1, help='Round-robin cycles, defaults to 1')
+    parser.add_argument('--rounds', type=int, default=None, help='Swiss rounds, defaults to log2 of the roster size')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel matches, defaults to the core count')
+    parser.add_argument('--output', type=str, default='tournament', help='Output directory, defaults to tournament')
+    parser.add_argument('--seed', type=int, default=DECK_SEED, help='Seed for the deals, defaults to DECK_SEED')
+    parser.add_argument('--duplicate', action='store_true', help='Replay every pairing with the seats swapped')
+    parser.add_argument('--reuse', action='store_true', help='Keep bots running between matches')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = parse_args()
+    TOURNAMENT = Tournament(make_roster(ARGS.bots), ARGS.output, ARGS.workers, ARGS.seed, ARGS.duplicate,
+                            ARGS.reuse)
+    if len(TOURNAMENT.roster) < 2:
+        print('A tournament needs at least two bots')
+    else:
+        os.makedirs(TOURNAMENT.output_directory, exist_ok=True)
+        if ARGS.format == 'swiss':
+            TOURNAMENT.run_swiss(ARGS.rounds)
+        else:
+            TOURNAMENT.run_round_robin(ARGS.repeats)
+        TOURNAMENT.print_standings()
+        TOURNAMENT.write()